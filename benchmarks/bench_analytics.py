@@ -0,0 +1,135 @@
+"""Cook analytics over thousands of recorded sessions.
+
+Synthetic cooks (random preheat speed, plateau length and noise) are recorded into a
+temporary telemetry store, then:
+
+- EtaModel.learn() reads every session back from telemetry
+- segment_many() runs over all of them, with NumPy when installed and in plain Python
+- one long cook is followed poll by poll, incrementally vs rescanning the history
+- the ETA of held-out cooks is predicted at every stage change
+
+Usage: python benchmarks/bench_analytics.py [--sessions 2000]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import analytics  # noqa: E402
+from cooker import STAGE_MARKER, CookerStatus, OperationMode  # noqa: E402
+from telemetry import DeviceTelemetry  # noqa: E402
+
+
+def synthetic_cook(rng: random.Random) -> bytes:
+    """Preheat, boil plateau then cool down, stage markers in between."""
+    preheat = rng.randint(40, 120)
+    boil = rng.randint(120, 240)
+    cool = rng.randint(30, 60)
+    samples = bytearray()
+    temp = rng.uniform(15, 30)
+    for stage, (length, target) in enumerate(
+        ((preheat, 100), (boil // 2, 100), (boil - boil // 2, 101), (cool, 70))
+    ):
+        if stage:
+            samples.append(STAGE_MARKER)
+        step = (target - temp) / length
+        for _ in range(length):
+            temp += step
+            samples.append(max(0, min(160, int(temp + rng.gauss(0, 0.7)))))
+    return bytes(samples)
+
+
+def status(mode: OperationMode) -> CookerStatus:
+    return CookerStatus({"status": mode.value, "menu": "fine"})
+
+
+def record(telemetry: DeviceTelemetry, cooks):
+    ts = 1_700_000_000
+    for samples in cooks:
+        telemetry.record_status(status(OperationMode.Running), ts)
+        telemetry.record_history(analytics.TemperatureHistory(samples.hex()), ts)
+        ts += 3600
+        telemetry.record_status(status(OperationMode.Waiting), ts)
+        ts += 60
+
+
+def timed(fn):
+    begin = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - begin
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    cooks = [synthetic_cook(rng) for _ in range(args.sessions)]
+    histories = [analytics.TemperatureHistory(cook.hex()) for cook in cooks]
+    samples = sum(len(cook) for cook in cooks)
+    begin = time.perf_counter()
+    numpy = analytics._numpy()
+    print(f"import numpy            {(time.perf_counter() - begin) * 1000:9.1f} ms")
+    print(f"{len(cooks)} sessions, {samples} samples, numpy: {numpy is not None}")
+
+    with tempfile.TemporaryDirectory() as directory:
+        telemetry = DeviceTelemetry(directory, 1 << 30, 1 << 22)
+        _, elapsed = timed(lambda: record(telemetry, cooks))
+        print(f"record telemetry        {elapsed * 1000:9.1f} ms")
+        model = analytics.EtaModel()
+        count, elapsed = timed(lambda: model.learn(telemetry))
+        print(f"EtaModel.learn()        {elapsed * 1000:9.1f} ms  ({count} sessions)")
+
+    for name in ("numpy", "python"):
+        if name == "numpy" and numpy is None:
+            continue
+        analytics.np = numpy if name == "numpy" else None
+        _, elapsed = timed(lambda: analytics.segment_many(histories))
+        print(
+            f"segment_many() {name:7s}  {elapsed * 1000:9.1f} ms  "
+            f"{samples / elapsed / 1e6:6.2f} M samples/s"
+        )
+    analytics.np = numpy
+
+    longest = max(cooks, key=len).hex()
+    polls = [
+        analytics.TemperatureHistory(longest[: length * 2])
+        for length in range(1, len(longest) // 2 + 1)
+    ]
+    progress = analytics.CookProgress()
+    _, incremental = timed(lambda: [progress.update(h) for h in polls])
+    _, rescan = timed(lambda: [analytics.segment(h) for h in polls])
+    print(
+        f"follow one cook         incremental {incremental / len(polls) * 1e6:6.1f} us"
+        f"/poll, rescan {rescan / len(polls) * 1e6:7.1f} us/poll"
+    )
+
+    split = len(cooks) * 4 // 5
+    model = analytics.EtaModel()
+    for history in histories[:split]:
+        model.add_history("fine", history)
+    errors = []
+    begin = time.perf_counter()
+    for history in histories[split:]:
+        stages = analytics.segment(history)
+        total = stages[-1].end
+        for stage in stages:
+            predicted = model.predict_total("fine", stage.index, stage.begin)
+            errors.append(abs(predicted - total) * analytics.SAMPLE_SECONDS / 60)
+    elapsed = time.perf_counter() - begin
+    print(
+        f"ETA at stage changes    {elapsed / len(errors) * 1e6:9.1f} us/prediction  "
+        f"MAE {statistics.mean(errors):5.2f} min  "
+        f"p90 {sorted(errors)[int(len(errors) * 0.9)]:5.2f} min"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""Device load and fan-out latency of the HTTP API with many stream clients.
+
+The daemon polls a local simulator every second with the API enabled, while 0, 1, 10
+and 100 clients follow /api/events and as many again poll /api/cookers. For each
+round the miIO requests the simulator received per poll are counted, along with the
+delay between the scheduler publishing a change and the last client receiving it.
+
+Usage: python benchmarks/bench_api.py [--seconds 5] [--clients 0,1,10,100]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from config import read_config  # noqa: E402
+from daemon import Daemon  # noqa: E402
+from simulator import SimulatedCooker, serve  # noqa: E402
+
+HOST = "127.0.0.6"
+API_PORT = 18081
+
+CONFIG = f"""!Config
+poll_interval: 1
+api_port: {API_PORT}
+poll_intervals:
+  Running: !PollInterval {{ min: 1, max: 1 }}
+cooker_config: !CookerConfig
+  name: bench
+  ip: {HOST}
+  token: {"ff" * 16}
+  akw: true
+  unpluggedCheck: false
+  unpluggedMaxDuration: 60
+  unpluggedAutoStopAkw: false
+  unpluggedMaxReminderCount: 3
+  meal_profile_list: []
+push_config: !PushConfig
+  token: ""
+"""
+
+
+async def follow(received: list, stop: asyncio.Event):
+    reader, writer = await asyncio.open_connection("127.0.0.1", API_PORT)
+    writer.write(b"GET /api/events HTTP/1.1\r\n\r\n")
+    await reader.readuntil(b"\r\n\r\n")
+    try:
+        while not stop.is_set():
+            event = await reader.readuntil(b"\n\n")
+            if event.startswith(b"event: change"):
+                received.append(time.perf_counter())
+    finally:
+        writer.close()
+
+
+async def poll(stop: asyncio.Event):
+    while not stop.is_set():
+        reader, writer = await asyncio.open_connection("127.0.0.1", API_PORT)
+        writer.write(b"GET /api/cookers HTTP/1.1\r\n\r\n")
+        await reader.read()
+        writer.close()
+        await asyncio.sleep(0.1)
+
+
+async def measure(daemon: Daemon, protocol, clients: int, seconds: float):
+    scheduler = daemon.schedulers["bench"]
+    published = []
+
+    def on_change(change):
+        published.append(time.perf_counter())
+
+    scheduler.feed.subscribe(on_change)
+    received = [[] for _ in range(clients)]
+    stop = asyncio.Event()
+    tasks = [asyncio.create_task(follow(received[i], stop)) for i in range(clients)]
+    tasks += [asyncio.create_task(poll(stop)) for _ in range(clients)]
+    await asyncio.sleep(0.2)
+
+    requests = protocol.requests
+    ticks = scheduler.feed.updated
+    begin = time.perf_counter()
+    count = 0
+    while time.perf_counter() - begin < seconds:
+        await asyncio.sleep(0.05)
+        if scheduler.feed.updated != ticks:
+            ticks = scheduler.feed.updated
+            count += 1
+    requests = protocol.requests - requests
+    stop.set()
+    await asyncio.sleep(1.2)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    scheduler.feed.unsubscribe(on_change)
+
+    delays = []
+    for at in published:
+        last = [next((t for t in client if t >= at), None) for client in received]
+        if clients and all(t is not None for t in last):
+            delays.append((max(last) - at) * 1000)
+    fan_out = f"{statistics.median(delays):6.2f} ms" if delays else "     -   "
+    print(
+        f"{clients:4d} clients  {requests / max(1, count):5.2f} miIO requests/poll  "
+        f"fan-out to last client {fan_out}"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--clients", default="0,1,10,100")
+    args = parser.parse_args()
+
+    cooker = SimulatedCooker(speed=60)
+    transport, protocol = await serve(HOST, cooker=cooker)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "config.yaml")
+        with open(path, "w", encoding="utf-8") as fp:
+            fp.write(CONFIG)
+        daemon = Daemon(path, read_config(path, use_cache=False))
+    runner = asyncio.create_task(daemon.run())
+    await asyncio.sleep(0.5)
+    # t_left and the temperature change on every poll while cooking
+    await daemon.schedulers["bench"].start("FineRice")
+
+    for clients in (int(value) for value in args.clients.split(",")):
+        await measure(daemon, protocol, clients, args.seconds)
+
+    await daemon.api.close()
+    runner.cancel()
+    transport.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
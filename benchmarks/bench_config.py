@@ -0,0 +1,100 @@
+"""Config loading time for large generated configs.
+
+Compares the pure-Python loader, the libyaml loader and the compiled config cache.
+
+Usage: python benchmarks/bench_config.py [--cookers 50] [--profiles 40]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import yaml  # noqa: E402
+
+import config  # noqa: E402
+
+COOKER = """  - !CookerConfig
+    name: cooker-{index}
+    ip: !env ${{COOKER_IP}}
+    token: !env ${{COOKER_TOKEN}}
+    akw: true
+    unpluggedCheck: true
+    unpluggedMaxDuration: 60
+    unpluggedAutoStopAkw: true
+    unpluggedMaxReminderCount: 3
+    meal_profile_list:
+{profiles}"""
+
+PROFILE = """      - !MealProfile
+        type: FineRice
+        time: !Mealtime
+          usual_time: !time {hour}:30
+          earliest_time: !time {hour}:00
+          latest_time: !time {hour}:20
+"""
+
+
+def generate(cookers: int, profiles: int) -> str:
+    profile_list = "".join(
+        PROFILE.format(hour=index % 24) for index in range(profiles)
+    )
+    return (
+        "!Config\npoll_interval: 30\ncooker_configs:\n"
+        + "".join(
+            COOKER.format(index=index, profiles=profile_list)
+            for index in range(cookers)
+        )
+        + "push_config: !PushConfig\n  token: !env ${BARK_TOKEN}\n"
+    )
+
+
+def measure(fn, rounds: int) -> float:
+    begin = time.perf_counter()
+    for _ in range(rounds):
+        fn()
+    return (time.perf_counter() - begin) / rounds * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser("bench-config")
+    parser.add_argument("--cookers", type=int, default=50)
+    parser.add_argument("--profiles", type=int, default=40)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    os.environ.setdefault("COOKER_IP", "127.0.0.1")
+    os.environ.setdefault("COOKER_TOKEN", "0" * 32)
+    os.environ.setdefault("BARK_TOKEN", "")
+    os.environ["XDG_CACHE_HOME"] = tempfile.mkdtemp()
+
+    content = generate(args.cookers, args.profiles)
+    with tempfile.NamedTemporaryFile("w", suffix=".yaml", delete=False) as fp:
+        fp.write(content)
+    print(
+        f"{len(content) / 1024:.0f} KiB, "
+        f"{args.cookers} cookers x {args.profiles} profiles"
+    )
+
+    base = config.ConfigLoader.__bases__[0]
+    if base is not yaml.FullLoader:
+        python_loader = type("PythonConfigLoader", (yaml.FullLoader,), {})
+        python_loader.yaml_constructors = dict(config.ConfigLoader.yaml_constructors)
+        python_ms = measure(lambda: yaml.load(content, python_loader), args.rounds)
+        print(f"pure-python loader : {python_ms:8.2f} ms")
+    else:
+        print("libyaml is not available, only the pure-python loader is measured")
+
+    libyaml_ms = measure(lambda: config.parse_config(content), args.rounds)
+    print(f"{base.__name__:19s}: {libyaml_ms:8.2f} ms")
+
+    config.read_config(fp.name)
+    cached_ms = measure(lambda: config.read_config(fp.name), args.rounds)
+    print(f"compiled cache     : {cached_ms:8.2f} ms")
+    os.unlink(fp.name)
+
+
+if __name__ == "__main__":
+    main()
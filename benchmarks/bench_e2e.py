@@ -0,0 +1,127 @@
+"""End-to-end latency and throughput against the local miIO simulator.
+
+The simulator listens on a loopback address in a background thread, the sync
+``MultiCooker`` and the ``AsyncMultiCooker`` talk to it over real UDP.
+
+Usage: python benchmarks/bench_e2e.py [--latency-ms 5] [--loss 0.0] [--rounds 50]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from async_cooker import AsyncMultiCooker  # noqa: E402
+from config import CookerConfig  # noqa: E402
+from cooker import PROFILES, MultiCooker  # noqa: E402
+from scheduler import CookerScheduler  # noqa: E402
+from simulator import SimulatedCooker, serve  # noqa: E402
+
+HOST = "127.0.0.2"
+TOKEN = "ff" * 16
+
+
+def start_simulator(cooker: SimulatedCooker, **kwargs):
+    loop = asyncio.new_event_loop()
+    ready = threading.Event()
+
+    def run():
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(serve(HOST, 54321, TOKEN, cooker, **kwargs))
+        ready.set()
+        loop.run_forever()
+
+    threading.Thread(target=run, daemon=True).start()
+    ready.wait()
+    return loop
+
+
+def report(name: str, samples):
+    samples = sorted(samples)
+    p50 = statistics.median(samples) * 1000
+    p95 = samples[int(len(samples) * 0.95) - 1] * 1000
+    throughput = len(samples) / sum(samples)
+    print(f"{name:24s} p50 {p50:8.2f} ms  p95 {p95:8.2f} ms  {throughput:8.1f} ops/s")
+
+
+def bench_sync(fn, rounds: int):
+    samples = []
+    for _ in range(rounds):
+        begin = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - begin)
+    return samples
+
+
+async def bench_async(fn, rounds: int):
+    samples = []
+    for _ in range(rounds):
+        begin = time.perf_counter()
+        await fn()
+        samples.append(time.perf_counter() - begin)
+    return samples
+
+
+async def run_async(args):
+    cooker = AsyncMultiCooker(HOST, TOKEN, timeout=1)
+
+    async def is_online():
+        cooker.invalidate()
+        return await cooker.is_online()
+
+    report("async status()", await bench_async(cooker.status, args.rounds))
+    report("async is_online()", await bench_async(is_online, args.rounds))
+    report(
+        "async start()",
+        await bench_async(lambda: cooker.start(PROFILES["FineRice"]), args.rounds),
+    )
+
+    cooker_config = CookerConfig(
+        name="simulator",
+        ip=HOST,
+        token=TOKEN,
+        akw=True,
+        unpluggedCheck=True,
+        unpluggedMaxDuration=60,
+        unpluggedMaxReminderCount=3,
+        unpluggedAutoStopAkw=True,
+        meal_profile_list=[],
+    )
+    scheduler = CookerScheduler(cooker, cooker_config)
+    report("task() cycle", await bench_async(scheduler.task, args.rounds))
+    cooker.close()
+
+
+def main():
+    parser = argparse.ArgumentParser("bench-e2e")
+    parser.add_argument("--latency-ms", type=float, default=5)
+    parser.add_argument("--loss", type=float, default=0.0)
+    parser.add_argument("--rounds", type=int, default=50)
+    args = parser.parse_args()
+
+    start_simulator(
+        SimulatedCooker(speed=60), latency=args.latency_ms / 1000, loss=args.loss
+    )
+
+    cooker = MultiCooker(HOST, TOKEN)
+
+    def is_online():
+        cooker.invalidate()
+        return cooker.is_online()
+
+    report("sync status()", bench_sync(cooker.status, args.rounds))
+    report("sync is_online()", bench_sync(is_online, args.rounds))
+    report(
+        "sync start()",
+        bench_sync(lambda: cooker.start(PROFILES["FineRice"]), args.rounds),
+    )
+
+    asyncio.run(run_async(args))
+
+
+if __name__ == "__main__":
+    main()
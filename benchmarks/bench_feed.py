@@ -0,0 +1,93 @@
+"""Status snapshots vs the delta change feed over simulated cooks.
+
+A SimulatedCooker on a virtual clock goes through scheduled cooks (pre-cook,
+cooking, keep warm, unplugged) polled every 30 seconds. Each poll is decoded into a
+CookerStatus and pushed through a StatusFeed, comparing:
+
+- decoding the get_prop values, and reading fields afterwards
+- JSON bytes of publishing every full snapshot vs only the changed fields
+- how many polls produced no change at all
+
+Usage: python benchmarks/bench_feed.py [--cooks 200]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from clock import VirtualClock  # noqa: E402
+from cooker import (  # noqa: E402
+    PROFILES,
+    STATUS_PROPERTIES,
+    CookerStatus,
+    build_profile_hex,
+)
+from feed import StatusFeed  # noqa: E402
+from simulator import SimulatedCooker  # noqa: E402
+
+POLL_SECONDS = 30
+
+
+def polls(cooks: int):
+    """get_prop values of every poll, None while unplugged."""
+    clock = VirtualClock(datetime(2024, 3, 4))
+    cooker = SimulatedCooker(clock=clock)
+    for index in range(cooks):
+        profile = PROFILES["FineRice" if index % 2 else "QuickRice"]
+        cooker.set_start(build_profile_hex(profile, schedule=120, akw=True))
+        for _ in range(4 * 3600 // POLL_SECONDS):
+            clock.advance(POLL_SECONDS)
+            cooker.advance()
+            yield [cooker.get_prop(name) for name in STATUS_PROPERTIES]
+        cooker.cancel_cooking()
+        for _ in range(600 // POLL_SECONDS):
+            clock.advance(POLL_SECONDS)
+            yield None
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cooks", type=int, default=200)
+    args = parser.parse_args()
+
+    values = list(polls(args.cooks))
+    online = [value for value in values if value is not None]
+
+    begin = time.perf_counter()
+    statuses = [CookerStatus.from_values(value) for value in online]
+    decode = time.perf_counter() - begin
+    begin = time.perf_counter()
+    for status in statuses:
+        status.mode, status.remaining, status.temperature, status.keep_warm
+    read = time.perf_counter() - begin
+
+    feed = StatusFeed("bench", backlog=len(values))
+    full = 0
+    delta = 0
+    begin = time.perf_counter()
+    status_iter = iter(statuses)
+    for value in values:
+        status = next(status_iter) if value is not None else None
+        change = feed.update(datetime.now(), status)
+        if change is not None:
+            delta += len(json.dumps(change.changes))
+    diff = time.perf_counter() - begin
+    for status in statuses:
+        full += len(json.dumps(status.as_dict()))
+
+    print(f"{len(values)} polls, {len(online)} online, {feed.seq} changes")
+    print(f"decode     {decode / len(online) * 1e6:6.2f} us/status")
+    print(f"read       {read / len(online) * 1e6:6.2f} us/status (4 fields)")
+    print(f"feed diff  {diff / len(values) * 1e6:6.2f} us/poll")
+    print(
+        f"published  full {full / 1024:8.1f} KiB, deltas {delta / 1024:8.1f} KiB "
+        f"({delta / full:.1%})"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""Tick latency of the reachable cookers in fleet mode, with and without dead ones.
+
+Fleets of 1 to 200 fake cookers are polled by the real :meth:`daemon.Daemon.poll`
+loops, sharing the ``max_concurrency`` semaphore, every second. The fakes answer
+after ``--rtt-ms``, or never, and time out after ``--timeout-ms``. Each fleet
+runs twice: once with every cooker reachable and once with every tenth cooker dead.
+For the reachable cookers only, two numbers are reported:
+
+- tick: how long a scheduler.task() takes
+- late: how long after its next_delay() a poll actually starts, which includes the
+  wait for the semaphore
+
+Usage: python benchmarks/bench_fleet.py [--rtt-ms 30] [--concurrency 64]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from config import read_config  # noqa: E402
+from cooker import OperationMode  # noqa: E402
+from daemon import Daemon  # noqa: E402
+
+CONFIG = """!Config
+poll_interval: 1
+max_concurrency: {concurrency}
+poll_intervals:
+  Offline: !PollInterval {{ min: 1, max: 1 }}
+  Waiting: !PollInterval {{ min: 1, max: 1 }}
+cooker_configs:
+{cookers}
+push_config: !PushConfig
+  token: ""
+"""
+
+COOKER = """  - !CookerConfig
+    name: cooker-{index}
+    ip: 10.0.{subnet}.{host}
+    token: {token}
+    akw: true
+    unpluggedCheck: false
+    unpluggedMaxDuration: 60
+    unpluggedAutoStopAkw: false
+    unpluggedMaxReminderCount: 3
+    meal_profile_list: []"""
+
+
+class FakeAsyncCooker:
+    """Stand-in for AsyncMultiCooker, waiting in Waiting mode or never answering."""
+
+    def __init__(self, ip: str, rtt: float, dead: bool, timeout: float):
+        self.ip = ip
+        self.rtt = rtt
+        self.dead = dead
+        self.timeout = timeout
+
+    @property
+    def timed_out(self) -> bool:
+        return self.dead
+
+    def invalidate(self):
+        pass
+
+    def close(self):
+        pass
+
+    async def is_online(self):
+        await asyncio.sleep(self.timeout if self.dead else self.rtt)
+        return not self.dead
+
+    async def get_mode(self):
+        return OperationMode.Waiting
+
+
+class FleetDaemon(Daemon):
+    def __init__(self, config_path, config, rtt, timeout, dead_every):
+        self.rtt = rtt
+        self.timeout = timeout
+        self.dead_every = dead_every
+        super().__init__(config_path, config)
+
+    def _create_cooker(self, cooker_config):
+        index = int(cooker_config.name.rsplit("-", 1)[1])
+        dead = bool(self.dead_every) and index % self.dead_every == self.dead_every - 1
+        return FakeAsyncCooker(cooker_config.ip, self.rtt, dead, self.timeout)
+
+
+def follow(scheduler, ticks: list, late: list):
+    """Record the tick time and start lateness of a reachable cooker."""
+    task = scheduler.task
+    state = {"due": None}
+
+    async def timed_task():
+        begin = time.perf_counter()
+        if state["due"] is not None:
+            late.append(begin - state["due"])
+        try:
+            await task()
+        finally:
+            end = time.perf_counter()
+            ticks.append(end - begin)
+            state["due"] = end + scheduler.next_delay()
+
+    scheduler.task = timed_task
+
+
+def percentile(values, fraction):
+    return sorted(values)[int(len(values) * fraction)] * 1000 if values else 0.0
+
+
+async def measure(args, count: int, dead_every: int):
+    cookers = "\n".join(
+        COOKER.format(
+            index=index, subnet=index // 250, host=index % 250 + 1, token="ff" * 16
+        )
+        for index in range(count)
+    )
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "config.yaml")
+        with open(path, "w", encoding="utf-8") as fp:
+            fp.write(CONFIG.format(concurrency=args.concurrency, cookers=cookers))
+        daemon = FleetDaemon(
+            path,
+            read_config(path, use_cache=False),
+            args.rtt_ms / 1000,
+            args.timeout_ms / 1000,
+            dead_every,
+        )
+
+    ticks, late = [], []
+    for scheduler in daemon.schedulers.values():
+        if not scheduler.cooker.dead:
+            follow(scheduler, ticks, late)
+    runner = asyncio.create_task(daemon.run())
+    await asyncio.sleep(args.seconds)
+    runner.cancel()
+    for task in daemon.tasks.values():
+        task.cancel()
+    await asyncio.gather(runner, *daemon.tasks.values(), return_exceptions=True)
+    return ticks, late
+
+
+async def main():
+    parser = argparse.ArgumentParser("bench-fleet")
+    parser.add_argument("--rtt-ms", type=float, default=30)
+    parser.add_argument("--timeout-ms", type=float, default=500)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--seconds", type=float, default=5)
+    args = parser.parse_args()
+
+    for count in (1, 10, 50, 100, 200):
+        for dead_every, label in ((0, "all live"), (10, "1/10 dead")):
+            if count < 10 and dead_every:
+                continue
+            ticks, late = await measure(args, count, dead_every)
+            print(
+                f"{count:4d} cookers {label:9s}  "
+                f"tick p50 {statistics.median(ticks) * 1000:6.1f} ms "
+                f"p99 {percentile(ticks, 0.99):6.1f} ms  "
+                f"late p50 {percentile(late, 0.5):6.1f} ms "
+                f"p99 {percentile(late, 0.99):6.1f} ms"
+            )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,71 @@
+"""Status probe tail latency on a lossy link, with and without hedging.
+
+Each round invalidates the snapshot and calls ``is_online()`` against the local
+simulator, which drops the given fraction of packets in both directions. A False
+is a live cooker reported offline.
+
+Usage: python benchmarks/bench_hedge.py [--loss 0.2] [--latency-ms 20] [--rounds 200]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from async_cooker import AsyncMultiCooker  # noqa: E402
+from simulator import serve  # noqa: E402
+
+HOST = "127.0.0.7"
+TOKEN = "ff" * 16
+
+
+async def probe(cooker: AsyncMultiCooker, rounds: int):
+    samples = []
+    offline = 0
+    for _ in range(rounds):
+        cooker.invalidate()
+        begin = time.perf_counter()
+        if not await cooker.is_online():
+            offline += 1
+        samples.append(time.perf_counter() - begin)
+    return samples, offline
+
+
+def report(name: str, samples, offline: int):
+    samples = sorted(samples)
+    p50 = statistics.median(samples) * 1000
+    p99 = samples[int(len(samples) * 0.99) - 1] * 1000
+    print(
+        f"{name:16s} p50 {p50:8.2f} ms  p99 {p99:8.2f} ms  "
+        f"max {samples[-1] * 1000:8.2f} ms  false offline {offline}/{len(samples)}"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--loss", type=float, default=0.2)
+    parser.add_argument("--latency-ms", type=float, default=20)
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+
+    transport, _ = await serve(
+        HOST, 54321, TOKEN, latency=args.latency_ms / 1000, loss=args.loss
+    )
+    # Defaults as before: 5 s timeout per attempt, no deadline, no hedge
+    plain = AsyncMultiCooker(
+        HOST, TOKEN, probe_deadline=None, hedge_delay=None, retry_count=3
+    )
+    report("plain", *await probe(plain, args.rounds))
+    plain.close()
+
+    hedged = AsyncMultiCooker(HOST, TOKEN, timeout=0.5)
+    report("hedged+deadline", *await probe(hedged, args.rounds))
+    hedged.close()
+    transport.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,116 @@
+"""Scheduler replay on the virtual clock.
+
+1. Throughput: simulated weeks of a cooker plugged in every morning and unplugged
+   at night, replayed through CookerScheduler.task() on a VirtualClock.
+2. Boundaries: the cooker is plugged in just before, at and after the
+   earliest_time / latest_time of every meal profile, listing the first command the
+   scheduler issued for each case and when (day of month, time).
+
+Usage: python benchmarks/bench_replay.py [--weeks 8]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from config import Time, read_config  # noqa: E402
+from replay import Replay, daily_power  # noqa: E402
+
+CONFIG = """!Config
+poll_interval: 30
+cooker_config: !CookerConfig
+  name: replay
+  ip: 127.0.0.1
+  token: ffffffffffffffffffffffffffffffff
+  akw: true
+  unpluggedCheck: true
+  unpluggedMaxDuration: 60
+  unpluggedAutoStopAkw: true
+  unpluggedMaxReminderCount: 3
+  meal_profile_list:
+    - !MealProfile
+      type: Gongee
+      time: !Mealtime
+        usual_time: !time 8:10
+        earliest_time: !time 6:00
+        latest_time: !time 7:10
+    - !MealProfile
+      type: QuickRice
+      time: !Mealtime
+        usual_time: !time 12:00
+        earliest_time: !time 11:20
+        latest_time: !time 12:45
+    - !MealProfile
+      type: FineRice
+      time: !Mealtime
+        usual_time: !time 18:00
+        earliest_time: !time 17:30
+        latest_time: !time 20:30
+push_config: !PushConfig
+  token: ""
+"""
+
+# Monday
+START = date(2024, 3, 4)
+
+
+def replay(config, days: int, plug: Time, unplug: Time = None):
+    begin = datetime.combine(START, datetime.min.time())
+    runner = Replay(begin, config)
+    cooker_config = config.get_cooker_configs()[0]
+    runner.simulate(cooker_config, daily_power(START, days, plug, unplug))
+    return asyncio.run(runner.run(begin + timedelta(days=days)))
+
+
+def shifted(at: Time, minutes: int) -> Time:
+    moment = at.on(START) + timedelta(minutes=minutes)
+    return Time(moment.hour, moment.minute)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--weeks", type=int, default=8)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "config.yaml")
+        with open(path, "w", encoding="utf-8") as fp:
+            fp.write(CONFIG)
+        config = read_config(path, use_cache=False)
+
+    days = args.weeks * 7
+    begin = time.perf_counter()
+    report = replay(config, days, Time(7, 0), Time(22, 0))
+    elapsed = time.perf_counter() - begin
+    print(
+        f"{args.weeks} weeks: {report.ticks} polls, {len(report.commands)} commands, "
+        f"{len(report.pushes)} pushes, {len(report.failures)} failures in "
+        f"{elapsed * 1000:.1f} ms ({args.weeks / elapsed:.1f} weeks/s, "
+        f"{elapsed / report.ticks * 1e6:.1f} us/poll)"
+    )
+
+    print("plug in  first command")
+    profiles = config.get_cooker_configs()[0].meal_profile_list
+    for profile in profiles:
+        for edge in (profile.time.earliest_time, profile.time.latest_time):
+            for minutes in (-1, 0, 1):
+                plug = shifted(edge, minutes)
+                report = replay(config, 1, plug)
+                command = report.commands[0] if report.commands else None
+                print(
+                    "%02d:%02d    " % plug
+                    + (
+                        f"{command.at:%d %H:%M} {command.method} {command.args}"
+                        if command
+                        else "-"
+                    )
+                )
+
+
+if __name__ == "__main__":
+    main()
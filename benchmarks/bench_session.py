@@ -0,0 +1,73 @@
+"""First-command latency with and without a persisted miIO session.
+
+Every round builds a new ``AsyncMultiCooker`` (as a process restart would) and
+times its first ``status()`` against the local simulator. "cold" starts without a
+session and needs a hello, "warm" restores the session from a ``SessionStore``
+file written by the previous round.
+
+Usage: python benchmarks/bench_session.py [--latency-ms 5] [--rounds 50]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from async_cooker import AsyncMultiCooker  # noqa: E402
+from session import SessionStore  # noqa: E402
+from simulator import serve  # noqa: E402
+
+HOST = "127.0.0.5"
+TOKEN = "ff" * 16
+
+
+async def first_status(protocol, rounds: int, path=None):
+    samples = []
+    hellos, requests = protocol.hellos, protocol.requests
+    for _ in range(rounds):
+        session = SessionStore(path).session(HOST) if path else None
+        cooker = AsyncMultiCooker(HOST, TOKEN, timeout=1, session=session)
+        begin = time.perf_counter()
+        await cooker.status()
+        samples.append(time.perf_counter() - begin)
+        cooker.close()
+    return (
+        samples,
+        (protocol.hellos - hellos) / rounds,
+        (protocol.requests - requests) / rounds,
+    )
+
+
+def report(name: str, samples, hellos: float, packets: float):
+    p50 = statistics.median(samples) * 1000
+    print(
+        f"{name:6s} first status() p50 {p50:7.2f} ms  "
+        f"hellos/round {hellos:4.2f}  packets/round {packets:5.2f}"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency-ms", type=float, default=5)
+    parser.add_argument("--rounds", type=int, default=50)
+    args = parser.parse_args()
+
+    transport, protocol = await serve(
+        HOST, 54321, TOKEN, latency=args.latency_ms / 1000
+    )
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "miio.json")
+        # Seed the file once, as the previous process would have
+        await first_status(protocol, 1, path)
+
+        report("cold", *await first_status(protocol, args.rounds))
+        report("warm", *await first_status(protocol, args.rounds, path))
+    transport.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,135 @@
+"""Cold-start cost of the daemon.
+
+1. ``python -X importtime`` of the daemon modules, listing the slowest imports and
+   whether python-miio / requests got pulled in.
+2. Wall time from spawning a fresh interpreter to the first completed ``task()``
+   against the local simulator.
+
+Usage: python benchmarks/bench_startup.py [--rounds 5] [--top 15]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.insert(0, SRC)
+
+from simulator import SimulatedCooker, serve  # noqa: E402
+
+HOST = "127.0.0.4"
+TOKEN = "ff" * 16
+
+CONFIG = f"""!Config
+poll_interval: 30
+cooker_config: !CookerConfig
+  name: simulator
+  ip: {HOST}
+  token: {TOKEN}
+  akw: true
+  unpluggedCheck: true
+  unpluggedMaxDuration: 60
+  unpluggedAutoStopAkw: true
+  unpluggedMaxReminderCount: 3
+  meal_profile_list: []
+push_config: !PushConfig
+  token: ""
+"""
+
+FIRST_TASK = """
+import asyncio, sys
+from config import read_config
+from daemon import Daemon
+
+async def main():
+    daemon = Daemon(sys.argv[1], read_config(sys.argv[1]))
+    scheduler = next(iter(daemon.schedulers.values()))
+    await scheduler.task()
+    print("miio" in sys.modules, "requests" in sys.modules)
+
+asyncio.run(main())
+"""
+
+
+def import_times(top: int):
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import daemon"],
+        cwd=SRC,
+        capture_output=True,
+        text=True,
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        head, cumulative_us, name = line.split("|")
+        rows.append((int(cumulative_us), int(head.split(":")[1]), name.rstrip()))
+
+    modules = {name.strip() for _, _, name in rows}
+    total = sum(self_us for _, self_us, _ in rows)
+    print(f"import daemon: {total / 1000:.1f} ms self time over {len(rows)} modules")
+    print(f"  python-miio imported: {'miio' in modules}")
+    print(f"  requests imported:    {'requests' in modules}")
+    for cumulative_us, self_us, name in sorted(rows, reverse=True)[:top]:
+        print(f"  {cumulative_us / 1000:8.1f} ms  {name}")
+
+
+def start_simulator():
+    loop = asyncio.new_event_loop()
+    ready = threading.Event()
+
+    def run():
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(serve(HOST, 54321, TOKEN, SimulatedCooker()))
+        ready.set()
+        loop.run_forever()
+
+    threading.Thread(target=run, daemon=True).start()
+    ready.wait()
+
+
+def first_task(rounds: int):
+    start_simulator()
+    with tempfile.NamedTemporaryFile("w", suffix=".yaml", delete=False) as fp:
+        fp.write(CONFIG)
+
+    env = dict(os.environ, XDG_CACHE_HOME=tempfile.mkdtemp())
+    samples = []
+    for _ in range(rounds):
+        begin = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, "-c", FIRST_TASK, fp.name],
+            cwd=SRC,
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        samples.append(time.perf_counter() - begin)
+    os.unlink(fp.name)
+
+    miio, requests = result.stdout.split()
+    print(
+        f"spawn to first task(): median {statistics.median(samples) * 1000:.1f} ms, "
+        f"min {min(samples) * 1000:.1f} ms "
+        f"(miio loaded: {miio}, requests loaded: {requests})"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser("bench-startup")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    import_times(args.top)
+    first_task(args.rounds)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Compare get_prop round trips of a status read against a local fake eh1.
+
+Usage: python benchmarks/bench_status.py [--rtt-ms 40] [--limit 8] [--rounds 20]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from cooker import (  # noqa: E402
+    _MAX_PROPERTIES,
+    STATUS_PROPERTIES,
+    CookerError,
+    MultiCooker,
+)
+
+
+class FakeCooker(MultiCooker):
+    """MultiCooker answering get_prop locally with a simulated round trip time."""
+
+    def __init__(self, rtt: float, limit: int):
+        super().__init__("127.0.0.1", "0" * 32)
+        self.rtt = rtt
+        self.limit = limit
+        self.round_trips = 0
+
+    def send(self, command, parameters=None, retry_count=None, **kwargs):
+        self.round_trips += 1
+        time.sleep(self.rtt)
+        if len(parameters) > self.limit:
+            # What MultiCooker.send raises for an error reply of the firmware
+            raise CookerError({"code": -5001, "message": "too many properties"})
+        return [1 for _ in parameters]
+
+    def status_per_property(self):
+        return [self.send("get_prop", [prop])[0] for prop in STATUS_PROPERTIES]
+
+
+def measure(fn, cooker: FakeCooker, rounds: int):
+    cooker.round_trips = 0
+    begin = time.perf_counter()
+    for _ in range(rounds):
+        fn()
+    elapsed = time.perf_counter() - begin
+    return cooker.round_trips / rounds, elapsed / rounds * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser("bench-status")
+    parser.add_argument("--rtt-ms", type=float, default=40)
+    parser.add_argument("--limit", type=int, default=len(STATUS_PROPERTIES))
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    _MAX_PROPERTIES.clear()
+    cooker = FakeCooker(args.rtt_ms / 1000, args.limit)
+
+    trips, ms = measure(cooker.status_per_property, cooker, args.rounds)
+    print(f"per-property : {trips:5.1f} round trips  {ms:8.1f} ms/status")
+    trips, ms = measure(cooker.status, cooker, args.rounds)
+    print(f"batched      : {trips:5.1f} round trips  {ms:8.1f} ms/status")
+    print(f"learned batch size: {cooker._max_properties}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,440 @@
+"""Cook progress analytics over temperature histories.
+
+Stage segmentation, slope and plateau detection, anomaly detection and an ETA
+prediction learnt from past cooks of the same profile.
+
+The batch functions are vectorized with NumPy when it is installed and fall back to
+plain Python otherwise, both give the same results. NumPy is only imported on the
+first batch call, so importing this module stays cheap. :class:`CookProgress` follows a
+running cook sample by sample, every poll only adds the one or two samples appended
+since the previous one, so it stays scalar on purpose.
+"""
+from collections import deque
+from typing import Deque, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from cooker import STAGE_MARKER, CookerStatus, OperationMode, TemperatureHistory
+
+# NumPy once _numpy() has imported it, None before and when it is not installed
+np = None
+_numpy_checked = False
+
+# Seconds between two samples of the temperature history
+SAMPLE_SECONDS = 10
+
+# Samples used for the recent slope, about two minutes
+WINDOW = 12
+
+# |slope| (°C per sample) below which the temperature is considered flat
+PLATEAU_SLOPE = 0.1
+
+# Water is gone once the pot heats past boiling
+DRY_POT_TEMP = 120
+
+# Boiling pot cooling this fast (°C per sample) means the lid is open
+BOIL_TEMP = 95
+LID_OPEN_SLOPE = -1.0
+
+DRY_POT = "dry_pot"
+LID_OPEN = "lid_open"
+
+# Past cooks kept per profile for the ETA regression
+MAX_COOKS = 500
+
+# Below this many samples a single history is faster to segment in plain Python,
+# whose sums run over the memoryview in C, than to hand over to NumPy
+VECTORIZE_MIN_SAMPLES = 4096
+
+
+class Stage(NamedTuple):
+    """A cooking stage, sample indices exclude the 0xaa markers."""
+
+    index: int
+    begin: int
+    end: int
+    first: int
+    last: int
+    slope: float
+
+    @property
+    def plateau(self) -> bool:
+        return self.end - self.begin >= 2 and abs(self.slope) < PLATEAU_SLOPE
+
+
+def _numpy():
+    """Import NumPy on first use, None when it is not installed."""
+    global np, _numpy_checked
+    if not _numpy_checked:
+        _numpy_checked = True
+        try:
+            import numpy
+        except ImportError:  # pragma: no cover - optional dependency
+            numpy = None
+        np = numpy
+    return np
+
+
+def _slope(n, sy, sxy):
+    """Least squares slope of y over x = 0..n-1 from the running sums."""
+    sx = n * (n - 1) / 2
+    sxx = (n - 1) * n * (2 * n - 1) / 6
+    denominator = n * sxx - sx * sx
+    if np is not None and isinstance(n, np.ndarray):
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(denominator > 0, (n * sxy - sx * sy) / denominator, 0.0)
+    return (n * sxy - sx * sy) / denominator if denominator > 0 else 0.0
+
+
+def _segment_numpy(raw, session_begins) -> List[List[Stage]]:
+    """Segment several histories concatenated in ``raw`` in one pass.
+
+    A session boundary opens a new stage like a marker does, so every stage of every
+    session gets its own id and all sums are computed by a handful of bincounts.
+    """
+    is_sample = raw != STAGE_MARKER
+    samples = raw[is_sample].astype(np.float64)
+    markers = np.concatenate(([0], np.cumsum(~is_sample)))
+    # First stage id of every session, then of every sample
+    session_stages = markers[session_begins] + np.arange(len(session_begins))
+    stage_count = int(markers[-1]) + len(session_begins)
+    positions = np.flatnonzero(is_sample)
+    sessions = np.searchsorted(session_begins, positions, "right") - 1
+    stage_ids = markers[positions] + sessions
+
+    counts = np.bincount(stage_ids, minlength=stage_count)
+    ends = np.cumsum(counts)
+    begins = ends - counts
+    x = np.arange(len(samples)) - np.repeat(begins, counts)
+    sy = np.bincount(stage_ids, weights=samples, minlength=stage_count)
+    sxy = np.bincount(stage_ids, weights=x * samples, minlength=stage_count)
+    slopes = _slope(counts.astype(np.float64), sy, sxy)
+
+    filled = counts > 0
+    firsts = np.zeros(stage_count, dtype=np.int64)
+    lasts = np.zeros(stage_count, dtype=np.int64)
+    firsts[filled] = samples[begins[filled]]
+    lasts[filled] = samples[ends[filled] - 1]
+
+    rows = list(
+        zip(
+            begins.tolist(),
+            ends.tolist(),
+            firsts.tolist(),
+            lasts.tolist(),
+            slopes.tolist(),
+        )
+    )
+    bounds = session_stages.tolist() + [stage_count]
+    result = []
+    for first_stage, next_stage in zip(bounds, bounds[1:]):
+        offset = rows[first_stage][0]
+        result.append(
+            [
+                Stage(index, begin - offset, end - offset, first, last, slope)
+                for index, (begin, end, first, last, slope) in enumerate(
+                    rows[first_stage:next_stage]
+                )
+            ]
+        )
+    return result
+
+
+def _segment_python(history: TemperatureHistory) -> List[Stage]:
+    stages = []
+    begin = 0
+    for index, samples in enumerate(history.stages()):
+        n = len(samples)
+        sy = sum(samples)
+        sxy = sum(x * y for x, y in enumerate(samples))
+        stages.append(
+            Stage(
+                index,
+                begin,
+                begin + n,
+                samples[0] if n else 0,
+                samples[-1] if n else 0,
+                _slope(n, sy, sxy),
+            )
+        )
+        begin += n
+    return stages
+
+
+def segment(history: TemperatureHistory) -> List[Stage]:
+    """Split a history on the 0xaa markers with the slope of every stage."""
+    if len(history) >= VECTORIZE_MIN_SAMPLES and _numpy() is not None:
+        raw = np.frombuffer(history.data, dtype=np.uint8)
+        return _segment_numpy(raw, np.zeros(1, dtype=np.int64))[0]
+    return _segment_python(history)
+
+
+def segment_many(histories: List[TemperatureHistory]) -> List[List[Stage]]:
+    """:func:`segment` of many histories, vectorized over all of them at once."""
+    if not histories or _numpy() is None:
+        return [_segment_python(history) for history in histories]
+    lengths = np.fromiter((len(h) for h in histories), np.int64, len(histories))
+    session_begins = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    raw = np.frombuffer(b"".join(h.data for h in histories), dtype=np.uint8)
+    return _segment_numpy(raw, session_begins)
+
+
+def stage_starts(stages: Iterable[Stage]) -> Tuple[int, ...]:
+    return tuple(stage.begin for stage in stages)
+
+
+class CookProgress:
+    """Incremental view of a running cook, fed with the growing history."""
+
+    def __init__(self, window: int = WINDOW) -> None:
+        self.window = window
+        self.reset()
+
+    def reset(self):
+        self.stages: List[Stage] = []
+        self.samples = 0
+        self.max_temp = 0
+        self._consumed = 0
+        self._stage_begin = 0
+        self._n = 0
+        self._sy = 0
+        self._sxy = 0
+        self._first = 0
+        self._last = 0
+        self._recent: Deque[int] = deque(maxlen=self.window)
+
+    def update(self, history: TemperatureHistory) -> bool:
+        """Consume the samples appended since the previous call.
+
+        Returns True when the history started over, the previous cook is lost.
+        """
+        data = history.data
+        restarted = len(data) < self._consumed
+        if restarted:
+            self.reset()
+        for value in data[self._consumed :]:
+            self._add(value)
+        self._consumed = len(data)
+        return restarted
+
+    def _add(self, value: int):
+        if value == STAGE_MARKER:
+            self.stages.append(self.current)
+            self._stage_begin = self.samples
+            self._n = self._sy = self._sxy = 0
+            return
+
+        if not self._n:
+            self._first = value
+        self._sxy += self._n * value
+        self._sy += value
+        self._n += 1
+        self._last = value
+        self.samples += 1
+        self.max_temp = max(self.max_temp, value)
+        self._recent.append(value)
+
+    @property
+    def current(self) -> Stage:
+        """The stage in progress."""
+        return Stage(
+            len(self.stages),
+            self._stage_begin,
+            self.samples,
+            self._first if self._n else 0,
+            self._last if self._n else 0,
+            _slope(self._n, self._sy, self._sxy),
+        )
+
+    @property
+    def recent_slope(self) -> float:
+        """Slope over the last ``window`` samples, in °C per sample."""
+        recent = self._recent
+        return _slope(
+            len(recent), sum(recent), sum(x * y for x, y in enumerate(recent))
+        )
+
+    @property
+    def plateau(self) -> bool:
+        return (
+            len(self._recent) == self.window
+            and abs(self.recent_slope) < PLATEAU_SLOPE
+        )
+
+    def anomalies(self) -> List[str]:
+        anomalies = []
+        if not self._recent:
+            return anomalies
+        if self._last >= DRY_POT_TEMP:
+            anomalies.append(DRY_POT)
+        if (
+            len(self._recent) == self.window
+            and max(self._recent) >= BOIL_TEMP
+            and self.recent_slope <= LID_OPEN_SLOPE
+        ):
+            anomalies.append(LID_OPEN)
+        return anomalies
+
+
+def _fit(x, y) -> Tuple[float, float]:
+    """Intercept and slope of the least squares line, flat when x is constant."""
+    if _numpy() is not None:
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        x_mean = x.mean()
+        y_mean = y.mean()
+        variance = ((x - x_mean) ** 2).sum()
+        if not variance:
+            return float(y_mean), 0.0
+        slope = float(((x - x_mean) * (y - y_mean)).sum() / variance)
+        return float(y_mean - slope * x_mean), slope
+
+    n = len(x)
+    x_mean = sum(x) / n
+    y_mean = sum(y) / n
+    variance = sum((value - x_mean) ** 2 for value in x)
+    if not variance:
+        return y_mean, 0.0
+    slope = sum((a - x_mean) * (b - y_mean) for a, b in zip(x, y)) / variance
+    return y_mean - slope * x_mean, slope
+
+
+class EtaModel:
+    """Predict the length of a cook from past cooks of the same profile.
+
+    Every past cook is kept as the sample index each stage began at and its total
+    length. For a cook in stage k the total length is regressed on the start of
+    stage k over the past cooks that reached it, so a slow preheat (cold water, a
+    full pot) pushes the prediction back.
+    """
+
+    def __init__(self, max_cooks: int = MAX_COOKS) -> None:
+        self.max_cooks = max_cooks
+        self.cooks: Dict[Optional[str], Deque[Tuple[Tuple[int, ...], int]]] = {}
+        # (profile, stage) -> (cooks in the fit, intercept, slope)
+        self._fits: Dict[Tuple[Optional[str], int], Tuple[int, float, float]] = {}
+
+    def add(self, profile: Optional[str], starts: Tuple[int, ...], total: int):
+        cooks = self.cooks.get(profile)
+        if cooks is None:
+            cooks = self.cooks[profile] = deque(maxlen=self.max_cooks)
+        cooks.append((starts, total))
+        self._fits.clear()
+
+    def merge(self, other: "EtaModel"):
+        """Add the cooks of ``other`` as older than the ones already known."""
+        for profile, cooks in other.cooks.items():
+            known = self.cooks.get(profile, ())
+            self.cooks[profile] = deque(
+                list(cooks) + list(known), maxlen=self.max_cooks
+            )
+        self._fits.clear()
+
+    def add_history(self, profile: Optional[str], history: TemperatureHistory):
+        stages = segment(history)
+        self.add(profile, stage_starts(stages), stages[-1].end)
+
+    def learn(self, telemetry, profile: Optional[str] = None) -> int:
+        """Add the finished cooks recorded by a :class:`telemetry.DeviceTelemetry`.
+
+        All samples are read in a single range query and segmented together. Cooks
+        are filed under the menu recorded with their session, sessions recorded
+        without one under ``profile``.
+        """
+        sessions = telemetry.sessions()
+        if not sessions:
+            return 0
+        samples: Dict[int, bytearray] = {
+            session.session: bytearray() for session in sessions
+        }
+        begin = min(session.begin for session in sessions)
+        end = max(session.end for session in sessions)
+        for record in telemetry.temperature_range(begin, end):
+            buffer = samples.get(record.session)
+            if buffer is not None and record.index == len(buffer):
+                buffer.append(record.value)
+
+        menus = {session.session: session.menu for session in sessions}
+        cooks = [
+            (menus[session], buffer) for session, buffer in samples.items() if buffer
+        ]
+        histories = [TemperatureHistory(buffer.hex()) for _, buffer in cooks]
+        for (menu, _), stages in zip(cooks, segment_many(histories)):
+            self.add(menu or profile, stage_starts(stages), stages[-1].end)
+        return len(histories)
+
+    def _fit(self, profile: Optional[str], stage: int):
+        key = (profile, stage)
+        fit = self._fits.get(key)
+        if fit is None:
+            cooks = [
+                (starts[stage], total)
+                for starts, total in self.cooks.get(profile, ())
+                if len(starts) > stage
+            ]
+            intercept, slope = _fit(*zip(*cooks)) if cooks else (0.0, 0.0)
+            fit = self._fits[key] = (len(cooks), intercept, slope)
+        return fit
+
+    def predict_total(self, profile: Optional[str], stage: int, begin: int):
+        """Predicted number of samples of a cook whose ``stage`` began at ``begin``."""
+        count, intercept, slope = self._fit(profile, stage)
+        if count < 2 and profile is not None:
+            return self.predict_total(None, stage, begin)
+        if not count:
+            return None
+        return intercept + slope * begin
+
+    def remaining(self, profile: Optional[str], progress: CookProgress):
+        """Predicted seconds left for the running cook, None without past cooks."""
+        current = progress.current
+        total = self.predict_total(profile, current.index, current.begin)
+        if total is None:
+            return None
+        return max(0.0, total - progress.samples) * SAMPLE_SECONDS
+
+
+class CookTracker:
+    """Follow the cooks of one device: progress, anomalies and ETA.
+
+    Anomalies are reported once per cook, finished cooks feed the ETA model.
+    """
+
+    def __init__(self, eta: Optional[EtaModel] = None) -> None:
+        self.progress = CookProgress()
+        self.eta = eta or EtaModel()
+        self.profile: Optional[str] = None
+        self._reported: set = set()
+
+    def _finish(self):
+        progress = self.progress
+        if progress.samples:
+            stages = progress.stages + [progress.current]
+            self.eta.add(self.profile, stage_starts(stages), progress.samples)
+        progress.reset()
+        self._reported = set()
+
+    def observe(
+        self, status: CookerStatus, history: Optional[TemperatureHistory] = None
+    ) -> List[str]:
+        """Record a poll, returns the anomalies not reported yet for this cook."""
+        if status.mode != OperationMode.Running:
+            self._finish()
+            return []
+
+        self.profile = status.menu_id
+        if history is None:
+            return []
+        if self.progress.update(history):
+            self._reported = set()
+
+        anomalies = [
+            anomaly
+            for anomaly in self.progress.anomalies()
+            if anomaly not in self._reported
+        ]
+        self._reported.update(anomalies)
+        return anomalies
+
+    def remaining(self) -> Optional[float]:
+        if not self.progress.samples:
+            return None
+        return self.eta.remaining(self.profile, self.progress)
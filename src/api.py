@@ -0,0 +1,400 @@
+import asyncio
+import json
+from datetime import timedelta
+from http import HTTPStatus
+from typing import Dict, List, Optional, Set
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from config import Time
+from cooker import PROFILES, CookerException, CookerStatus
+from feed import StatusChange
+from logger import main_logger
+from scheduler import CookerScheduler
+
+# 请求头与请求体的大小上限（字节）
+MAX_HEADER_BYTES = 16 * 1024
+MAX_BODY_BYTES = 64 * 1024
+
+# 单个事件流客户端最多积压的事件数，超过后断开该客户端，不拖慢其他客户端
+CLIENT_BACKLOG = 256
+
+# 事件流空闲时发送注释保持连接的间隔（秒）
+KEEPALIVE_INTERVAL = 15
+
+# 预约完成时间的上限（分钟）
+MAX_SCHEDULE_MINUTES = 24 * 60
+
+
+class HttpError(Exception):
+    def __init__(self, status: int, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def status_json(status: Optional[CookerStatus]) -> Optional[dict]:
+    if status is None:
+        return None
+    return {
+        "mode": status.mode.name,
+        "menu": status.menu,
+        "stage": status.stage,
+        "properties": status.as_dict(),
+    }
+
+
+def change_json(change: StatusChange) -> dict:
+    return {
+        "device": change.device,
+        "seq": change.seq,
+        "at": change.at.isoformat(),
+        "online": change.changes is not None,
+        "changes": change.changes,
+    }
+
+
+def device_json(scheduler: CookerScheduler) -> dict:
+    feed = scheduler.feed
+    return {
+        "name": feed.device,
+        "online": feed.online,
+        "mode": feed.snapshot.mode.name if feed.online else None,
+        "seq": feed.seq,
+        "updated": feed.updated and feed.updated.isoformat(),
+        "status": status_json(feed.snapshot),
+    }
+
+
+def _response(status: int, payload) -> bytes:
+    body = json.dumps(payload, ensure_ascii=False).encode()
+    head = (
+        f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\n"
+        "Content-Type: application/json; charset=utf-8\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        "Connection: close\r\n\r\n"
+    )
+    return head.encode() + body
+
+
+def _event(name: str, payload, event_id: Optional[int] = None) -> bytes:
+    lines = [f"event: {name}"]
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append("data: " + json.dumps(payload, ensure_ascii=False))
+    return ("\n".join(lines) + "\n\n").encode()
+
+
+def _resumable(devices: Optional[Set[str]]) -> bool:
+    # 序号按设备递增，只有单台设备的事件流才能用作 Last-Event-ID
+    return devices is not None and len(devices) == 1
+
+
+class _Client:
+    """一个事件流连接，devices 为空时接收所有设备的变更"""
+
+    def __init__(self, devices: Optional[Set[str]]) -> None:
+        self.devices = devices
+        self.queue: asyncio.Queue = asyncio.Queue(CLIENT_BACKLOG)
+
+
+class ApiServer:
+    """本地 HTTP API
+
+    所有读取都来自调度器每轮轮询得到的快照（StatusFeed），事件流（Server-Sent Events）
+    由同一份变更扇出给所有客户端，因此客户端数量不影响对设备的访问次数。温度曲线在
+    HISTORY_TTL 内复用，开始、预约与停止等指令经由调度器下发，与轮询共用同一把锁串行执行。
+
+    - GET  /api/cookers                      所有小饭煲的状态
+    - GET  /api/cookers/<name>               单台小饭煲的状态
+    - GET  /api/cookers/<name>/status        完整状态快照
+    - GET  /api/cookers/<name>/mode          在线状态与模式
+    - GET  /api/cookers/<name>/history       温度曲线
+    - POST /api/cookers/<name>/start         {"profile": "FineRice"}
+    - POST /api/cookers/<name>/schedule      {"profile": "FineRice", "at": "18:00"}
+                                             或 {"profile": "FineRice", "minutes": 90}
+    - POST /api/cookers/<name>/stop
+    - GET  /api/cookers/<name>/events        单台小饭煲的事件流，支持 Last-Event-ID 续传
+    - GET  /api/events[?device=<name>]       所有（或指定的）小饭煲的事件流
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 8080) -> None:
+        self.host = host
+        self.port = port
+        self.schedulers: Dict[str, CookerScheduler] = {}
+        self.clients: List[_Client] = []
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    def attach(self, scheduler: CookerScheduler):
+        """开始提供该调度器的状态，订阅后调度器每轮都会读取完整状态"""
+        self.schedulers[scheduler.cooker_config.name] = scheduler
+        scheduler.feed.subscribe(self.publish)
+
+    def detach(self, scheduler: CookerScheduler):
+        self.schedulers.pop(scheduler.cooker_config.name, None)
+        scheduler.feed.unsubscribe(self.publish)
+
+    def publish(self, change: StatusChange):
+        """把一条变更分发给订阅了该设备的事件流客户端"""
+        for client in list(self.clients):
+            if client.devices and change.device not in client.devices:
+                continue
+            try:
+                client.queue.put_nowait(change)
+            except asyncio.QueueFull:
+                # 消费太慢的客户端直接断开，重连后从快照重新开始
+                self._disconnect(client)
+
+    def _disconnect(self, client: _Client):
+        self.clients.remove(client)
+        while not client.queue.empty():
+            client.queue.get_nowait()
+        client.queue.put_nowait(None)
+
+    async def start(self):
+        self._server = await asyncio.start_server(
+            self._handle, self.host, self.port, limit=MAX_HEADER_BYTES
+        )
+        main_logger.info("API 服务已启动：http://%s:%s/api/cookers", self.host, self.port)
+
+    async def close(self):
+        for client in list(self.clients):
+            self._disconnect(client)
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ):
+        try:
+            try:
+                await self._dispatch(reader, writer)
+            except HttpError as ex:
+                writer.write(_response(ex.status, {"error": ex.message}))
+            except (ConnectionError, asyncio.IncompleteReadError):
+                return
+            except Exception as ex:
+                main_logger.error(f"API 请求处理失败：{ex!r}")
+                writer.write(_response(500, {"error": repr(ex)}))
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader: asyncio.StreamReader):
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+        except asyncio.LimitOverrunError:
+            raise HttpError(431, "请求头过大")
+        lines = head.decode("latin-1").split("\r\n")
+        try:
+            method, target, _ = lines[0].split(" ", 2)
+        except ValueError:
+            raise HttpError(400, "请求行有误")
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                key, value = line.split(":", 1)
+                headers[key.strip().lower()] = value.strip()
+
+        body = b""
+        length = headers.get("content-length")
+        if length:
+            if not length.isdigit() or int(length) > MAX_BODY_BYTES:
+                raise HttpError(413, "请求体过大")
+            body = await reader.readexactly(int(length))
+        return method.upper(), target, headers, body
+
+    def _scheduler(self, name: str) -> CookerScheduler:
+        scheduler = self.schedulers.get(name)
+        if scheduler is None:
+            raise HttpError(404, f"没有名为 {name} 的小饭煲")
+        return scheduler
+
+    async def _dispatch(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ):
+        method, target, headers, body = await self._read_request(reader)
+        url = urlsplit(target)
+        parts = [unquote(part) for part in url.path.strip("/").split("/")]
+        if parts[:1] != ["api"]:
+            raise HttpError(404, "未知路径")
+        parts = parts[1:]
+
+        last_id = headers.get("last-event-id")
+        last_seq = int(last_id) if last_id and last_id.isdigit() else None
+        if parts == ["events"]:
+            self._expect(method, "GET")
+            devices = parse_qs(url.query).get("device")
+            for name in devices or []:
+                self._scheduler(name)
+            devices = set(devices) if devices else None
+            await self._stream(
+                writer, devices, last_seq if _resumable(devices) else None
+            )
+            return
+        if parts == ["cookers"]:
+            self._expect(method, "GET")
+            payload = {
+                "cookers": [
+                    device_json(scheduler) for scheduler in self.schedulers.values()
+                ]
+            }
+            writer.write(_response(200, payload))
+            return
+        if len(parts) not in (2, 3) or parts[0] != "cookers":
+            raise HttpError(404, "未知路径")
+
+        scheduler = self._scheduler(parts[1])
+        action = parts[2] if len(parts) == 3 else None
+        if action is None:
+            self._expect(method, "GET")
+            writer.write(_response(200, device_json(scheduler)))
+        elif action == "status":
+            self._expect(method, "GET")
+            if scheduler.feed.snapshot is None:
+                raise HttpError(503, "尚未读取到状态")
+            writer.write(_response(200, status_json(scheduler.feed.snapshot)))
+        elif action == "mode":
+            self._expect(method, "GET")
+            payload = device_json(scheduler)
+            writer.write(
+                _response(200, {"online": payload["online"], "mode": payload["mode"]})
+            )
+        elif action == "history":
+            self._expect(method, "GET")
+            history = await self._command(scheduler.temperature_history())
+            payload = {
+                "temperatures": history.temperatures,
+                "stages": [list(stage) for stage in history.stages()],
+            }
+            writer.write(_response(200, payload))
+        elif action == "events":
+            self._expect(method, "GET")
+            await self._stream(writer, {parts[1]}, last_seq)
+        elif action == "start":
+            self._expect(method, "POST")
+            profile = self._profile(self._json(body))
+            await self._command(scheduler.start(profile))
+            writer.write(_response(200, {"ok": True}))
+        elif action == "schedule":
+            self._expect(method, "POST")
+            data = self._json(body)
+            profile = self._profile(data)
+            minutes = self._minutes(scheduler, data)
+            await self._command(scheduler.start(profile, schedule=minutes))
+            writer.write(_response(200, {"ok": True, "minutes": minutes}))
+        elif action == "stop":
+            self._expect(method, "POST")
+            await self._command(scheduler.stop())
+            writer.write(_response(200, {"ok": True}))
+        else:
+            raise HttpError(404, "未知路径")
+
+    @staticmethod
+    def _expect(method: str, expected: str):
+        if method != expected:
+            raise HttpError(405, f"只支持 {expected}")
+
+    @staticmethod
+    def _json(body: bytes) -> dict:
+        try:
+            data = json.loads(body or b"{}")
+        except ValueError:
+            raise HttpError(400, "请求体不是有效的 JSON")
+        if not isinstance(data, dict):
+            raise HttpError(400, "请求体必须是 JSON 对象")
+        return data
+
+    @staticmethod
+    def _profile(data: dict) -> str:
+        profile = data.get("profile")
+        if profile not in PROFILES:
+            raise HttpError(400, f"profile 必须是 {list(PROFILES)} 之一")
+        return profile
+
+    @staticmethod
+    def _minutes(scheduler: CookerScheduler, data: dict) -> int:
+        """预约在多少分钟后完成，at 为完成时间，已过去时视为明天"""
+        if "at" in data:
+            try:
+                hour, minute = (int(value) for value in str(data["at"]).split(":"))
+                now = scheduler.clock.now()
+                finish = Time(hour, minute).to_today_time(now)
+            except ValueError:
+                raise HttpError(400, "at 的格式应为 HH:MM")
+            finish = finish.replace(second=0, microsecond=0)
+            if finish <= now:
+                finish += timedelta(days=1)
+            minutes = int((finish - now).total_seconds() // 60)
+        else:
+            minutes = data.get("minutes")
+        if (
+            not isinstance(minutes, int)
+            or isinstance(minutes, bool)
+            or not 0 < minutes <= MAX_SCHEDULE_MINUTES
+        ):
+            raise HttpError(400, f"预约时间必须在 1 ~ {MAX_SCHEDULE_MINUTES} 分钟之间")
+        return minutes
+
+    @staticmethod
+    async def _command(coroutine):
+        try:
+            return await coroutine
+        except CookerException as ex:
+            raise HttpError(502, f"设备返回错误：{ex}")
+
+    async def _stream(
+        self,
+        writer: asyncio.StreamWriter,
+        devices: Optional[Set[str]],
+        last_seq: Optional[int],
+    ):
+        """Server-Sent Events：先发送当前快照（或续传错过的变更），之后只发送变更"""
+        client = _Client(devices)
+        # 注册与生成快照之间没有 await，不会遗漏或重复变更
+        self.clients.append(client)
+        try:
+            initial = []
+            for name in devices or list(self.schedulers):
+                feed = self.schedulers[name].feed
+                missed = feed.since(last_seq) if last_seq is not None else None
+                if missed is None:
+                    event_id = feed.seq if _resumable(devices) else None
+                    payload = device_json(self.schedulers[name])
+                    initial.append(_event("snapshot", payload, event_id))
+                else:
+                    initial.extend(
+                        self._change_event(change, devices) for change in missed
+                    )
+
+            writer.write(
+                b"HTTP/1.1 200 OK\r\n"
+                b"Content-Type: text/event-stream; charset=utf-8\r\n"
+                b"Cache-Control: no-cache\r\n"
+                b"Connection: close\r\n\r\n" + b"".join(initial)
+            )
+            await writer.drain()
+            while True:
+                try:
+                    change = await asyncio.wait_for(
+                        client.queue.get(), KEEPALIVE_INTERVAL
+                    )
+                except asyncio.TimeoutError:
+                    writer.write(b": keepalive\n\n")
+                    await writer.drain()
+                    continue
+                if change is None:
+                    return
+                writer.write(self._change_event(change, devices))
+                await writer.drain()
+        finally:
+            if client in self.clients:
+                self.clients.remove(client)
+
+    @staticmethod
+    def _change_event(change: StatusChange, devices: Optional[Set[str]]) -> bytes:
+        event_id = change.seq if _resumable(devices) else None
+        return _event("change", change_json(change), event_id)
@@ -0,0 +1,457 @@
+import asyncio
+import time
+from typing import Dict, List, Optional
+
+from cooker import (
+    _MAX_PROPERTIES,
+    GROW_PROPERTIES_AFTER,
+    PROFILE_NAMES,
+    STATUS_PROPERTIES,
+    STATUS_TTL,
+    CookerError,
+    CookerException,
+    CookerStatus,
+    CookerTimeout,
+    OperationMode,
+    TemperatureHistory,
+    TemperatureHistoryReader,
+    build_profile_hex,
+)
+from logger import cooker_logger
+from metrics import (
+    HANDSHAKES,
+    PROBE_FAILURES,
+    RPC_ERRORS,
+    RPC_HEDGES,
+    RPC_RETRIES,
+    RPC_SECONDS,
+)
+from miio_protocol import HELLO, build, parse
+from session import MiioSession
+
+_LOGGER = cooker_logger
+
+MIIO_PORT = 54321
+
+# Reads without side effects, a duplicate request is harmless
+IDEMPOTENT_COMMANDS = frozenset({"get_prop", "get_temp_history", "miIO.info"})
+
+
+class _CookerProtocol(asyncio.DatagramProtocol):
+    """Datagram protocol routing miIO replies back to the waiting requests."""
+
+    def __init__(self, cooker: "AsyncMultiCooker") -> None:
+        self.cooker = cooker
+
+    def datagram_received(self, data: bytes, addr) -> None:
+        self.cooker._datagram_received(data)
+
+    def error_received(self, exc: Exception) -> None:
+        _LOGGER.debug("%s: datagram error: %s", self.cooker.ip, exc)
+
+
+class AsyncMultiCooker:
+    """Asyncio counterpart of :class:`cooker.MultiCooker`.
+
+    A single datagram endpoint is kept open for the lifetime of the object, requests
+    are matched to replies by their id so several of them can be in flight at once.
+
+    The device id and stamp live in a :class:`session.MiioSession`, which may be
+    restored from disk: a hello is only sent when there is no session yet or a
+    request timed out. The device silently drops packets with a stale device id or
+    stamp, so an authentication failure looks like a timeout on the wire.
+
+    Every request may carry a deadline and a retry budget. Idempotent reads can be
+    hedged: when no reply arrived after ``hedge_delay`` a duplicate is sent and the
+    first answer wins, which bounds the tail latency on lossy Wi-Fi. The status
+    probe behind :meth:`is_online` is hedged and bounded by ``probe_deadline``.
+    """
+
+    def __init__(
+        self,
+        ip: str,
+        token: str,
+        timeout: float = 5,
+        retry_count: int = 3,
+        status_ttl: float = STATUS_TTL,
+        port: int = MIIO_PORT,
+        session: Optional[MiioSession] = None,
+        probe_deadline: float = 2.0,
+        hedge_delay: float = 0.3,
+    ) -> None:
+        self.ip = ip
+        self.port = port
+        self.token = bytes.fromhex(token)
+        self.timeout = timeout
+        self.retry_count = retry_count
+        self.probe_deadline = probe_deadline
+        self.hedge_delay = hedge_delay
+
+        self._transport: Optional[asyncio.DatagramTransport] = None
+        self._connect_lock = asyncio.Lock()
+        self._hello: Optional[asyncio.Future] = None
+        self._waiters: Dict[int, asyncio.Future] = {}
+        self._id = 0
+
+        self.session = session or MiioSession()
+
+        self._max_properties = _MAX_PROPERTIES.get(ip, len(STATUS_PROPERTIES))
+        self._grow_after = GROW_PROPERTIES_AFTER
+        self._growing = False
+        self._batched_reads = 0
+        self._status_ttl = status_ttl
+        self._snapshot = None
+        self._snapshot_time = 0.0
+        self._history_reader = TemperatureHistoryReader()
+        self._rpc_metrics = {}
+        self._probe_failures = PROBE_FAILURES.labels(ip)
+        self._handshakes = HANDSHAKES.labels(ip)
+
+    async def _connect(self, timeout: float) -> bool:
+        """Open the endpoint and make sure there is a session, one hello at most."""
+        async with self._connect_lock:
+            if self._transport is None:
+                loop = asyncio.get_running_loop()
+                self._transport, _ = await loop.create_datagram_endpoint(
+                    lambda: _CookerProtocol(self), remote_addr=(self.ip, self.port)
+                )
+            if self.session.established:
+                return True
+
+            self._handshakes.inc()
+            self._hello = asyncio.get_running_loop().create_future()
+            self._transport.sendto(HELLO)
+            try:
+                header = await asyncio.wait_for(self._hello, timeout)
+            except asyncio.TimeoutError:
+                return False
+            finally:
+                self._hello = None
+
+            self.session.establish(header.device_id, header.stamp)
+            return True
+
+    def _datagram_received(self, data: bytes):
+        try:
+            header, payload = parse(self.token, data)
+        except Exception as ex:
+            _LOGGER.debug("%s: unable to parse datagram: %s", self.ip, ex)
+            return
+
+        if payload is None:
+            if self._hello is not None and not self._hello.done():
+                self._hello.set_result(header)
+            return
+
+        if header.device_id != self.session.device_id:
+            # Another device answers on this address now
+            _LOGGER.debug("%s: device id changed to %s", self.ip, header.device_id)
+            self.session.invalidate()
+            return
+
+        self.session.touch(header.stamp)
+        waiter = self._waiters.pop(payload.get("id"), None)
+        if waiter is not None and not waiter.done():
+            waiter.set_result(payload)
+
+    def _next_id(self) -> int:
+        self._id = (self._id + 1) % 0x7FFFFFFF or 1
+        return self._id
+
+    def _metrics(self, command: str):
+        metrics = self._rpc_metrics.get(command)
+        if metrics is None:
+            metrics = self._rpc_metrics[command] = (
+                RPC_SECONDS.labels(self.ip, command),
+                RPC_ERRORS.labels(self.ip, command, "timeout"),
+                RPC_ERRORS.labels(self.ip, command, "device"),
+                RPC_RETRIES.labels(self.ip, command),
+                RPC_HEDGES.labels(self.ip, command),
+            )
+        return metrics
+
+    async def send(
+        self,
+        command: str,
+        parameters: Optional[list] = None,
+        deadline: Optional[float] = None,
+        retries: Optional[int] = None,
+        hedge_delay: Optional[float] = None,
+    ):
+        """Send a command to the device and return its result.
+
+        :param deadline: Seconds after which :class:`cooker.CookerTimeout` is raised,
+            whatever the number of retries left.
+        :param retries: Retry budget, defaults to ``retry_count``.
+        :param hedge_delay: Send a duplicate of an idempotent request when no reply
+            arrived after this many seconds.
+        :raises CookerTimeout: The device did not answer in time.
+        :raises CookerError: The device answered with an error.
+        """
+        latency, timeouts, errors, retry_counter, hedges = self._metrics(command)
+        if command not in IDEMPOTENT_COMMANDS:
+            hedge_delay = None
+        begin = time.perf_counter()
+        try:
+            return await self._send(
+                command,
+                parameters,
+                deadline,
+                self.retry_count if retries is None else retries,
+                hedge_delay,
+                retry_counter,
+                hedges,
+            )
+        except CookerTimeout:
+            timeouts.inc()
+            raise
+        except CookerException:
+            errors.inc()
+            raise
+        finally:
+            latency.observe(time.perf_counter() - begin)
+
+    def _request(self, request_id: int, command: str, parameters: Optional[list]):
+        session = self.session
+        request = {"id": request_id, "method": command, "params": parameters or []}
+        self._transport.sendto(
+            build(self.token, session.device_id, session.stamp(), request)
+        )
+
+    async def _send(
+        self,
+        command: str,
+        parameters: Optional[list],
+        deadline: Optional[float],
+        retries: int,
+        hedge_delay: Optional[float],
+        retry_counter,
+        hedges,
+    ):
+        loop = asyncio.get_running_loop()
+        expires = None if deadline is None else loop.time() + deadline
+        for attempt in range(retries + 1):
+            timeout = self.timeout
+            if expires is not None:
+                timeout = min(timeout, expires - loop.time())
+                if timeout <= 0:
+                    break
+            if attempt:
+                retry_counter.inc()
+            if not await self._connect(timeout):
+                continue
+
+            waiter = loop.create_future()
+            request_ids = [self._next_id()]
+            self._waiters[request_ids[0]] = waiter
+            self._request(request_ids[0], command, parameters)
+            sent_at = loop.time()
+            try:
+                if hedge_delay is not None and hedge_delay < timeout:
+                    done, _ = await asyncio.wait((waiter,), timeout=hedge_delay)
+                    if not done:
+                        # Same waiter, whichever copy is answered first wins
+                        hedges.inc()
+                        request_ids.append(self._next_id())
+                        self._waiters[request_ids[1]] = waiter
+                        self._request(request_ids[1], command, parameters)
+                payload = await asyncio.wait_for(
+                    waiter, timeout - (loop.time() - sent_at)
+                )
+            except asyncio.TimeoutError:
+                _LOGGER.debug("%s: %s timed out, retrying", self.ip, command)
+                # The session may be stale, handshake again before the retry
+                self.session.invalidate()
+                continue
+            finally:
+                for request_id in request_ids:
+                    self._waiters.pop(request_id, None)
+
+            if "error" in payload:
+                raise CookerError(payload["error"])
+            return payload["result"]
+
+        raise CookerTimeout("No response from the device %s" % self.ip)
+
+    def close(self):
+        if self._transport is not None:
+            self._transport.close()
+            self._transport = None
+
+    async def status(
+        self, deadline: Optional[float] = None, retries: Optional[int] = None
+    ) -> CookerStatus:
+        """Retrieve properties.
+
+        :param deadline: Seconds all get_prop round trips together may take.
+        :param retries: Retry budget of every round trip, see :meth:`send`.
+        """
+        try:
+            values = await self._get_properties(STATUS_PROPERTIES, deadline, retries)
+        except Exception as ex:
+            self._set_snapshot(None, ex)
+            raise
+        status = CookerStatus.from_values(values)
+        self._set_snapshot(status.status, None)
+        return status
+
+    async def _get_properties(
+        self,
+        properties: List[str],
+        deadline: Optional[float] = None,
+        retries: Optional[int] = None,
+    ) -> list:
+        """See :meth:`cooker.MultiCooker._get_properties`."""
+        loop = asyncio.get_running_loop()
+        expires = None if deadline is None else loop.time() + deadline
+        values = []
+        index = 0
+        while index < len(properties):
+            batch = properties[index : index + self._max_properties]
+            remaining = None if expires is None else expires - loop.time()
+            if remaining is not None and remaining <= 0:
+                raise CookerTimeout("No response from the device %s" % self.ip)
+            try:
+                result = await self.send(
+                    "get_prop", batch, deadline=remaining, retries=retries
+                )
+            except CookerError:
+                if len(batch) == 1:
+                    raise
+                result = None
+
+            if result is None or len(result) != len(batch):
+                if len(batch) == 1:
+                    raise CookerException(
+                        "Unexpected response for property %s: %s" % (batch[0], result)
+                    )
+                self._set_max_properties(max(1, len(batch) // 2))
+                continue
+
+            values.extend(result)
+            index += len(batch)
+
+        self._batched_read()
+        return values
+
+    def _set_max_properties(self, max_properties: int):
+        _LOGGER.debug(
+            "Changing get_prop batch size of %s from %s to %s",
+            self.ip,
+            self._max_properties,
+            max_properties,
+        )
+        if self._growing and max_properties < self._max_properties:
+            # The larger batch still fails, the limit is real
+            self._grow_after *= 2
+        self._growing = max_properties > self._max_properties
+        self._max_properties = max_properties
+        self._batched_reads = 0
+        _MAX_PROPERTIES[self.ip] = max_properties
+
+    def _batched_read(self):
+        """Try a larger batch again after enough successful reads.
+
+        A halved batch size may come from a transient failure rather than the
+        firmware limit.
+        """
+        self._growing = False
+        if self._max_properties >= len(STATUS_PROPERTIES):
+            return
+        self._batched_reads += 1
+        if self._batched_reads >= self._grow_after:
+            self._set_max_properties(
+                min(len(STATUS_PROPERTIES), self._max_properties * 2)
+            )
+
+    async def _probe(self):
+        if (
+            self._snapshot is None
+            or time.monotonic() - self._snapshot_time > self._status_ttl
+        ):
+            try:
+                [status] = await self.send(
+                    "get_prop",
+                    ["status"],
+                    deadline=self.probe_deadline,
+                    hedge_delay=self.hedge_delay,
+                )
+                self._set_snapshot(status, None)
+            except Exception as ex:
+                self._probe_failures.inc()
+                self._set_snapshot(None, ex)
+        return self._snapshot
+
+    def _set_snapshot(self, status, error):
+        self._snapshot = (status, error)
+        self._snapshot_time = time.monotonic()
+
+    @property
+    def timed_out(self) -> bool:
+        """Whether the last probe ended in a timeout rather than an answer."""
+        return self._snapshot is not None and isinstance(
+            self._snapshot[1], CookerTimeout
+        )
+
+    def invalidate(self):
+        """Drop the cached status snapshot, the next reader probes the device again."""
+        self._snapshot = None
+
+    async def start(
+        self,
+        profile: str,
+        duration: int = None,
+        schedule: int = None,
+        akw: bool = None,
+        deadline: Optional[float] = None,
+        retries: Optional[int] = None,
+    ):
+        """Start cooking a profile."""
+        await self.send(
+            "set_start",
+            [build_profile_hex(profile, duration, schedule, akw)],
+            deadline=deadline,
+            retries=retries,
+        )
+        self.invalidate()
+        _LOGGER.info(
+            "启动烹饪：profile=%s duration=%s schedule=%s akw=%s",
+            PROFILE_NAMES.get(profile, "custom"),
+            duration,
+            schedule,
+            akw,
+        )
+
+    async def stop(
+        self, deadline: Optional[float] = None, retries: Optional[int] = None
+    ):
+        """Stop cooking."""
+        await self.send("cancel_cooking", [], deadline=deadline, retries=retries)
+        self.invalidate()
+        _LOGGER.info("停止烹饪")
+
+    async def menu(self, profile: str, duration: int, schedule: int, akw: bool):
+        """Select one of the default(?) cooking profiles."""
+        await self.send(
+            "set_menu", [build_profile_hex(profile, duration, schedule, akw)]
+        )
+        self.invalidate()
+
+    async def get_temperature_history(
+        self, deadline: Optional[float] = None, retries: Optional[int] = None
+    ) -> TemperatureHistory:
+        """Retrieves a temperature history."""
+        [data] = await self.send("get_temp_history", deadline=deadline, retries=retries)
+        return self._history_reader.update(data)
+
+    async def is_online(self) -> bool:
+        """Is Online?"""
+        status, error = await self._probe()
+        return error is None and status > 0
+
+    async def get_mode(self) -> OperationMode:
+        """mode"""
+        status, error = await self._probe()
+        if error is not None:
+            raise error
+        return OperationMode(status)
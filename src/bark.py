@@ -1,8 +1,14 @@
-import requests
+import queue
+import threading
+import time
+from typing import Dict, Optional, Tuple
+from urllib.parse import quote
 
 from logger import bark_logger
+from metrics import PUSH_SECONDS, PUSH_TOTAL
 
 TOKEN = ""
+SERVER = "https://api.day.app"
 
 
 def setToken(token: str):
@@ -10,25 +16,146 @@ def setToken(token: str):
     TOKEN = token
 
 
-def pushMessage(title: str, message: str):
-    if not TOKEN:
-        bark_logger.warning(f"bark token 未设置，无法推送消息：{message}")
-        return
+def setServer(server: str):
+    global SERVER
+    SERVER = server.rstrip("/")
+
+
+class PushDispatcher:
+    """后台推送线程，推送请求入队后立即返回，不阻塞轮询
+
+    - 有界队列，队列满时丢弃新消息
+    - 复用 keep-alive 连接，每个请求都有超时
+    - 失败时按指数退避重试
+    - 去重窗口内相同的标题和内容只推送一次
+    """
 
-    try:
-        res = requests.get(f"https://api.day.app/{TOKEN}/{title}/{message}")
+    def __init__(
+        self,
+        maxsize: int = 100,
+        timeout: float = 10,
+        retries: int = 3,
+        backoff: float = 1,
+        dedupe_window: float = 60,
+        pool_size: int = 4,
+    ) -> None:
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.dedupe_window = dedupe_window
+        self.pool_size = pool_size
+        self._session = None
 
-        data = res.json()
-        success = data and data["code"]
+        self._queue: "queue.Queue[Tuple[str, str, str, str]]" = queue.Queue(maxsize)
+        self._recent: Dict[Tuple[str, str], float] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
 
-        if success:
-            bark_logger.info(f"消息已推送：{message}")
-        else:
-            bark_logger.error(
-                f"消息推送失败[{data['code'] if data else -1}]：{message}"
+    @property
+    def session(self):
+        # requests 较重，首次推送时才在后台线程中导入
+        if self._session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=self.pool_size, pool_maxsize=self.pool_size
             )
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            self._session = session
+        return self._session
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="bark", daemon=True
+                )
+                self._thread.start()
+
+    def submit(self, server: str, token: str, title: str, message: str) -> bool:
+        """推送请求入队，被去重或队列已满时返回 False"""
+        self.start()
+        now = time.monotonic()
+        key = (title, message)
+        with self._lock:
+            last = self._recent.get(key)
+            if last is not None and now - last < self.dedupe_window:
+                bark_logger.debug("重复的消息已忽略：%s", message)
+                PUSH_TOTAL.labels("deduplicated").inc()
+                return False
+            try:
+                self._queue.put_nowait((server, token, title, message))
+            except queue.Full:
+                bark_logger.error("推送队列已满，消息已丢弃：%s", message)
+                PUSH_TOTAL.labels("dropped").inc()
+                return False
+            # 入队成功后才记录，被丢弃的消息可以立即重新推送
+            self._recent[key] = now
+            if len(self._recent) > 1024:
+                self._recent = {
+                    k: v
+                    for k, v in self._recent.items()
+                    if now - v < self.dedupe_window
+                }
+        return True
 
+    def join(self):
+        """等待队列中的消息全部处理完成"""
+        self._queue.join()
+
+    def _run(self):
+        while True:
+            server, token, title, message = self._queue.get()
+            try:
+                self._deliver(server, token, title, message)
+            finally:
+                self._queue.task_done()
+
+    def _deliver(self, server: str, token: str, title: str, message: str) -> bool:
+        begin = time.perf_counter()
+        success = self._send(server, token, title, message)
+        outcome = "success" if success else "failure"
+        PUSH_SECONDS.labels(outcome).observe(time.perf_counter() - begin)
+        PUSH_TOTAL.labels(outcome).inc()
         return success
-    except Exception as ex:
-        bark_logger.error("消息推送失败", ex)
+
+    def _send(self, server: str, token: str, title: str, message: str) -> bool:
+        url = f"{server}/{token}/{quote(title, safe='')}/{quote(message, safe='')}"
+        for attempt in range(self.retries + 1):
+            if attempt:
+                time.sleep(self.backoff * 2 ** (attempt - 1))
+            try:
+                res = self.session.get(url, timeout=self.timeout)
+                if res.status_code >= 500:
+                    bark_logger.warning("推送服务暂不可用[%s]，稍后重试", res.status_code)
+                    continue
+
+                data = res.json()
+                success = data and data["code"]
+
+                if success:
+                    bark_logger.info("消息已推送：%s", message)
+                else:
+                    bark_logger.error(
+                        "消息推送失败[%s]：%s", data["code"] if data else -1, message
+                    )
+                return bool(success)
+            except Exception as ex:
+                bark_logger.warning("消息推送失败，稍后重试：%r", ex)
+
+        bark_logger.error("消息推送失败：%s", message)
         return False
+
+
+DISPATCHER = PushDispatcher()
+
+
+def pushMessage(title: str, message: str):
+    if not TOKEN:
+        bark_logger.warning(f"bark token 未设置，无法推送消息：{message}")
+        return
+
+    return DISPATCHER.submit(SERVER, TOKEN, title, message)
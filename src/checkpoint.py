@@ -0,0 +1,49 @@
+import json
+import os
+import tempfile
+from typing import Optional
+
+from logger import main_logger
+
+
+class Checkpoint:
+    """单个小饭煲的调度状态检查点，重启后直接恢复，无需重新探测设备
+
+    状态未变化时不写盘，写入时先写临时文件再原子替换，不会留下写了一半的文件。
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._saved: Optional[dict] = None
+
+    def load(self) -> Optional[dict]:
+        try:
+            with open(self.path, encoding="utf8") as fp:
+                data = json.load(fp)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as ex:
+            main_logger.warning(f"检查点 {self.path} 无法读取，已忽略：{ex!r}")
+            return None
+
+        self._saved = data
+        return data
+
+    def save(self, data: dict):
+        if data == self._saved:
+            return
+
+        directory = os.path.dirname(self.path) or "."
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf8") as fp:
+                json.dump(data, fp, ensure_ascii=False)
+                fp.flush()
+                os.fsync(fp.fileno())
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+        self._saved = data
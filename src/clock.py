@@ -0,0 +1,39 @@
+import time
+from datetime import datetime, timedelta
+
+
+class Clock:
+    """时间来源，调度逻辑只通过它读取时间，回放时替换为 VirtualClock"""
+
+    def now(self) -> datetime:
+        return datetime.now()
+
+    def time(self) -> float:
+        return time.time()
+
+    def monotonic(self) -> float:
+        return time.monotonic()
+
+
+class VirtualClock(Clock):
+    """只在 advance() 时前进的虚拟时钟"""
+
+    def __init__(self, start: datetime) -> None:
+        self._now = start
+        self._monotonic = 0.0
+
+    def now(self) -> datetime:
+        return self._now
+
+    def time(self) -> float:
+        return self._now.timestamp()
+
+    def monotonic(self) -> float:
+        return self._monotonic
+
+    def advance(self, seconds: float):
+        self._now += timedelta(seconds=seconds)
+        self._monotonic += seconds
+
+
+SYSTEM_CLOCK = Clock()
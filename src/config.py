@@ -1,7 +1,11 @@
+import hashlib
+import ipaddress
 import os
+import pickle
 import re
-from datetime import datetime
-from typing import List
+from datetime import date, datetime
+from datetime import time as dt_time
+from typing import Dict, List, Optional, Tuple
 
 import yaml
 
@@ -13,11 +17,34 @@ class Time(tuple):
     def __repr__(self) -> str:
         return "Time(%s,%s)" % self
 
-    def to_today_time(self):
-        now = datetime.now()
+    def __getnewargs__(self):
+        return tuple(self)
+
+    def to_today_time(self, now: datetime = None):
+        now = now or datetime.now()
         hour, minutes = self
         return now.replace(hour=hour, minute=minutes)
 
+    def on(self, day: date) -> datetime:
+        """该时间在指定日期的时刻"""
+        hour, minutes = self
+        return datetime.combine(day, dt_time(hour, minutes))
+
+
+# 优先使用 libyaml 实现的 C 加速解析器
+ConfigLoader = type(
+    "ConfigLoader", (getattr(yaml, "CFullLoader", yaml.FullLoader),), {}
+)
+
+
+class ConfigObject(yaml.YAMLObject):
+    """配置对象的基类，只注册到 ConfigLoader，不影响全局的 yaml 解析器"""
+
+    yaml_loader = ConfigLoader
+
+    def __eq__(self, other) -> bool:
+        return type(self) is type(other) and vars(self) == vars(other)
+
 
 def time_representer(dumper: yaml.Dumper, data: Time):
     return dumper.represent_scalar("!time", "%s:%s" % data)
@@ -30,32 +57,32 @@ def time_constructor(loader: yaml.Loader, node: yaml.Node):
 
 
 yaml.add_representer(Time, time_representer)
-yaml.add_constructor("!time", time_constructor)
+ConfigLoader.add_constructor("!time", time_constructor)
 
 # see: https://dev.to/mkaranasou/python-yaml-configuration-with-environment-variables-parsing-2ha6
 
 # pattern for global vars: look for ${word}
-pattern = re.compile(".*?\${(\w+)}.*?")
-# the tag will be used to mark where to start searching for the pattern
-# e.g. somekey: !ENV somestring${MYENVVAR}blah blah blah
-yaml.add_implicit_resolver("!env", pattern, None)
+# 只展开显式标记了 !env 的值，e.g. somekey: !env somestring${MYENVVAR}blah blah blah
+pattern = re.compile(r"\$\{(\w+)\}")
 
 
 def env_constructor(loader: yaml.Loader, node: yaml.Node):
     value = loader.construct_scalar(node)
     match = pattern.findall(value)  # to find all env variables in line
     if match:
+        env = loader.__dict__.setdefault("env", {})
         full_value = value
         for g in match:
+            env[g] = os.environ.get(g)
             full_value = full_value.replace(f"${{{g}}}", os.environ.get(g, g))
         return full_value
     return value
 
 
-yaml.add_constructor("!env", env_constructor)
+ConfigLoader.add_constructor("!env", env_constructor)
 
 
-class Mealtime(yaml.YAMLObject):
+class Mealtime(ConfigObject):
     yaml_tag = "!Mealtime"
 
     def __init__(
@@ -67,16 +94,48 @@ class Mealtime(yaml.YAMLObject):
         super().__init__()
 
 
-class MealProfile(yaml.YAMLObject):
+class MealProfile(ConfigObject):
     yaml_tag = "!MealProfile"
 
-    def __init__(self, type: str, time: Mealtime) -> None:
+    # 生效的星期（1 ~ 7 表示周一至周日），为空时每天生效
+    weekdays: List[int] = None
+    # True 仅在工作日生效，False 仅在休息日生效，为空时不区分
+    workday: bool = None
+
+    def __init__(
+        self,
+        type: str,
+        time: Mealtime,
+        weekdays: List[int] = None,
+        workday: bool = None,
+    ) -> None:
         self.type = type
         self.time = time
+        self.weekdays = weekdays
+        self.workday = workday
         super().__init__()
 
 
-class CookerConfig(yaml.YAMLObject):
+class Calendar(ConfigObject):
+    yaml_tag = "!Calendar"
+
+    # 法定节假日等额外的休息日
+    holidays: List[date] = ()
+    # 调休等额外的工作日
+    workdays: List[date] = ()
+
+    def __init__(self, holidays: List[date] = (), workdays: List[date] = ()) -> None:
+        self.holidays = holidays
+        self.workdays = workdays
+        super().__init__()
+
+    def is_workday(self, day: date) -> bool:
+        if day in self.workdays:
+            return True
+        return day.weekday() < 5 and day not in self.holidays
+
+
+class CookerConfig(ConfigObject):
     yaml_tag = "!CookerConfig"
 
     def __init__(
@@ -103,30 +162,250 @@ class CookerConfig(yaml.YAMLObject):
         super().__init__()
 
 
-class PushConfig(yaml.YAMLObject):
+class PushConfig(ConfigObject):
     yaml_tag = "!PushConfig"
 
-    def __init__(self, token: str) -> None:
+    server = "https://api.day.app"
+    timeout = 10
+    retries = 3
+    dedupe_window = 60
+
+    def __init__(
+        self,
+        token: str,
+        server: str = "https://api.day.app",
+        timeout: float = 10,
+        retries: int = 3,
+        dedupe_window: float = 60,
+    ) -> None:
         self.token = token
+        self.server = server
+        self.timeout = timeout
+        self.retries = retries
+        self.dedupe_window = dedupe_window
         super().__init__()
 
 
-class Config(yaml.YAMLObject):
+class PollInterval(ConfigObject):
+    yaml_tag = "!PollInterval"
+
+    def __init__(self, min: float, max: float) -> None:
+        self.min = min
+        self.max = max
+        super().__init__()
+
+
+class LogConfig(ConfigObject):
+    yaml_tag = "!LogConfig"
+
+    queue = True
+    json = False
+    # 重复日志的限流窗口（秒），为 0 时不限流
+    rate_limit = 0
+
+    def __init__(
+        self, queue: bool = True, json: bool = False, rate_limit: float = 0
+    ) -> None:
+        self.queue = queue
+        self.json = json
+        self.rate_limit = rate_limit
+        super().__init__()
+
+
+class TelemetryConfig(ConfigObject):
+    yaml_tag = "!TelemetryConfig"
+
+    max_bytes = 64 * 1024 * 1024
+    segment_bytes = 1024 * 1024
+
+    def __init__(
+        self,
+        path: str,
+        max_bytes: int = 64 * 1024 * 1024,
+        segment_bytes: int = 1024 * 1024,
+    ) -> None:
+        self.path = path
+        self.max_bytes = max_bytes
+        self.segment_bytes = segment_bytes
+        super().__init__()
+
+
+class DiscoveryConfig(ConfigObject):
+    yaml_tag = "!DiscoveryConfig"
+
+    # 连续多少轮不可达后重新扫描网段
+    failures = 3
+    timeout = 1.0
+    port = 54321
+
+    def __init__(
+        self, subnet: str, failures: int = 3, timeout: float = 1.0, port: int = 54321
+    ) -> None:
+        self.subnet = subnet
+        self.failures = failures
+        self.timeout = timeout
+        self.port = port
+        super().__init__()
+
+
+class Config(ConfigObject):
     yaml_tag = "!Config"
 
+    # YAML 构造对象时不会调用 __init__，可选项的默认值放在类属性上
+    cooker_config: CookerConfig = None
+    cooker_configs: List[CookerConfig] = None
+    max_concurrency = 64
+    telemetry_config: TelemetryConfig = None
+    poll_intervals: Dict[str, PollInterval] = None
+    calendar: Calendar = None
+    # 调度状态检查点目录，为空时不保存
+    state_path: str = None
+    # 指标服务端口，为空时不启动
+    metrics_port: int = None
+    metrics_host = "127.0.0.1"
+    # 本地 HTTP API 端口，为空时不启动
+    api_port: int = None
+    api_host = "127.0.0.1"
+    log_config: LogConfig = None
+    # 设备地址变化后自动重新发现，为空时只使用配置的 ip
+    discovery_config: DiscoveryConfig = None
+
     def __init__(
-        self, poll_interval: int, cooker_config: CookerConfig, push_config: PushConfig
+        self,
+        poll_interval: int,
+        cooker_config: CookerConfig = None,
+        push_config: PushConfig = None,
+        cooker_configs: List[CookerConfig] = None,
+        max_concurrency: int = 64,
+        telemetry_config: TelemetryConfig = None,
+        poll_intervals: Dict[str, PollInterval] = None,
+        calendar: Calendar = None,
+        state_path: str = None,
+        metrics_port: int = None,
+        metrics_host: str = "127.0.0.1",
+        log_config: LogConfig = None,
+        discovery_config: DiscoveryConfig = None,
+        api_port: int = None,
+        api_host: str = "127.0.0.1",
     ) -> None:
         self.poll_interval = poll_interval
         self.cooker_config = cooker_config
+        self.cooker_configs = cooker_configs
         self.push_config = push_config
+        self.max_concurrency = max_concurrency
+        self.telemetry_config = telemetry_config
+        self.poll_intervals = poll_intervals
+        self.calendar = calendar
+        self.state_path = state_path
+        self.metrics_port = metrics_port
+        self.metrics_host = metrics_host
+        self.log_config = log_config
+        self.discovery_config = discovery_config
+        self.api_port = api_port
+        self.api_host = api_host
         super().__init__()
 
-
-def read_config(config_path: str) -> Config:
-    with open(
-        config_path,
-        encoding="utf8",
-    ) as fp:
-        config_content = fp.read()
-        return yaml.full_load(config_content)
+    def validate(self):
+        """校验配置，有误时抛出 ValueError"""
+        if not isinstance(self.poll_interval, (int, float)) or self.poll_interval <= 0:
+            raise ValueError(f"poll_interval 必须是正数：{self.poll_interval!r}")
+        cooker_configs = self.get_cooker_configs()
+        if not cooker_configs:
+            raise ValueError("至少需要配置一台小饭煲")
+        names = [cooker_config.name for cooker_config in cooker_configs]
+        if len(set(names)) != len(names):
+            raise ValueError(f"小饭煲名称不能重复：{names}")
+        for cooker_config in cooker_configs:
+            if not cooker_config.ip or not cooker_config.token:
+                raise ValueError(f"{cooker_config.name}缺少 ip 或 token")
+            for profile in cooker_config.meal_profile_list:
+                mealtime = profile.time
+                for value in (
+                    mealtime.usual_time,
+                    mealtime.earliest_time,
+                    mealtime.latest_time,
+                ):
+                    if not isinstance(value, Time):
+                        raise ValueError(f"{cooker_config.name}的就餐时间有误：{value!r}")
+        if self.push_config is None:
+            raise ValueError("缺少 push_config")
+        if self.discovery_config is not None:
+            try:
+                ipaddress.ip_network(self.discovery_config.subnet, strict=False)
+            except ValueError:
+                raise ValueError(
+                    f"discovery_config 的网段有误：{self.discovery_config.subnet!r}"
+                )
+
+    def get_cooker_configs(self) -> List[CookerConfig]:
+        """所有需要管理的小饭煲，兼容只配置了单个 cooker_config 的写法"""
+        cooker_configs = list(self.cooker_configs or [])
+        if self.cooker_config is not None:
+            cooker_configs.insert(0, self.cooker_config)
+        return cooker_configs
+
+
+def _cache_path(config_path: str) -> str:
+    cache_dir = os.path.join(
+        os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")),
+        "miio-better-cooker",
+    )
+    key = hashlib.sha256(os.path.abspath(config_path).encode("utf8")).hexdigest()
+    return os.path.join(cache_dir, f"config-{key[:16]}.pickle")
+
+
+def _load_cache(cache_path: str, digest: str) -> Optional[Config]:
+    try:
+        with open(cache_path, "rb") as fp:
+            cached_digest, env, config = pickle.load(fp)
+    except Exception:
+        return None
+    if cached_digest != digest:
+        return None
+    if any(os.environ.get(name) != value for name, value in env.items()):
+        return None
+    return config
+
+
+def _save_cache(cache_path: str, digest: str, env: dict, config: Config):
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        # 缓存中包含 token 等敏感信息，仅当前用户可读
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "wb") as fp:
+            pickle.dump((digest, env, config), fp, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        pass
+
+
+def parse_config(config_content: str) -> Tuple[Config, dict]:
+    """解析并校验配置，返回配置及其引用的环境变量"""
+    loader = ConfigLoader(config_content)
+    try:
+        config = loader.get_single_data()
+    finally:
+        loader.dispose()
+    if not isinstance(config, Config):
+        raise ValueError("配置文件的根节点必须是 !Config")
+    config.validate()
+    return config, loader.__dict__.get("env", {})
+
+
+def read_config(config_path: str, use_cache: bool = True) -> Config:
+    """读取配置，文件内容及其引用的环境变量均未变化时直接使用编译缓存"""
+    with open(config_path, "rb") as fp:
+        content = fp.read()
+
+    digest = hashlib.sha256(content).hexdigest()
+    cache_path = _cache_path(config_path)
+    if use_cache:
+        config = _load_cache(cache_path, digest)
+        if config is not None:
+            return config
+
+    config, env = parse_config(content.decode("utf8"))
+    if use_cache:
+        _save_cache(cache_path, digest, env, config)
+    return config
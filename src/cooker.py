@@ -1,11 +1,9 @@
 import enum
+import functools
 import math
-from collections import defaultdict
-from typing import List, Optional
+from typing import Any, Dict, List, Mapping, Optional, Sequence
 
 import crcmod
-from miio.device import Device, DeviceStatus
-from miio.exceptions import DeviceException
 
 from logger import cooker_logger
 
@@ -22,6 +20,10 @@ PROFILES = {
 
 _LOGGER = cooker_logger
 
+STAGE_MARKER = 0xAA
+
+_crc16 = crcmod.mkCrcFun(0x11021, rev=False, initCrc=0x0, xorOut=0x0)
+
 MODEL_MULTI = "chunmi.cooker.eh1"
 
 COOKING_STAGES = {
@@ -71,10 +73,83 @@ COOKING_MENUS = {
 }
 
 
-class CookerException(DeviceException):
+STATUS_PROPERTIES = [
+    "status",
+    "phase",
+    "menu",
+    "t_cook",
+    "t_left",
+    "t_pre",
+    "t_kw",
+    "taste",
+    "temp",
+    "rice",
+    "favs",
+    "akw",
+    "t_start",
+    "t_finish",
+    "version",
+    "setting",
+    "code",
+    "en_warm",
+    "t_congee",
+    "t_love",
+    "boil",
+]
+
+# Properties decoded to int, the others are kept as the device returns them
+INT_PROPERTIES = frozenset(
+    [
+        "status",
+        "phase",
+        "t_cook",
+        "t_left",
+        "t_pre",
+        "t_kw",
+        "temp",
+        "akw",
+        "t_start",
+        "t_finish",
+        "en_warm",
+        "t_congee",
+        "t_love",
+        "boil",
+    ]
+)
+
+# CookerStatus attribute holding each property
+STATUS_FIELDS = tuple(
+    "menu_id" if name == "menu" else name for name in STATUS_PROPERTIES
+)
+
+# Seconds a probed status snapshot is shared between readers
+STATUS_TTL = 5
+
+# Working get_prop batch size learned per device ip, shared by both clients and
+# by the cookers created again for the same address
+_MAX_PROPERTIES: Dict[str, int] = {}
+
+# Successful reads with a reduced get_prop batch size before the next larger size is
+# tried again, doubled whenever the larger size still fails
+GROW_PROPERTIES_AFTER = 20
+
+
+class CookerException(Exception):
     pass
 
 
+class CookerTimeout(CookerException):
+    """The device did not answer before the deadline, it may still be online."""
+
+
+class CookerError(CookerException):
+    """The device answered with an error."""
+
+    def __init__(self, error) -> None:
+        super().__init__(error)
+        self.code = error.get("code") if isinstance(error, dict) else None
+
+
 class OperationMode(enum.Enum):
     Waiting = 1
     Running = 2
@@ -88,7 +163,7 @@ class OperationMode(enum.Enum):
         return OperationMode.Unknown
 
 
-class TemperatureHistory(DeviceStatus):
+class TemperatureHistory:
     def __init__(self, data: str):
         """Container of temperatures recorded every 10-15 seconds while cooking.
 
@@ -115,22 +190,102 @@ class TemperatureHistory(DeviceStatus):
         Octet 2 (15): Second temperature measurement in hex (21 °C)
         Octet 3 (15): Third temperature measurement in hex (21 °C)
         ...
+
+        Octets of 0xaa separate the cooking stages.
         """
-        if not len(data) % 2:
-            self.data = [int(data[i : i + 2], 16) for i in range(0, len(data), 2)]
-        else:
-            self.data = []
+        samples = bytes.fromhex(data) if not len(data) % 2 else b""
+        self.data = memoryview(samples)
+        self.markers = _find_markers(samples)
+
+    @classmethod
+    def from_buffer(cls, data: memoryview, markers: List[int]) -> "TemperatureHistory":
+        """Wrap already decoded samples without copying them."""
+        history = cls.__new__(cls)
+        history.data = data
+        history.markers = markers
+        return history
 
     @property
     def temperatures(self) -> List[int]:
-        return self.data
+        return self.data.tolist()
 
     @property
     def raw(self) -> str:
-        return "".join([f"{value:02x}" for value in self.data])
+        return self.data.hex()
+
+    def stages(self) -> List[memoryview]:
+        """Samples of every cooking stage, split on the 0xaa markers."""
+        stages = []
+        begin = 0
+        for marker in self.markers:
+            stages.append(self.data[begin:marker])
+            begin = marker + 1
+        stages.append(self.data[begin:])
+        return stages
+
+    def __len__(self) -> int:
+        return len(self.data)
 
     def __str__(self) -> str:
-        return str(self.data)
+        return str(self.data.tolist())
+
+
+def _find_markers(samples: bytes, offset: int = 0) -> List[int]:
+    markers = []
+    index = samples.find(STAGE_MARKER)
+    while index != -1:
+        markers.append(offset + index)
+        index = samples.find(STAGE_MARKER, index + 1)
+    return markers
+
+
+class TemperatureHistoryReader:
+    """Decode a growing temperature history incrementally.
+
+    The device always returns the whole history, only the part appended since the
+    previous read is decoded. Samples live in a preallocated buffer which is written
+    in place, so histories handed out earlier stay valid and are never copied.
+    """
+
+    def __init__(self, capacity: int = 1024) -> None:
+        self._buffer = bytearray(capacity)
+        self._length = 0
+        self._markers: List[int] = []
+        self._tail = ""
+
+    def reset(self):
+        self._buffer = bytearray(len(self._buffer))
+        self._length = 0
+        self._markers = []
+        self._tail = ""
+
+    def update(self, data: str) -> TemperatureHistory:
+        if len(data) % 2:
+            self.reset()
+            return TemperatureHistory.from_buffer(memoryview(b""), [])
+
+        consumed = self._length * 2
+        if len(data) < consumed or data[max(0, consumed - 8) : consumed] != self._tail:
+            # A new cook started, the history no longer extends the previous one
+            self.reset()
+            consumed = 0
+
+        tail = bytes.fromhex(data[consumed:])
+        end = self._length + len(tail)
+        if end > len(self._buffer):
+            # Never resize in place, views on the old buffer stay untouched
+            buffer = bytearray(max(end, len(self._buffer) * 2))
+            buffer[: self._length] = self._buffer[: self._length]
+            self._buffer = buffer
+        self._buffer[self._length : end] = tail
+
+        self._markers.extend(_find_markers(tail, self._length))
+
+        self._length = end
+        self._tail = data[max(0, len(data) - 8) :]
+        return TemperatureHistory.from_buffer(
+            memoryview(self._buffer)[:end], list(self._markers)
+        )
 
 
 class MultiCookerProfile:
@@ -143,24 +298,19 @@ class MultiCookerProfile:
         schedule: int = None,
         akw: bool = None,
     ):
-        if len(profile_hex) < 5:
-            raise CookerException("Invalid profile")
-        else:
-            self.checksum = bytearray.fromhex(profile_hex)[-2:]
-            self.profile_bytes = bytearray.fromhex(profile_hex)[:-2]
+        self.profile_bytes = bytearray(_decode_profile(profile_hex))
+        # The checksum is only computed once the profile is serialized
+        self._checksum = None
 
-            if not self.is_valid():
-                raise CookerException("Profile checksum error")
+        self.set_schedule_enabled(False)
 
-            self.set_schedule_enabled(False)
-
-            if duration is not None:
-                self.set_duration(duration)
-            if schedule is not None and schedule > 0 and schedule <= 1440:
-                self.set_schedule_enabled(True)
-                self.set_schedule_duration(schedule)
-            if akw is not None:
-                self.set_akw_enabled(akw)
+        if duration is not None:
+            self.set_duration(duration)
+        if schedule is not None and schedule > 0 and schedule <= 1440:
+            self.set_schedule_enabled(True)
+            self.set_schedule_duration(schedule)
+        if akw is not None:
+            self.set_akw_enabled(akw)
 
     def is_set_duration_allowed(self):
         return (
@@ -220,16 +370,16 @@ class MultiCookerProfile:
         self.update_checksum()
 
     def calc_checksum(self):
-        crc = crcmod.mkCrcFun(0x11021, rev=False, initCrc=0x0, xorOut=0x0)(
-            self.profile_bytes
-        )
-        checksum = bytearray(2)
-        checksum[0] = (crc >> 8) & 0xFF
-        checksum[1] = crc & 0xFF
-        return checksum
+        return _calc_checksum(self.profile_bytes)
 
     def update_checksum(self):
-        self.checksum = self.calc_checksum()
+        self._checksum = None
+
+    @property
+    def checksum(self):
+        if self._checksum is None:
+            self._checksum = self.calc_checksum()
+        return self._checksum
 
     def is_valid(self):
         return len(self.profile_bytes) == 174 and self.checksum == self.calc_checksum()
@@ -238,20 +388,106 @@ class MultiCookerProfile:
         return (self.profile_bytes + self.checksum).hex()
 
 
-class CookerStatus(DeviceStatus):
-    def __init__(self, data):
-        self.data = data
+def _calc_checksum(data) -> bytearray:
+    crc = _crc16(data)
+    checksum = bytearray(2)
+    checksum[0] = (crc >> 8) & 0xFF
+    checksum[1] = crc & 0xFF
+    return checksum
 
-    @property
-    def mode(self) -> OperationMode:
-        """Current operation mode."""
-        return OperationMode(self.data["status"])
+
+@functools.lru_cache(maxsize=32)
+def _decode_profile(profile_hex: str) -> bytes:
+    """Decode and validate a profile once, returns the bytes without the checksum."""
+    if len(profile_hex) < 5:
+        raise CookerException("Invalid profile")
+
+    data = bytes.fromhex(profile_hex)
+    profile_bytes, checksum = data[:-2], data[-2:]
+    if len(profile_bytes) != 174 or checksum != _calc_checksum(profile_bytes):
+        raise CookerException("Profile checksum error")
+    return profile_bytes
+
+
+@functools.lru_cache(maxsize=64)
+def build_profile_hex(
+    profile: str, duration: int = None, schedule: int = None, akw: bool = None
+) -> str:
+    """Finished set_start/set_menu payload, cached per argument combination."""
+    return MultiCookerProfile(profile, duration, schedule, akw).get_profile_hex()
+
+
+PROFILE_NAMES = {profile_hex: name for name, profile_hex in PROFILES.items()}
+
+# Decode and validate the builtin profiles at startup
+for _profile_hex in PROFILES.values():
+    _decode_profile(_profile_hex)
+
+
+class CookerStatus:
+    """Snapshot of the status properties, every field is decoded once.
+
+    Attributes are named after the ``get_prop`` properties, except the raw menu id
+    which is kept in ``menu_id`` as ``menu`` is its display name.
+    """
+
+    __slots__ = ("mode",) + STATUS_FIELDS
+
+    def __init__(self, data: Mapping[str, Any]):
+        get = data.get
+        for name, field in zip(STATUS_PROPERTIES, STATUS_FIELDS):
+            value = get(name)
+            if value is not None and name in INT_PROPERTIES:
+                try:
+                    value = int(value)
+                except (TypeError, ValueError):
+                    value = None
+            setattr(self, field, value)
+        self.mode = OperationMode(self.status)
+
+    @classmethod
+    def from_values(cls, values: Sequence) -> "CookerStatus":
+        """Build from ``get_prop`` values listed in STATUS_PROPERTIES order."""
+        return cls(dict(zip(STATUS_PROPERTIES, values)))
+
+    def __repr__(self) -> str:
+        return "<CookerStatus mode=%s menu=%s stage=%s temperature=%s>" % (
+            self.mode,
+            self.menu,
+            self.stage,
+            self.temperature,
+        )
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, CookerStatus):
+            return NotImplemented
+        return all(
+            getattr(self, field) == getattr(other, field) for field in STATUS_FIELDS
+        )
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Decoded values keyed by property name."""
+        return {
+            name: getattr(self, field)
+            for name, field in zip(STATUS_PROPERTIES, STATUS_FIELDS)
+        }
+
+    def diff(self, previous: Optional["CookerStatus"]) -> Dict[str, Any]:
+        """Properties whose value changed since ``previous``, all of them if None."""
+        if previous is None:
+            return self.as_dict()
+        changes = {}
+        for name, field in zip(STATUS_PROPERTIES, STATUS_FIELDS):
+            value = getattr(self, field)
+            if value != getattr(previous, field):
+                changes[name] = value
+        return changes
 
     @property
     def menu(self) -> str:
         """Selected menu id."""
         try:
-            return COOKING_MENUS[self.data["menu"]]
+            return COOKING_MENUS[self.menu_id]
         except KeyError:
             return "Unknown menu"
 
@@ -259,7 +495,7 @@ class CookerStatus(DeviceStatus):
     def stage(self) -> str:
         """Current stage if cooking."""
         try:
-            return COOKING_STAGES[self.data["phase"]]["name"]
+            return COOKING_STAGES[self.phase]["name"]
         except KeyError:
             return "Unknown stage"
 
@@ -269,37 +505,39 @@ class CookerStatus(DeviceStatus):
 
         Example values: 29
         """
-        return self.data["temp"]
+        return self.temp
 
     @property
-    def start_time(self) -> int:
+    def start_time(self) -> Optional[int]:
         """Start time of cooking?"""
-        return int(self.data["t_start"])
+        return self.t_start
 
     @property
-    def remaining(self) -> int:
+    def remaining(self) -> Optional[int]:
         """Remaining minutes of the cooking process."""
-        return int(int(self.data["t_left"]) / 60)
+        if self.t_left is None:
+            return None
+        return self.t_left // 60
 
     @property
     def cooking_delayed(self) -> Optional[int]:
         """Wait n minutes before cooking / scheduled cooking."""
-        delay = int(self.data["t_pre"])
+        delay = self.t_pre
 
-        if delay >= 0:
+        if delay is not None and delay >= 0:
             return delay
 
         return None
 
     @property
-    def duration(self) -> int:
+    def duration(self) -> Optional[int]:
         """Duration of the cooking process."""
-        return int(self.data["t_cook"])
+        return self.t_cook
 
     @property
     def keep_warm(self) -> bool:
         """Keep warm after cooking?"""
-        return self.data["akw"] == 1
+        return self.akw == 1
 
     @property
     def settings(self) -> None:
@@ -316,110 +554,17 @@ class CookerStatus(DeviceStatus):
         """Firmware version."""
         return None
 
-    @property
-    def taste(self) -> None:
-        """Taste id."""
-        return self.data["taste"]
-
-    @property
-    def rice(self) -> None:
-        """Rice id."""
-        return self.data["rice"]
-
     @property
     def favorite(self) -> None:
         """Favored recipe id."""
-        return self.data["favs"]
-
-
-class MultiCooker(Device):
-    """Main class representing the multi cooker."""
-
-    _supported_models = [MODEL_MULTI]
-
-    def status(self) -> CookerStatus:
-        """Retrieve properties."""
-        properties = [
-            "status",
-            "phase",
-            "menu",
-            "t_cook",
-            "t_left",
-            "t_pre",
-            "t_kw",
-            "taste",
-            "temp",
-            "rice",
-            "favs",
-            "akw",
-            "t_start",
-            "t_finish",
-            "version",
-            "setting",
-            "code",
-            "en_warm",
-            "t_congee",
-            "t_love",
-            "boil",
-        ]
-
-        values = []
-        for prop in properties:
-            values.append(self.send("get_prop", [prop])[0])
-
-        properties_count = len(properties)
-        values_count = len(values)
-        if properties_count != values_count:
-            _LOGGER.debug(
-                "Count (%s) of requested properties does not match the "
-                "count (%s) of received values.",
-                properties_count,
-                values_count,
-            )
-
-        return CookerStatus(defaultdict(lambda: None, zip(properties, values)))
-
-    def start(
-        self, profile: str, duration: int = None, schedule: int = None, akw: bool = None
-    ):
-        """Start cooking a profile."""
-        cookerProfile = MultiCookerProfile(profile, duration, schedule, akw)
-        self.send("set_start", [cookerProfile.get_profile_hex()])
-        cooker_logger.info(
-            "启动烹饪：profile=%s duration=%s schedule=%s akw=%s",
-            profile,
-            duration,
-            schedule,
-            akw,
-        )
-
-    def stop(self):
-        """Stop cooking."""
-        self.send("cancel_cooking", [])
-        cooker_logger.info("停止烹饪")
+        return self.favs
 
-    def menu(self, profile: str, duration: int, schedule: int, akw: bool):
-        """Select one of the default(?) cooking profiles."""
-        cookerProfile = MultiCookerProfile(profile, duration, schedule, akw)
-        self.send("set_menu", [cookerProfile.get_profile_hex()])
 
-    def get_temperature_history(self) -> TemperatureHistory:
-        """Retrieves a temperature history.
+def __getattr__(name: str):
+    # python-miio imports click, cryptography and every device module it ships, only
+    # load it once the synchronous client is actually used
+    if name == "MultiCooker":
+        from sync_cooker import MultiCooker
 
-        The temperature is only available while cooking. Approx. six data points per
-        minute.
-        """
-        return TemperatureHistory(self.send("get_temp_history")[0])
-
-    def is_online(self):
-        """Is Online?"""
-        try:
-            [status] = self.send("get_prop", ["status"])
-            return status > 0
-        except Exception:
-            return False
-
-    def get_mode(self):
-        """mode"""
-        [mode] = self.send("get_prop", ["status"])
-        return OperationMode(mode)
\ No newline at end of file
+        return MultiCooker
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,267 @@
+import asyncio
+import os
+import signal
+from typing import Dict, Optional, Set
+
+import metrics
+from api import ApiServer
+from async_cooker import AsyncMultiCooker
+from bark import DISPATCHER, setServer, setToken
+from checkpoint import Checkpoint
+from config import Config, CookerConfig, PushConfig, read_config
+from discovery import Discovery
+from logger import main_logger
+from scheduler import CookerScheduler
+from session import SessionStore
+from telemetry import TelemetryStore
+
+# 检查配置文件是否变化的间隔（秒）
+WATCH_INTERVAL = 5
+
+
+def apply_push_config(push_config: PushConfig):
+    setToken(push_config.token)
+    setServer(push_config.server)
+    DISPATCHER.timeout = push_config.timeout
+    DISPATCHER.retries = push_config.retries
+    DISPATCHER.dedupe_window = push_config.dedupe_window
+
+
+class Daemon:
+    """管理所有小饭煲的轮询任务，并在配置文件变化或收到 SIGHUP 时热加载配置
+
+    热加载只应用变化的部分，已有设备的连接与调度状态保持不变，新配置无效时保持原样运行。
+    """
+
+    def __init__(self, config_path: str, config: Config) -> None:
+        self.config_path = config_path
+        self.config = config
+        self.schedulers: Dict[str, CookerScheduler] = {}
+        self.tasks: Dict[str, asyncio.Task] = {}
+        # 热加载时更换设备连接的任务，保留引用直到完成
+        self._reconnects: Set[asyncio.Task] = set()
+        self.semaphore: Optional[asyncio.Semaphore] = None
+        self.telemetry = (
+            TelemetryStore(
+                config.telemetry_config.path,
+                config.telemetry_config.max_bytes,
+                config.telemetry_config.segment_bytes,
+            )
+            if config.telemetry_config
+            else None
+        )
+        # 不同于调度检查点，miIO 会话按 ip 存放，设备改名后仍可复用
+        self.sessions = (
+            SessionStore(os.path.join(config.state_path, "sessions", "miio.json"))
+            if config.state_path
+            else None
+        )
+        self.discovery = (
+            Discovery(
+                config.discovery_config,
+                os.path.join(config.state_path, "sessions", "addresses.json")
+                if config.state_path
+                else None,
+            )
+            if config.discovery_config
+            else None
+        )
+        self.api = (
+            ApiServer(config.api_host, config.api_port) if config.api_port else None
+        )
+        self._stat = self._config_stat()
+
+        apply_push_config(config.push_config)
+        for cooker_config in config.get_cooker_configs():
+            self.schedulers[cooker_config.name] = self._create_scheduler(cooker_config)
+
+    def _config_stat(self):
+        try:
+            stat = os.stat(self.config_path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _create_cooker(self, cooker_config: CookerConfig) -> AsyncMultiCooker:
+        ip = (
+            self.discovery.address(cooker_config)
+            if self.discovery
+            else cooker_config.ip
+        )
+        return AsyncMultiCooker(
+            ip=ip,
+            token=cooker_config.token,
+            session=self.sessions.session(ip) if self.sessions else None,
+        )
+
+    def _create_scheduler(self, cooker_config: CookerConfig) -> CookerScheduler:
+        config = self.config
+        return CookerScheduler(
+            self._create_cooker(cooker_config),
+            cooker_config,
+            self.telemetry.device(cooker_config.name) if self.telemetry else None,
+            config.poll_intervals,
+            config.poll_interval,
+            config.calendar,
+            Checkpoint(os.path.join(config.state_path, f"{cooker_config.name}.json"))
+            if config.state_path
+            else None,
+        )
+
+    async def poll(self, scheduler: CookerScheduler):
+        """每台设备独立轮询，下一次轮询的时间由其当前状态决定"""
+        while True:
+            async with self.semaphore:
+                try:
+                    # 单个设备最多占用一个轮询周期，不拖慢其他设备
+                    await asyncio.wait_for(scheduler.task(), self.config.poll_interval)
+                except Exception as ex:
+                    main_logger.error(
+                        f"{scheduler.cooker_config.name}调度失败：{ex!r}"
+                    )
+            if self.discovery and self.discovery.should_resolve(
+                scheduler.poller.failures
+            ):
+                await self.rediscover(scheduler)
+            await scheduler.sleep(scheduler.next_delay())
+
+    async def rediscover(self, scheduler: CookerScheduler):
+        """设备连续不可达时重新发现其地址，地址变化后重新连接"""
+        cooker_config = scheduler.cooker_config
+        try:
+            result = await self.discovery.resolve(
+                cooker_config, scheduler.cooker.session.known_device_id
+            )
+        except Exception as ex:
+            main_logger.error(f"发现{cooker_config.name}失败：{ex!r}")
+            return
+        if result is None:
+            return
+
+        ip, header = result
+        if ip == scheduler.cooker.ip:
+            return
+        main_logger.info(f"{cooker_config.name}的地址已变为 {ip}，重新连接")
+        scheduler.cooker.close()
+        scheduler.cooker = self._create_cooker(cooker_config)
+        # 发现时的握手回复即可作为新地址的会话
+        scheduler.cooker.session.establish(header.device_id, header.stamp)
+
+    def _start(self, name: str):
+        if self.api:
+            self.api.attach(self.schedulers[name])
+        self.tasks[name] = asyncio.get_running_loop().create_task(
+            self.poll(self.schedulers[name]), name=name
+        )
+
+    def _stop(self, name: str):
+        task = self.tasks.pop(name, None)
+        if task is not None:
+            task.cancel()
+        scheduler = self.schedulers.pop(name)
+        if self.api:
+            self.api.detach(scheduler)
+        scheduler.cooker.close()
+
+    def _reconnect(self, scheduler: CookerScheduler, cooker_config: CookerConfig):
+        # apply() 是同步的，在锁内更换连接需要交给事件循环，避免打断进行中的轮询
+        task = asyncio.get_running_loop().create_task(
+            scheduler.reconnect(self._create_cooker(cooker_config))
+        )
+        self._reconnects.add(task)
+        task.add_done_callback(self._reconnects.discard)
+
+    def reload(self):
+        """重新读取配置文件，无效时保持当前配置"""
+        try:
+            config = read_config(self.config_path)
+        except Exception as ex:
+            main_logger.error(f"新配置无效，保持当前配置运行：{ex!r}")
+            return
+        self.apply(config)
+
+    def apply(self, config: Config):
+        old = self.config
+        self.config = config
+
+        if config.push_config != old.push_config:
+            apply_push_config(config.push_config)
+            main_logger.info("已更新推送配置")
+
+        for field in (
+            "max_concurrency",
+            "telemetry_config",
+            "state_path",
+            "metrics_port",
+            "metrics_host",
+            "discovery_config",
+            "api_port",
+            "api_host",
+        ):
+            if getattr(config, field) != getattr(old, field):
+                main_logger.warning(f"{field} 的修改需要重启后生效")
+
+        cooker_configs = {
+            cooker_config.name: cooker_config
+            for cooker_config in config.get_cooker_configs()
+        }
+        for name in list(self.schedulers):
+            if name not in cooker_configs:
+                self._stop(name)
+                main_logger.info(f"已移除{name}")
+
+        for name, cooker_config in cooker_configs.items():
+            scheduler = self.schedulers.get(name)
+            if scheduler is None:
+                self.schedulers[name] = self._create_scheduler(cooker_config)
+                self._start(name)
+                main_logger.info(f"已添加{name}")
+                continue
+
+            if (cooker_config.ip, cooker_config.token) != (
+                scheduler.cooker_config.ip,
+                scheduler.cooker_config.token,
+            ):
+                self._reconnect(scheduler, cooker_config)
+                main_logger.info(f"{name}的地址或 token 已变化，重新连接")
+
+            if (
+                cooker_config != scheduler.cooker_config
+                or config.poll_intervals != old.poll_intervals
+                or config.poll_interval != old.poll_interval
+                or config.calendar != old.calendar
+            ):
+                scheduler.reconfigure(
+                    cooker_config,
+                    config.poll_intervals,
+                    config.poll_interval,
+                    config.calendar,
+                )
+                main_logger.info(f"已更新{name}的调度配置")
+
+    async def watch(self):
+        """定期检查配置文件，变化时热加载"""
+        while True:
+            await asyncio.sleep(WATCH_INTERVAL)
+            stat = self._config_stat()
+            if stat is not None and stat != self._stat:
+                self._stat = stat
+                main_logger.info("配置文件已变化，重新加载")
+                self.reload()
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        self.semaphore = asyncio.Semaphore(self.config.max_concurrency)
+        try:
+            loop.add_signal_handler(signal.SIGHUP, self.reload)
+        except (NotImplementedError, AttributeError):
+            pass
+
+        if self.config.metrics_port:
+            metrics.serve(self.config.metrics_host, self.config.metrics_port)
+        if self.api:
+            await self.api.start()
+
+        for name in self.schedulers:
+            self._start(name)
+        await self.watch()
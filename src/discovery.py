@@ -0,0 +1,179 @@
+import asyncio
+import ipaddress
+import time
+from typing import Dict, Optional, Tuple
+
+from async_cooker import MIIO_PORT, AsyncMultiCooker
+from checkpoint import Checkpoint
+from config import CookerConfig, DiscoveryConfig
+from cooker import MODEL_MULTI, CookerException
+from logger import main_logger
+from miio_protocol import HEADER, HELLO, Header, parse_header
+from session import MiioSession
+
+# Same as sync_cooker.MultiCooker._supported_models, without importing python-miio
+SUPPORTED_MODELS = (MODEL_MULTI,)
+
+# 扫描间隔按 failures 轮的 1, 2, 4 ... 倍增长，最长每这么多倍扫描一次
+MAX_RESOLVE_SPACING = 32
+
+
+class _ScanProtocol(asyncio.DatagramProtocol):
+    def __init__(self, device_id: Optional[int]) -> None:
+        self.device_id = device_id
+        self.replies: Dict[str, Header] = {}
+        self.found = asyncio.get_running_loop().create_future()
+
+    def datagram_received(self, data: bytes, addr) -> None:
+        try:
+            header = parse_header(data)
+        except Exception:
+            return
+        # Hello replies are a bare header
+        if header.length != HEADER.size:
+            return
+        self.replies[addr[0]] = header
+        if header.device_id == self.device_id and not self.found.done():
+            self.found.set_result(addr[0])
+
+
+async def scan(
+    subnet: str,
+    timeout: float = 1.0,
+    port: int = MIIO_PORT,
+    device_id: Optional[int] = None,
+) -> Dict[str, Header]:
+    """Send a miIO hello to every host of the subnet at once.
+
+    A single socket is used for all probes, the replies collected within
+    ``timeout`` seconds are returned by address. The scan ends early once
+    ``device_id`` answered.
+    """
+    network = ipaddress.ip_network(subnet, strict=False)
+    hosts = list(network.hosts()) or [network.network_address]
+    transport, protocol = await asyncio.get_running_loop().create_datagram_endpoint(
+        lambda: _ScanProtocol(device_id),
+        local_addr=("0.0.0.0", 0),
+        allow_broadcast=True,
+    )
+    try:
+        for host in hosts:
+            transport.sendto(HELLO, (str(host), port))
+        try:
+            await asyncio.wait_for(asyncio.shield(protocol.found), timeout)
+        except asyncio.TimeoutError:
+            pass
+    finally:
+        transport.close()
+    return protocol.replies
+
+
+async def _is_cooker(
+    ip: str, token: str, header: Header, timeout: float, port: int
+) -> bool:
+    """Whether the token decrypts the answer of a supported model at ip."""
+    cooker = AsyncMultiCooker(
+        ip,
+        token,
+        timeout=timeout,
+        port=port,
+        session=MiioSession(header.device_id, header.stamp - time.time()),
+    )
+    try:
+        info = await cooker.send("miIO.info", deadline=timeout, retries=1)
+    except CookerException:
+        return False
+    finally:
+        cooker.close()
+    return isinstance(info, dict) and info.get("model") in SUPPORTED_MODELS
+
+
+async def resolve(
+    subnet: str,
+    token: str,
+    device_id: Optional[int] = None,
+    timeout: float = 1.0,
+    port: int = MIIO_PORT,
+) -> Optional[Tuple[str, Header]]:
+    """Find the cooker on the subnet, by device id when known or else by token.
+
+    Returns the address and its hello reply, ``None`` when nothing matches.
+    """
+    replies = await scan(subnet, timeout, port, device_id)
+    if device_id is not None:
+        for ip, header in replies.items():
+            if header.device_id == device_id:
+                return ip, header
+        return None
+
+    candidates = list(replies.items())
+    matches = await asyncio.gather(
+        *(_is_cooker(ip, token, header, timeout, port) for ip, header in candidates)
+    )
+    for (ip, header), match in zip(candidates, matches):
+        if match:
+            return ip, header
+    return None
+
+
+class Discovery:
+    """小饭煲地址的发现与缓存
+
+    设备连续多轮不可达时扫描配置的网段，仍找不到时按指数间隔重新扫描；按设备 id（未知时
+    按 token）找到设备的新地址。结果按小饭煲名称缓存，配置了 path 时持久化，重启后直接使用上次发现的地址；配置中的
+    ip 被修改后以新配置为准。
+    """
+
+    def __init__(self, config: DiscoveryConfig, path: str = None) -> None:
+        self.config = config
+        self.checkpoint = Checkpoint(path) if path else None
+        self.cache: Dict[str, dict] = {}
+        if self.checkpoint is not None:
+            self.cache = dict(self.checkpoint.load() or {})
+
+    def address(self, cooker_config: CookerConfig) -> str:
+        """小饭煲当前的地址"""
+        entry = self.cache.get(cooker_config.name)
+        if entry and entry.get("configured") == cooker_config.ip:
+            return entry.get("ip") or cooker_config.ip
+        return cooker_config.ip
+
+    def should_resolve(self, failures: int) -> bool:
+        """连续 failures 轮不可达后是否扫描网段"""
+        if failures <= 0 or failures % self.config.failures:
+            return False
+        rounds = failures // self.config.failures
+        return rounds & (rounds - 1) == 0 or rounds % MAX_RESOLVE_SPACING == 0
+
+    async def resolve(
+        self, cooker_config: CookerConfig, device_id: Optional[int] = None
+    ) -> Optional[Tuple[str, Header]]:
+        """扫描网段，返回小饭煲的地址及其握手回复，并更新缓存
+
+        device_id 为当前地址的 miIO 会话中记录的设备 id，缓存中没有时据此匹配回复。
+        """
+        entry = self.cache.get(cooker_config.name)
+        if entry and entry.get("configured") != cooker_config.ip:
+            entry = None
+        if entry and entry.get("device_id") is not None:
+            device_id = entry["device_id"]
+        result = await resolve(
+            self.config.subnet,
+            cooker_config.token,
+            device_id,
+            self.config.timeout,
+            self.config.port,
+        )
+        if result is None:
+            main_logger.info(f"未在 {self.config.subnet} 中发现{cooker_config.name}")
+            return None
+
+        ip, header = result
+        self.cache[cooker_config.name] = {
+            "configured": cooker_config.ip,
+            "ip": ip,
+            "device_id": header.device_id,
+        }
+        if self.checkpoint is not None:
+            self.checkpoint.save(dict(self.cache))
+        return result
@@ -0,0 +1,87 @@
+from collections import deque
+from datetime import datetime
+from typing import Any, Callable, Deque, Dict, List, NamedTuple, Optional
+
+from cooker import CookerStatus
+
+# 每台小饭煲保留的最近变更条数
+FEED_BACKLOG = 256
+
+
+class StatusChange(NamedTuple):
+    """一次轮询相对上一次快照变化的字段
+
+    changes 为 None 表示设备离线，重新上线时即使没有字段变化也会产生一条变更
+    """
+
+    device: str
+    seq: int
+    at: datetime
+    changes: Optional[Dict[str, Any]]
+
+
+class StatusFeed:
+    """单台小饭煲的状态变更流
+
+    每轮轮询的快照交给 update()，与上一次快照比较，只有字段发生变化时才产生 StatusChange
+    并通知订阅者，因此存储、日志及推送只需处理变化的字段。最近的变更保存在有限长度的缓冲区
+    中，断线重连的消费者可以通过 since() 补齐，落后太多时应重新读取 snapshot。
+    """
+
+    def __init__(self, device: str, backlog: int = FEED_BACKLOG) -> None:
+        self.device = device
+        self.snapshot: Optional[CookerStatus] = None
+        # 最近一次轮询的时间，不论状态是否变化
+        self.updated: Optional[datetime] = None
+        self.seq = 0
+        self.changes: Deque[StatusChange] = deque(maxlen=backlog)
+        self.subscribers: List[Callable[[StatusChange], None]] = []
+        self._online = False
+
+    def subscribe(self, callback: Callable[[StatusChange], None]):
+        self.subscribers.append(callback)
+
+    def unsubscribe(self, callback: Callable[[StatusChange], None]):
+        self.subscribers.remove(callback)
+
+    def update(
+        self, at: datetime, status: Optional[CookerStatus]
+    ) -> Optional[StatusChange]:
+        """记录本轮的快照，status 为 None 表示离线，没有变化时返回 None"""
+        self.updated = at
+        if status is None:
+            if not self._online:
+                return None
+            self._online = False
+            change = StatusChange(self.device, self.seq + 1, at, None)
+        else:
+            # 重新上线时与离线前的快照比较，设备状态可能在离线期间保持不变
+            changes = status.diff(self.snapshot)
+            if not changes and self._online:
+                return None
+            self._online = True
+            self.snapshot = status
+            change = StatusChange(self.device, self.seq + 1, at, changes)
+
+        self.seq = change.seq
+        self.changes.append(change)
+        for callback in list(self.subscribers):
+            callback(change)
+        return change
+
+    @property
+    def online(self) -> bool:
+        return self._online
+
+    def since(self, seq: int) -> Optional[List[StatusChange]]:
+        """序号大于 seq 的变更，已不在缓冲区中时返回 None
+
+        seq 大于当前序号说明它来自另一个变更流（例如进程重启前），同样返回 None
+        """
+        if seq == self.seq:
+            return []
+        if seq > self.seq:
+            return None
+        if not self.changes or self.changes[0].seq > seq + 1:
+            return None
+        return [change for change in self.changes if change.seq > seq]
@@ -1,4 +1,12 @@
+import atexit
+import copy
+import json
 import logging
+import queue
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional, Tuple
 
 logging.basicConfig(
     format="[%(asctime)s][%(levelname)s][%(name)s] %(message)s", level=logging.INFO
@@ -7,3 +15,136 @@ logging.basicConfig(
 main_logger = logging.getLogger("main")
 cooker_logger = logging.getLogger("cooker")
 bark_logger = logging.getLogger("bark")
+
+
+class JsonFormatter(logging.Formatter):
+    """每条日志输出为一行 JSON"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data["exc_info"] = record.exc_text
+        suppressed = getattr(record, "suppressed", 0)
+        if suppressed:
+            data["suppressed"] = suppressed
+        return json.dumps(data, ensure_ascii=False)
+
+
+class RateLimitFilter(logging.Filter):
+    """重复出现的日志在窗口期内只输出一次，之后输出时附带被抑制的条数
+
+    只限流显式声明了 extra={"rate_limit": ...} 的日志：值为字符串时作为限流的键，
+    可以把内容略有不同的同类日志（如每轮的探测超时）归为一组；为 True 时按格式化后的
+    消息判断。其余日志不受影响，不同设备、不同事件的日志不会互相抑制。
+    """
+
+    def __init__(self, window: float = 300) -> None:
+        super().__init__()
+        self.window = window
+        self._seen: Dict[Tuple[str, str], Tuple[float, int]] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        rate_limit = getattr(record, "rate_limit", None)
+        if not rate_limit or record.levelno >= logging.ERROR:
+            return True
+
+        key = (
+            record.name,
+            rate_limit if isinstance(rate_limit, str) else record.getMessage(),
+        )
+        now = time.monotonic()
+        with self._lock:
+            last, suppressed = self._seen.get(key, (None, 0))
+            if last is not None and now - last < self.window:
+                self._seen[key] = (last, suppressed + 1)
+                return False
+            self._seen[key] = (now, 0)
+            if len(self._seen) > 4096:
+                self._seen = {
+                    k: v for k, v in self._seen.items() if now - v[0] < self.window
+                }
+
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+
+class _LazyQueueHandler(QueueHandler):
+    """入队时只格式化消息本身，时间、JSON 等完整格式化由后台线程完成
+
+    与 QueueHandler 一样在入队时合并参数并丢弃 args 与 exc_info，参数对象在日志输出
+    之前被修改也不会影响日志内容，异常堆栈保存在 exc_text 中。
+    """
+
+    _formatter = logging.Formatter()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self._formatter.formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+
+class _SuppressedFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        message = super().format(record)
+        suppressed = getattr(record, "suppressed", 0)
+        if suppressed:
+            message += f"（此前 {suppressed} 条相同日志已省略）"
+        return message
+
+
+_listener: Optional[QueueListener] = None
+
+
+@atexit.register
+def _stop_listener():
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def setup_logging(
+    use_queue: bool = True, use_json: bool = False, rate_limit: float = 0
+):
+    """切换到后台线程输出日志，可选 JSON 格式与重复日志限流"""
+    global _listener
+
+    root = logging.getLogger()
+    stream_handler = logging.StreamHandler()
+    if use_json:
+        stream_handler.setFormatter(JsonFormatter())
+    else:
+        stream_handler.setFormatter(
+            _SuppressedFormatter("[%(asctime)s][%(levelname)s][%(name)s] %(message)s")
+        )
+
+    _stop_listener()
+
+    if use_queue:
+        log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+        handler: logging.Handler = _LazyQueueHandler(log_queue)
+        _listener = QueueListener(log_queue, stream_handler)
+        _listener.start()
+    else:
+        handler = stream_handler
+
+    if rate_limit:
+        handler.addFilter(RateLimitFilter(rate_limit))
+
+    for old_handler in root.handlers[:]:
+        root.removeHandler(old_handler)
+    root.addHandler(handler)
@@ -0,0 +1,200 @@
+from datetime import datetime
+from typing import Callable, List, NamedTuple, Optional, Union
+
+from config import CookerConfig, MealProfile
+from cooker import OperationMode
+from timeline import MealTimeline
+
+
+class ModeChanged(NamedTuple):
+    """设备状态变化，mode 为 None 表示离线"""
+
+    device: str
+    old: Optional[OperationMode]
+    new: Optional[OperationMode]
+    at: datetime
+
+
+class StartCooking(NamedTuple):
+    """处于就餐时间段内，立即开始烹饪"""
+
+    device: str
+    profile: MealProfile
+    begin: datetime
+    end: datetime
+    at: datetime
+
+
+class ScheduleCooking(NamedTuple):
+    """预约在下一就餐时间段的通常就餐时间完成烹饪"""
+
+    device: str
+    profile: MealProfile
+    usual_time: datetime
+    minutes: int
+    at: datetime
+
+
+class AlreadyScheduled(NamedTuple):
+    """上线时不处于等待模式，视为已调度"""
+
+    device: str
+    mode: OperationMode
+    at: datetime
+
+
+class KeepWarmReminder(NamedTuple):
+    """保温时间过长的第 count 次提醒，每次保温只在超时时提醒一次"""
+
+    device: str
+    since: datetime
+    count: int
+    at: datetime
+
+
+class StopKeepWarm(NamedTuple):
+    """保温时间过长，自动停止保温，每次保温只触发一次"""
+
+    device: str
+    since: datetime
+    at: datetime
+
+
+Event = Union[
+    ModeChanged,
+    StartCooking,
+    ScheduleCooking,
+    AlreadyScheduled,
+    KeepWarmReminder,
+    StopKeepWarm,
+]
+
+
+class CookerMachine:
+    """单台小饭煲的状态机
+
+    每轮轮询把探测到的状态交给 observe()，状态机根据 OperationMode 的变化更新调度状态并返回
+    本轮产生的事件，本身不做任何 IO。事件只在对应的状态变化时产生一次，调用方据此下发
+    指令，之后通过 publish() 通知订阅者（日志、推送等），因此每个指令与通知每次状态变化
+    至多发出一次。指令下发失败时调用方应通过 rollback() 撤销尚未完成的事件，下一轮重试。
+    """
+
+    def __init__(self, cooker_config: CookerConfig, timeline: MealTimeline, state):
+        self.cooker_config = cooker_config
+        self.timeline = timeline
+        self.state = state
+        self.subscribers: List[Callable[[Event], None]] = []
+
+    def subscribe(self, callback: Callable[[Event], None]):
+        self.subscribers.append(callback)
+
+    def unsubscribe(self, callback: Callable[[Event], None]):
+        self.subscribers.remove(callback)
+
+    def publish(self, event: Event):
+        for callback in list(self.subscribers):
+            callback(event)
+
+    @property
+    def mode(self) -> Optional[OperationMode]:
+        """上一轮的状态，离线时为 None"""
+        return self.state.last_mode if self.state.online else None
+
+    def observe(self, now: datetime, mode: Optional[OperationMode]) -> List[Event]:
+        """记录本轮探测到的状态，mode 为 None 表示离线，返回需要处理的事件"""
+        name = self.cooker_config.name
+        state = self.state
+        events: List[Event] = []
+
+        previous = self.mode
+        if mode != previous:
+            events.append(ModeChanged(name, previous, mode, now))
+
+        if mode is None:
+            state.online = False
+            state.scheduled = False
+            self._end_keep_warm()
+            return events
+
+        if mode == OperationMode.AutoKeepWarm:
+            if state.last_mode is None or state.last_mode == OperationMode.Running:
+                self._end_keep_warm()
+                state.last_akm_begin_time = now
+        else:
+            self._end_keep_warm()
+        state.last_mode = mode
+        state.online = True
+
+        events.extend(self._check_keep_warm(now))
+        events.extend(self._schedule(now, mode))
+        return events
+
+    def rollback(self, event: Event):
+        """撤销 observe() 为该事件记下的调度状态，使其在下一轮重新产生"""
+        state = self.state
+        if isinstance(event, (StartCooking, ScheduleCooking, AlreadyScheduled)):
+            state.scheduled = False
+        elif isinstance(event, StopKeepWarm):
+            state.akw_stopped = False
+        elif isinstance(event, KeepWarmReminder):
+            state.unplugged_check_push_count = event.count - 1
+            state.akw_reminded = False
+
+    def _end_keep_warm(self):
+        state = self.state
+        state.last_akm_begin_time = None
+        state.unplugged_check_push_count = 0
+        state.akw_reminded = False
+        state.akw_stopped = False
+
+    def _check_keep_warm(self, now: datetime) -> List[Event]:
+        cooker_config = self.cooker_config
+        state = self.state
+        since = state.last_akm_begin_time
+        if (
+            not cooker_config.unpluggedCheck
+            or since is None
+            or (now - since).total_seconds() / 60 <= cooker_config.unpluggedMaxDuration
+        ):
+            return []
+
+        events: List[Event] = []
+        count = state.unplugged_check_push_count
+        if not state.akw_reminded and count < cooker_config.unpluggedMaxReminderCount:
+            # 只在进入长时间保温时提醒，之后的轮询不再重复
+            state.akw_reminded = True
+            state.unplugged_check_push_count += 1
+            events.append(
+                KeepWarmReminder(
+                    cooker_config.name, since, state.unplugged_check_push_count, now
+                )
+            )
+        if cooker_config.unpluggedAutoStopAkw and not state.akw_stopped:
+            state.akw_stopped = True
+            events.append(StopKeepWarm(cooker_config.name, since, now))
+        return events
+
+    def _schedule(self, now: datetime, mode: OperationMode) -> List[Event]:
+        name = self.cooker_config.name
+        state = self.state
+        if state.scheduled:
+            return []
+
+        if mode != OperationMode.Waiting:
+            state.scheduled = True
+            return [AlreadyScheduled(name, mode, now)]
+
+        # 基本算法是，若当前时间恰好处于某一个就餐时间段内，则自动执行烹饪操作，否则将预约下一时间段的通常就餐时间开始烹饪
+        current, upcoming = self.timeline.lookup(now)
+        if current is not None:
+            state.scheduled = True
+            return [
+                StartCooking(name, current.profile, current.begin, current.end, now)
+            ]
+        if upcoming is not None:
+            state.scheduled = True
+            minutes = (upcoming.usual - now).seconds // 60
+            return [
+                ScheduleCooking(name, upcoming.profile, upcoming.usual, minutes, now)
+            ]
+        return []
@@ -0,0 +1,216 @@
+"""Minimal in-process metrics served in the Prometheus text format.
+
+Histograms preallocate their buckets and children are created once per label set,
+callers keep a reference to the child so recording on the hot path is a bisect and
+a few integer increments.
+"""
+import bisect
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from logger import main_logger
+
+# Seconds, suitable for UDP round trips on a LAN as well as HTTPS pushes
+DEFAULT_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+
+class Counter:
+    __slots__ = ("value",)
+
+    def __init__(self) -> None:
+        self.value = 0
+
+    def inc(self, amount: int = 1):
+        self.value += amount
+
+
+class Histogram:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: Sequence[float]) -> None:
+        self.bounds = bounds
+        # The last slot collects observations above the largest bound (+Inf)
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class _Family:
+    def __init__(self, kind: str, name: str, help: str, labels: Sequence[str]):
+        self.kind = kind
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self.children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    def _create(self):
+        raise NotImplementedError
+
+    def labels(self, *values: str):
+        child = self.children.get(values)
+        if child is None:
+            with self._lock:
+                child = self.children.get(values)
+                if child is None:
+                    child = self.children[values] = self._create()
+        return child
+
+    def _label_text(self, values: Tuple[str, ...], extra: str = "") -> str:
+        pairs = [
+            '%s="%s"' % (name, _escape(value))
+            for name, value in zip(self.label_names, values)
+        ]
+        if extra:
+            pairs.append(extra)
+        return "{%s}" % ",".join(pairs) if pairs else ""
+
+
+class CounterFamily(_Family):
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        super().__init__("counter", name, help, labels)
+
+    def _create(self) -> Counter:
+        return Counter()
+
+    def render(self, lines: List[str]):
+        for values, counter in list(self.children.items()):
+            lines.append(f"{self.name}{self._label_text(values)} {counter.value}")
+
+
+class HistogramFamily(_Family):
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__("histogram", name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def _create(self) -> Histogram:
+        return Histogram(self.buckets)
+
+    def render(self, lines: List[str]):
+        for values, histogram in list(self.children.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, histogram.counts):
+                cumulative += count
+                label = self._label_text(values, 'le="%s"' % bound)
+                lines.append(f"{self.name}_bucket{label} {cumulative}")
+            label = self._label_text(values, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{label} {histogram.count}")
+            label = self._label_text(values)
+            lines.append(f"{self.name}_sum{label} {histogram.sum}")
+            lines.append(f"{self.name}_count{label} {histogram.count}")
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Registry:
+    def __init__(self) -> None:
+        self.families: Dict[str, _Family] = {}
+
+    def _register(self, family: _Family) -> _Family:
+        return self.families.setdefault(family.name, family)
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = ()):
+        return self._register(CounterFamily(name, help, labels))
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        return self._register(HistogramFamily(name, help, labels, buckets))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for family in list(self.families.values()):
+            lines.append(f"# HELP {family.name} {family.help}")
+            lines.append(f"# TYPE {family.name} {family.kind}")
+            family.render(lines)
+        lines.append("")
+        return "\n".join(lines)
+
+
+REGISTRY = Registry()
+
+RPC_SECONDS = REGISTRY.histogram(
+    "cooker_rpc_seconds", "miIO request latency", ("device", "method")
+)
+RPC_ERRORS = REGISTRY.counter(
+    "cooker_rpc_errors_total", "Failed miIO requests", ("device", "method", "kind")
+)
+RPC_RETRIES = REGISTRY.counter(
+    "cooker_rpc_retries_total", "Retransmitted miIO requests", ("device", "method")
+)
+RPC_HEDGES = REGISTRY.counter(
+    "cooker_rpc_hedges_total", "Hedged duplicate miIO requests", ("device", "method")
+)
+HANDSHAKES = REGISTRY.counter(
+    "cooker_handshakes_total", "miIO hello handshakes sent", ("device",)
+)
+PROBE_FAILURES = REGISTRY.counter(
+    "cooker_probe_failures_total",
+    "Status probes whose exception was swallowed by is_online()",
+    ("device",),
+)
+TICK_SECONDS = REGISTRY.histogram(
+    "scheduler_tick_seconds", "Duration of a scheduler task() tick", ("device",)
+)
+PUSH_SECONDS = REGISTRY.histogram("push_seconds", "Bark push latency", ("outcome",))
+PUSH_TOTAL = REGISTRY.counter("push_total", "Bark pushes by outcome", ("outcome",))
+
+
+def serve(
+    host: str = "127.0.0.1", port: int = 9464, registry: Optional[Registry] = None
+):
+    """Serve /metrics from a daemon thread."""
+    # 仅在启用指标端点时才导入 http.server
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    registry = registry or REGISTRY
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?", 1)[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.render().encode("utf8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    main_logger.info(f"指标服务已启动：http://{host}:{port}/metrics")
+    return server
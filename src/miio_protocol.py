@@ -0,0 +1,96 @@
+"""Encoding and decoding of miIO UDP packets.
+
+Only what the cooker clients and the simulator need, so the daemon does not have to
+import the whole python-miio package. Packet layout (all fields big endian)::
+
+    0x2131 | length (2) | unknown (4) | device id (4) | stamp (4) | checksum (16)
+    encrypted payload ...
+
+The payload is JSON encrypted with AES-128-CBC, key = md5(token) and
+iv = md5(key + token). The checksum is md5 over the header, the token and the
+encrypted payload.
+"""
+import hashlib
+import json
+import struct
+from typing import NamedTuple, Optional
+
+from cryptography.hazmat.primitives import padding
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+
+MAGIC = 0x2131
+HEADER = struct.Struct(">HHIII16s")
+
+HELLO = bytes.fromhex(
+    "21310020ffffffffffffffffffffffffffffffffffffffffffffffffffffffff"
+)
+
+
+class Header(NamedTuple):
+    length: int
+    unknown: int
+    device_id: int
+    stamp: int
+    checksum: bytes
+
+
+class ProtocolError(Exception):
+    pass
+
+
+def _md5(data: bytes) -> bytes:
+    return hashlib.md5(data).digest()
+
+
+def _cipher(token: bytes) -> Cipher:
+    key = _md5(token)
+    iv = _md5(key + token)
+    return Cipher(algorithms.AES(key), modes.CBC(iv))
+
+
+def encrypt(token: bytes, plaintext: bytes) -> bytes:
+    padder = padding.PKCS7(128).padder()
+    padded = padder.update(plaintext) + padder.finalize()
+    encryptor = _cipher(token).encryptor()
+    return encryptor.update(padded) + encryptor.finalize()
+
+
+def decrypt(token: bytes, ciphertext: bytes) -> bytes:
+    decryptor = _cipher(token).decryptor()
+    padded = decryptor.update(ciphertext) + decryptor.finalize()
+    unpadder = padding.PKCS7(128).unpadder()
+    return unpadder.update(padded) + unpadder.finalize()
+
+
+def build_hello_reply(device_id: int, stamp: int, checksum: bytes = b"\xff" * 16):
+    return HEADER.pack(MAGIC, HEADER.size, 0, device_id, stamp, checksum)
+
+
+def build(token: bytes, device_id: int, stamp: int, payload: dict) -> bytes:
+    encrypted = encrypt(token, json.dumps(payload).encode("utf8") + b"\x00")
+    length = HEADER.size + len(encrypted)
+    header = HEADER.pack(MAGIC, length, 0, device_id, stamp, b"\x00" * 16)
+    checksum = _md5(header[:16] + token + encrypted)
+    return header[:16] + checksum + encrypted
+
+
+def parse_header(data: bytes) -> Header:
+    if len(data) < HEADER.size:
+        raise ProtocolError("Packet too short: %s bytes" % len(data))
+    magic, *fields = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ProtocolError("Invalid magic: %#x" % magic)
+    return Header(*fields)
+
+
+def parse(token: bytes, data: bytes) -> "tuple[Header, Optional[dict]]":
+    """Return the header and the decrypted payload, ``None`` for hello packets."""
+    header = parse_header(data)
+    if header.length == HEADER.size:
+        return header, None
+
+    encrypted = data[HEADER.size : header.length]
+    if _md5(data[:16] + token + encrypted) != header.checksum:
+        raise ProtocolError("Checksum mismatch")
+    plaintext = decrypt(token, encrypted).rstrip(b"\x00")
+    return header, json.loads(plaintext.decode("utf8"))
@@ -0,0 +1,119 @@
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from config import PollInterval
+from cooker import OperationMode
+from timeline import MealTimeline
+
+OFFLINE = "Offline"
+
+# 各模式默认的轮询间隔上下限（秒）
+DEFAULT_POLL_INTERVALS = {
+    OFFLINE: PollInterval(5, 300),
+    OperationMode.Waiting.name: PollInterval(5, 60),
+    OperationMode.Running.name: PollInterval(30, 120),
+    OperationMode.AutoKeepWarm.name: PollInterval(30, 60),
+    OperationMode.PreCook.name: PollInterval(60, 300),
+    OperationMode.Unknown.name: PollInterval(30, 60),
+}
+
+# 距离就餐时间段开始不足该时长时，按最短间隔轮询
+WINDOW_LEAD = timedelta(minutes=10)
+
+# 上线/下线状态变化后，按最短间隔轮询的时长
+TRANSITION_HOLD = timedelta(minutes=2)
+
+
+class PollScheduler:
+    """根据小饭煲当前的状态决定下一次轮询的时间
+
+    - 在线、尚未调度且处于等待模式时，即将进入就餐时间段或刚上线/下线时按最短间隔轮询，
+      尽快完成调度，并且不会越过下一个就餐时间段的开始时间
+    - 已调度的设备只需要发现状态变化，按该模式的最长间隔轮询；处于等待模式时，状态保持
+      不变的轮询越多间隔越长，最长不超过离线间隔的上限
+    - 设备连续不可达时，在离线间隔的上下限之间指数退避；刚下线时按最短间隔轮询以便发现
+      重新上电，即将进入或处于就餐时间段时退避不超过等待模式的最长间隔
+    """
+
+    def __init__(
+        self,
+        timeline: MealTimeline,
+        poll_intervals: Optional[Dict[str, PollInterval]] = None,
+        poll_interval: Optional[float] = None,
+    ) -> None:
+        self.timeline = timeline
+        self.set_intervals(poll_intervals, poll_interval)
+
+        self.online: Optional[bool] = None
+        self.last_transition: Optional[datetime] = None
+        self.failures = 0
+        self.mode: Optional[OperationMode] = None
+        # 连续处于同一模式的轮询次数
+        self.steady = 0
+
+    def set_intervals(
+        self,
+        poll_intervals: Optional[Dict[str, PollInterval]] = None,
+        poll_interval: Optional[float] = None,
+    ):
+        self.poll_intervals = dict(DEFAULT_POLL_INTERVALS)
+        if poll_interval is not None:
+            # 未单独配置时，等待模式沿用全局的 poll_interval
+            self.poll_intervals[OperationMode.Waiting.name] = PollInterval(
+                min(5, poll_interval), poll_interval
+            )
+        self.poll_intervals.update(poll_intervals or {})
+
+    def update(self, now: datetime, online: bool, mode: Optional[OperationMode] = None):
+        """记录本轮的探测结果"""
+        if self.online is not None and online != self.online:
+            self.last_transition = now
+        self.online = online
+        self.failures = 0 if online else self.failures + 1
+        self.steady = self.steady + 1 if online and mode == self.mode else 0
+        self.mode = mode if online else None
+
+    def _window_distance(self, now: datetime) -> Optional[timedelta]:
+        """距离下一个就餐时间段开始的时长，处于时间段内时为 0"""
+        current, upcoming = self.timeline.lookup(now)
+        if current is not None:
+            return timedelta(0)
+        if upcoming is not None:
+            return upcoming.begin - now
+        return None
+
+    def next_delay(
+        self, now: datetime, mode: Optional[OperationMode], scheduled: bool = False
+    ) -> float:
+        """下一次轮询前需要等待的秒数，scheduled 表示本次上电已完成调度"""
+        key = mode.name if self.online and mode is not None else OFFLINE
+        interval = self.poll_intervals[key]
+
+        distance = self._window_distance(now)
+        lead_in = distance is not None and distance <= WINDOW_LEAD
+        just_changed = (
+            self.last_transition is not None
+            and now - self.last_transition < TRANSITION_HOLD
+        )
+
+        if key == OFFLINE:
+            delay = min(interval.max, interval.min * 2 ** max(0, self.failures - 1))
+            if just_changed:
+                delay = interval.min
+            elif lead_in:
+                # 就餐时间段即将开始或正在进行，上电后应尽快调度
+                delay = min(delay, self.poll_intervals[OperationMode.Waiting.name].max)
+        elif mode != OperationMode.Waiting:
+            return interval.max
+        elif scheduled:
+            # 已调度的等待中设备只需要发现断电或状态变化，逐步退避
+            limit = max(interval.max, self.poll_intervals[OFFLINE].max)
+            return min(limit, interval.max * 2 ** self.steady)
+        else:
+            delay = interval.min if lead_in or just_changed else interval.max
+
+        if distance:
+            # 不要越过下一个就餐时间段的开始时间
+            delay = min(delay, max(interval.min, distance.total_seconds()))
+
+        return delay
@@ -0,0 +1,347 @@
+"""Replay status traces through the scheduler on a virtual clock.
+
+Every device is driven by a stand-in for :class:`async_cooker.AsyncMultiCooker`,
+either a recorded trace of statuses (for example read back from telemetry) or the
+:class:`simulator.SimulatedCooker` state machine plugged in and out on a schedule.
+The clock jumps straight to the next poll, so weeks of scheduling run in well under
+a second. The device commands and pushes that would have been issued are reported.
+
+Run a synthetic week against a config:
+
+    python src/replay.py -c config.yaml --start 2024-03-04 --days 7 --plug 07:00
+"""
+import argparse
+import asyncio
+import bisect
+import heapq
+import time
+from collections import namedtuple
+from datetime import date, datetime, timedelta
+from typing import List, Optional, Sequence, Tuple
+
+from clock import VirtualClock
+from config import Config, CookerConfig, Time, read_config
+from cooker import (
+    PROFILE_NAMES,
+    STATUS_PROPERTIES,
+    CookerStatus,
+    OperationMode,
+    TemperatureHistory,
+    build_profile_hex,
+)
+from scheduler import CookerScheduler
+from simulator import SimulatedCooker
+
+Command = namedtuple("Command", ["at", "device", "method", "args"])
+Push = namedtuple("Push", ["at", "title", "message"])
+Failure = namedtuple("Failure", ["at", "device", "error"])
+
+
+class Report:
+    """Everything a replay would have sent to the devices and to Bark."""
+
+    def __init__(self) -> None:
+        self.commands: List[Command] = []
+        self.pushes: List[Push] = []
+        self.failures: List[Failure] = []
+        self.ticks = 0
+
+    def lines(self) -> List[str]:
+        events = [
+            (command.at, f"{command.device} {command.method} {command.args}")
+            for command in self.commands
+        ]
+        events += [
+            (push.at, f"push {push.title}：{push.message}") for push in self.pushes
+        ]
+        events += [
+            (failure.at, f"{failure.device} 调度失败：{failure.error!r}")
+            for failure in self.failures
+        ]
+        events.sort(key=lambda event: event[0])
+        return [f"{at:%Y-%m-%d %H:%M:%S} {text}" for at, text in events]
+
+
+class ReplayCooker:
+    """Base of the replayed devices, commands are recorded in the report."""
+
+    timed_out = False
+
+    def __init__(self, name: str, clock: VirtualClock, report: Report) -> None:
+        self.name = name
+        self.clock = clock
+        self.report = report
+        self.ip = name
+
+    def current(self) -> Optional[dict]:
+        """Properties of the device right now, None while it is offline."""
+        raise NotImplementedError
+
+    def current_mode(self) -> Optional[int]:
+        """Only the status property, cheaper than current() for mode probes."""
+        data = self.current()
+        return None if data is None else data["status"]
+
+    def invalidate(self):
+        pass
+
+    def close(self):
+        pass
+
+    async def status(self, deadline=None, retries=None) -> CookerStatus:
+        data = self.current()
+        if data is None:
+            raise ConnectionError(f"{self.name} is offline")
+        return CookerStatus(data)
+
+    async def is_online(self) -> bool:
+        mode = self.current_mode()
+        return mode is not None and mode > 0
+
+    async def get_mode(self) -> OperationMode:
+        mode = self.current_mode()
+        if mode is None:
+            raise ConnectionError(f"{self.name} is offline")
+        return OperationMode(mode)
+
+    async def get_temperature_history(
+        self, deadline=None, retries=None
+    ) -> TemperatureHistory:
+        return TemperatureHistory("0")
+
+    def _record(self, method: str, *args):
+        self.report.commands.append(Command(self.clock.now(), self.name, method, args))
+
+    async def start(
+        self,
+        profile: str,
+        duration: int = None,
+        schedule: int = None,
+        akw: bool = None,
+        deadline=None,
+        retries=None,
+    ):
+        self._record("start", PROFILE_NAMES.get(profile, "custom"), schedule, akw)
+
+    async def stop(self, deadline=None, retries=None):
+        self._record("stop")
+
+
+class TraceCooker(ReplayCooker):
+    """Replays recorded statuses, commands do not change the trace."""
+
+    def __init__(
+        self,
+        name: str,
+        clock: VirtualClock,
+        report: Report,
+        trace: Sequence[Tuple[datetime, Optional[dict]]],
+    ) -> None:
+        super().__init__(name, clock, report)
+        self.times = [at for at, _ in trace]
+        self.statuses = [status for _, status in trace]
+
+    def current(self) -> Optional[dict]:
+        index = bisect.bisect_right(self.times, self.clock.now()) - 1
+        return self.statuses[index] if index >= 0 else None
+
+
+class SimulatedReplayCooker(ReplayCooker):
+    """A :class:`simulator.SimulatedCooker` on the virtual clock, reacting to commands.
+
+    ``power`` lists when the cooker is plugged in (True) and out (False), it is
+    unplugged before the first entry. Plugging in again resets it to waiting.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        clock: VirtualClock,
+        report: Report,
+        power: Sequence[Tuple[datetime, bool]],
+    ) -> None:
+        super().__init__(name, clock, report)
+        self.cooker = SimulatedCooker(clock=clock)
+        self.power = sorted(power)
+        self._power_times = [at for at, _ in self.power]
+        self._plugged = False
+
+    def current_mode(self) -> Optional[int]:
+        index = bisect.bisect_right(self._power_times, self.clock.now()) - 1
+        plugged = index >= 0 and self.power[index][1]
+        if plugged and not self._plugged:
+            self.cooker.cancel_cooking()
+        self._plugged = plugged
+        if not plugged:
+            return None
+        self.cooker.advance()
+        return self.cooker.status
+
+    def current(self) -> Optional[dict]:
+        if self.current_mode() is None:
+            return None
+        return {name: self.cooker.get_prop(name) for name in STATUS_PROPERTIES}
+
+    async def start(
+        self,
+        profile: str,
+        duration: int = None,
+        schedule: int = None,
+        akw: bool = None,
+        deadline=None,
+        retries=None,
+    ):
+        await super().start(profile, duration, schedule, akw)
+        self.cooker.set_start(build_profile_hex(profile, duration, schedule, akw))
+
+    async def stop(self, deadline=None, retries=None):
+        await super().stop()
+        self.cooker.cancel_cooking()
+
+
+def daily_power(
+    begin: date, days: int, plug: Time, unplug: Optional[Time] = None
+) -> List[Tuple[datetime, bool]]:
+    """Plugged in every day at ``plug`` and out at ``unplug``."""
+    power = []
+    for offset in range(days):
+        day = begin + timedelta(days=offset)
+        power.append((plug.on(day), True))
+        if unplug is not None:
+            power.append((unplug.on(day), False))
+    return power
+
+
+def trace_from_telemetry(
+    telemetry, begin: int, end: int, offline_after: float = 300
+) -> List[Tuple[datetime, Optional[dict]]]:
+    """Statuses recorded by a :class:`telemetry.DeviceTelemetry` as a replay trace.
+
+    Telemetry only records reachable devices, a gap longer than ``offline_after``
+    seconds is replayed as offline.
+    """
+    trace: List[Tuple[datetime, Optional[dict]]] = []
+    previous = None
+    for record in telemetry.status_range(begin, end):
+        if previous is not None and record.ts - previous > offline_after:
+            trace.append((datetime.fromtimestamp(previous + offline_after), None))
+        previous = record.ts
+        trace.append(
+            (
+                datetime.fromtimestamp(record.ts),
+                {
+                    "status": record.status,
+                    "phase": record.phase,
+                    "temp": record.temp,
+                    "t_left": record.t_left,
+                    "t_pre": record.t_pre,
+                    "t_cook": record.t_cook,
+                    "akw": record.akw,
+                },
+            )
+        )
+    return trace
+
+
+class Replay:
+    """Run schedulers on a virtual clock, each one polled after its next_delay()."""
+
+    def __init__(self, start: datetime, config: Optional[Config] = None) -> None:
+        self.clock = VirtualClock(start)
+        self.config = config
+        self.report = Report()
+        self.schedulers: List[CookerScheduler] = []
+
+    def _push(self, title: str, message: str):
+        self.report.pushes.append(Push(self.clock.now(), title, message))
+
+    def add(self, cooker: ReplayCooker, cooker_config: CookerConfig) -> CookerScheduler:
+        config = self.config
+        scheduler = CookerScheduler(
+            cooker,
+            cooker_config,
+            poll_intervals=config and config.poll_intervals,
+            poll_interval=config and config.poll_interval,
+            calendar=config and config.calendar,
+            clock=self.clock,
+            push=self._push,
+        )
+        self.schedulers.append(scheduler)
+        return scheduler
+
+    def simulate(
+        self, cooker_config: CookerConfig, power: Sequence[Tuple[datetime, bool]]
+    ) -> CookerScheduler:
+        cooker = SimulatedReplayCooker(
+            cooker_config.name, self.clock, self.report, power
+        )
+        return self.add(cooker, cooker_config)
+
+    def trace(
+        self,
+        cooker_config: CookerConfig,
+        trace: Sequence[Tuple[datetime, Optional[dict]]],
+    ) -> CookerScheduler:
+        cooker = TraceCooker(cooker_config.name, self.clock, self.report, trace)
+        return self.add(cooker, cooker_config)
+
+    async def run(self, until: datetime) -> Report:
+        clock = self.clock
+        queue = [(clock.now(), index) for index in range(len(self.schedulers))]
+        while queue:
+            at, index = heapq.heappop(queue)
+            if at > until:
+                break
+            if at > clock.now():
+                clock.advance((at - clock.now()).total_seconds())
+            scheduler = self.schedulers[index]
+            try:
+                await scheduler.task()
+            except Exception as ex:
+                self.report.failures.append(
+                    Failure(clock.now(), scheduler.cooker_config.name, ex)
+                )
+            self.report.ticks += 1
+            delay = max(1.0, scheduler.next_delay())
+            heapq.heappush(queue, (clock.now() + timedelta(seconds=delay), index))
+        return self.report
+
+
+def _parse_time(value: str) -> Time:
+    hour, minutes = value.split(":")
+    return Time(int(hour), int(minutes))
+
+
+async def main():
+    parser = argparse.ArgumentParser("cooker-replay")
+    parser.add_argument("-c", "--config-path", required=True)
+    parser.add_argument("--start", type=date.fromisoformat, default=date.today())
+    parser.add_argument("--days", type=int, default=7)
+    parser.add_argument("--plug", type=_parse_time, default=Time(7, 0))
+    parser.add_argument("--unplug", type=_parse_time, default=None)
+    parser.add_argument("--quiet", action="store_true")
+    args = parser.parse_args()
+
+    config = read_config(args.config_path, use_cache=False)
+    start = datetime.combine(args.start, datetime.min.time())
+    replay = Replay(start, config)
+    for cooker_config in config.get_cooker_configs():
+        replay.simulate(
+            cooker_config, daily_power(args.start, args.days, args.plug, args.unplug)
+        )
+
+    begin = time.perf_counter()
+    report = await replay.run(start + timedelta(days=args.days))
+    elapsed = time.perf_counter() - begin
+
+    if not args.quiet:
+        print("\n".join(report.lines()))
+    print(
+        f"{args.days} 天，{report.ticks} 次轮询，{len(report.commands)} 条指令，"
+        f"{len(report.pushes)} 条推送，{len(report.failures)} 次失败，"
+        f"耗时 {elapsed * 1000:.1f} ms"
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,403 @@
+import asyncio
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Optional
+
+from analytics import DRY_POT, LID_OPEN, CookTracker, EtaModel
+from bark import pushMessage
+from checkpoint import Checkpoint
+from clock import SYSTEM_CLOCK, Clock
+from config import Calendar, CookerConfig, PollInterval
+from cooker import PROFILES, CookerStatus, OperationMode, TemperatureHistory
+from feed import StatusFeed
+from logger import main_logger
+from machine import (
+    AlreadyScheduled,
+    CookerMachine,
+    Event,
+    KeepWarmReminder,
+    ModeChanged,
+    ScheduleCooking,
+    StartCooking,
+    StopKeepWarm,
+)
+from metrics import TICK_SECONDS
+from polling import PollScheduler
+from telemetry import DeviceTelemetry
+from timeline import MealTimeline
+
+ANOMALY_MESSAGES = {
+    DRY_POT: "小饭煲温度异常升高，可能已干锅，请注意！",
+    LID_OPEN: "小饭煲沸腾时温度骤降，锅盖可能未盖好，请注意！",
+}
+
+# 在线设备连续探测超时多少次后才视为离线，偶尔丢包不会触发重新调度
+TIMEOUT_GRACE = 2
+
+# 温度曲线在该时长（秒）内读取过时直接复用，不再访问设备
+HISTORY_TTL = 30
+
+# 读取完整状态和温度曲线最多等待的时长（秒），设备卡顿时不拖住整轮调度
+READ_DEADLINE = 5
+
+# 下发指令最多等待的时长（秒），与读取一起不超过一个轮询周期
+COMMAND_DEADLINE = 10
+
+
+class CookerState:
+    """单个小饭煲的调度状态"""
+
+    def __init__(self) -> None:
+        self.scheduled = False
+        self.last_akm_begin_time: Optional[datetime] = None
+        self.last_mode: Optional[OperationMode] = None
+        self.unplugged_check_push_count = 0
+        self.online = False
+        self.akw_reminded = False
+        self.akw_stopped = False
+
+    def to_dict(self) -> dict:
+        return {
+            "scheduled": self.scheduled,
+            "last_akm_begin_time": self.last_akm_begin_time
+            and self.last_akm_begin_time.isoformat(),
+            "last_mode": self.last_mode and self.last_mode.name,
+            "unplugged_check_push_count": self.unplugged_check_push_count,
+            "online": self.online,
+            "akw_reminded": self.akw_reminded,
+            "akw_stopped": self.akw_stopped,
+        }
+
+    def load_dict(self, data: dict):
+        self.scheduled = data.get("scheduled", False)
+        last_akm_begin_time = data.get("last_akm_begin_time")
+        self.last_akm_begin_time = (
+            datetime.fromisoformat(last_akm_begin_time) if last_akm_begin_time else None
+        )
+        last_mode = data.get("last_mode")
+        self.last_mode = OperationMode[last_mode] if last_mode else None
+        self.unplugged_check_push_count = data.get("unplugged_check_push_count", 0)
+        self.online = data.get("online", False)
+        self.akw_reminded = data.get(
+            "akw_reminded", self.unplugged_check_push_count > 0
+        )
+        self.akw_stopped = data.get("akw_stopped", False)
+
+
+class CookerScheduler:
+    """根据就餐时间段调度单个小饭煲，状态彼此隔离"""
+
+    def __init__(
+        self,
+        cooker,
+        cooker_config: CookerConfig,
+        telemetry: DeviceTelemetry = None,
+        poll_intervals: Dict[str, PollInterval] = None,
+        poll_interval: float = None,
+        calendar: Calendar = None,
+        checkpoint: Checkpoint = None,
+        clock: Clock = SYSTEM_CLOCK,
+        push: Callable[[str, str], None] = pushMessage,
+    ) -> None:
+        self.cooker = cooker
+        self.cooker_config = cooker_config
+        self.telemetry = telemetry
+        self.state = CookerState()
+        self.checkpoint = checkpoint
+        self.clock = clock
+        self.push = push
+        self._tick_seconds = TICK_SECONDS.labels(cooker_config.name)
+        self._timeouts = 0
+        self.tracker = CookTracker()
+        # 读取遥测中历史烹饪记录的任务，首次烹饪时才创建
+        self._eta_learning: Optional[asyncio.Future] = None
+        self.feed = StatusFeed(cooker_config.name)
+        # 轮询与外部下发的指令共用同一把锁，同一台设备同一时间只有一个请求
+        self.lock = asyncio.Lock()
+        self._wake = asyncio.Event()
+        self._history: Optional[TemperatureHistory] = None
+        self._history_time = 0.0
+        if checkpoint is not None:
+            data = checkpoint.load()
+            if data:
+                self.state.load_dict(data)
+                main_logger.info("已从检查点恢复%s的调度状态", cooker_config.name)
+        self.timeline = MealTimeline(cooker_config.meal_profile_list, calendar)
+        self.poller = PollScheduler(self.timeline, poll_intervals, poll_interval)
+        self.machine = CookerMachine(cooker_config, self.timeline, self.state)
+        self.machine.subscribe(self.notify)
+
+    def reconfigure(
+        self,
+        cooker_config: CookerConfig,
+        poll_intervals: Dict[str, PollInterval] = None,
+        poll_interval: float = None,
+        calendar: Calendar = None,
+    ):
+        """应用新的配置，调度状态保持不变"""
+        if (
+            cooker_config.meal_profile_list != self.cooker_config.meal_profile_list
+            or (calendar or Calendar()) != self.timeline.calendar
+        ):
+            self.timeline = MealTimeline(cooker_config.meal_profile_list, calendar)
+            self.poller.timeline = self.timeline
+            self.machine.timeline = self.timeline
+        self.poller.set_intervals(poll_intervals, poll_interval)
+        self.cooker_config = cooker_config
+        self.machine.cooker_config = cooker_config
+
+    def next_delay(self) -> float:
+        """下一次轮询前需要等待的秒数"""
+        mode = self.state.last_mode if self.poller.online else None
+        return self.poller.next_delay(self.clock.now(), mode, self.state.scheduled)
+
+    async def record_status(self) -> Optional[CookerStatus]:
+        """读取完整状态作为本轮的状态快照，配置了遥测时写入遥测存储"""
+        try:
+            status = await self.cooker.status(deadline=READ_DEADLINE)
+        except Exception:
+            return None
+        if self.telemetry is not None:
+            await self.record_telemetry(status)
+        return status
+
+    async def record_telemetry(self, status: CookerStatus):
+        """写入遥测存储，烹饪中同时读取温度曲线跟踪进度"""
+        self.telemetry.record_status(status, self.clock.time())
+        history = None
+        if status.mode == OperationMode.Running:
+            try:
+                history = await self.cooker.get_temperature_history(
+                    deadline=READ_DEADLINE
+                )
+            except Exception:
+                return
+            self.telemetry.record_history(history, self.clock.time())
+            self._history = history
+            self._history_time = self.clock.monotonic()
+        self.analyze(status, history)
+
+    def analyze(self, status, history):
+        """跟踪烹饪进度，发现异常时推送，进入新阶段时估算完成时间"""
+        tracker = self.tracker
+        name = self.cooker_config.name
+        if self._eta_learning is None and status.mode == OperationMode.Running:
+            # 首次烹饪时才读取历史记录，不拖慢启动；读取与分段在线程池中进行，不阻塞轮询
+            self._eta_learning = asyncio.get_running_loop().run_in_executor(
+                None, self._learn_eta, self.telemetry
+            )
+            self._eta_learning.add_done_callback(self._merge_eta)
+
+        stage = tracker.progress.current.index
+        for anomaly in tracker.observe(status, history):
+            main_logger.warning("%s检测到异常：%s", name, anomaly)
+            self.push(name, ANOMALY_MESSAGES[anomaly])
+
+        if history is not None and tracker.progress.current.index != stage:
+            remaining = tracker.remaining()
+            if remaining is not None:
+                main_logger.info(
+                    "%s进入第%s阶段，预计 %s 烹饪完成",
+                    name,
+                    tracker.progress.current.index + 1,
+                    format(self.clock.now() + timedelta(seconds=remaining), "%H:%M"),
+                )
+
+    @staticmethod
+    def _learn_eta(telemetry: DeviceTelemetry) -> EtaModel:
+        # 在线程池中执行，只读取已结束的会话；轮询仍在追加的分段只映射已写入的完整记录
+        model = EtaModel()
+        model.learn(telemetry)
+        return model
+
+    def _merge_eta(self, future: asyncio.Future):
+        """历史记录读取完成后并入当前的完成时间模型，期间结束的烹饪不会丢失"""
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is not None:
+            main_logger.warning(
+                "%s读取历史烹饪记录失败：%r", self.cooker_config.name, error
+            )
+            return
+        self.tracker.eta.merge(future.result())
+
+    async def temperature_history(self) -> TemperatureHistory:
+        """温度曲线，HISTORY_TTL 内读取过时直接复用"""
+        async with self.lock:
+            if (
+                self._history is None
+                or self.clock.monotonic() - self._history_time > HISTORY_TTL
+            ):
+                self._history = await self.cooker.get_temperature_history(
+                    deadline=READ_DEADLINE
+                )
+                self._history_time = self.clock.monotonic()
+            return self._history
+
+    async def start(self, profile_type: str, schedule: Optional[int] = None):
+        """立即开始烹饪，指定 schedule 时预约在该分钟数后完成，与轮询串行执行"""
+        async with self.lock:
+            await self.cooker.start(
+                PROFILES[profile_type],
+                schedule=schedule,
+                akw=self.cooker_config.akw,
+                deadline=COMMAND_DEADLINE,
+            )
+            self.cooker.invalidate()
+        if schedule:
+            main_logger.info(
+                "%s已手动预约 %s 分钟后烹饪完成（%s）",
+                self.cooker_config.name,
+                schedule,
+                profile_type,
+            )
+        else:
+            main_logger.info(
+                "%s已手动开始烹饪（%s）", self.cooker_config.name, profile_type
+            )
+        self.wake()
+
+    async def stop(self):
+        """停止烹饪或保温，与轮询串行执行"""
+        async with self.lock:
+            await self.cooker.stop(deadline=COMMAND_DEADLINE)
+            self.cooker.invalidate()
+        main_logger.info("%s已手动停止", self.cooker_config.name)
+        self.wake()
+
+    async def reconnect(self, cooker):
+        """更换设备连接，等待进行中的轮询或指令完成后再关闭旧连接"""
+        async with self.lock:
+            self.cooker.close()
+            self.cooker = cooker
+            self._history = None
+        self.wake()
+
+    def wake(self):
+        """让正在等待的 sleep() 立即返回，尽快轮询一次"""
+        self._wake.set()
+
+    async def sleep(self, delay: float):
+        """等待下一次轮询，期间收到 wake() 时提前返回"""
+        try:
+            await asyncio.wait_for(self._wake.wait(), delay)
+        except asyncio.TimeoutError:
+            pass
+        self._wake.clear()
+
+    async def task(self):
+        begin = time.perf_counter()
+        try:
+            async with self.lock:
+                await self._task()
+        finally:
+            if self.checkpoint is not None:
+                self.checkpoint.save(self.state.to_dict())
+            self._tick_seconds.observe(time.perf_counter() - begin)
+
+    async def _task(self):
+        cooker = self.cooker
+        cooker_config = self.cooker_config
+
+        now = self.clock.now()
+
+        # 每轮只探测一次设备状态，本轮内的读取共享同一份快照
+        cooker.invalidate()
+        # 先用有时限的 status 属性探测在线状态，离线设备不再读取完整状态
+        is_online = await cooker.is_online()
+        if (
+            not is_online
+            and cooker.timed_out
+            and self.poller.online
+            and self._timeouts < TIMEOUT_GRACE
+        ):
+            # 超时不等于离线，保持当前状态，等下一轮再确认
+            self._timeouts += 1
+            main_logger.info(
+                "%s探测超时（第%s次），暂不视为离线",
+                cooker_config.name,
+                self._timeouts,
+                extra={"rate_limit": f"timeout:{cooker_config.name}"},
+            )
+            return
+        self._timeouts = 0
+        mode = await cooker.get_mode() if is_online else None
+        self.poller.update(now, is_online, mode)
+        status = None
+        # 完整状态比探测贵得多，只在在线且有人关心时读取
+        if is_online and (self.telemetry is not None or self.feed.subscribers):
+            status = await self.record_status()
+        if status is not None or not is_online:
+            self.feed.update(now, status)
+
+        events = self.machine.observe(now, mode)
+        for index, event in enumerate(events):
+            try:
+                await self.execute(event)
+            except BaseException:
+                # 指令下发失败或本轮被取消，撤销尚未完成的事件，下一轮重新调度
+                for pending in reversed(events[index:]):
+                    self.machine.rollback(pending)
+                raise
+            self.machine.publish(event)
+
+    async def execute(self, event: Event):
+        """下发事件对应的指令，失败时不会通知订阅者"""
+        cooker = self.cooker
+        akw = self.cooker_config.akw
+        if isinstance(event, StartCooking):
+            await cooker.start(
+                PROFILES[event.profile.type], akw=akw, deadline=COMMAND_DEADLINE
+            )
+        elif isinstance(event, ScheduleCooking):
+            await cooker.start(
+                PROFILES[event.profile.type],
+                schedule=event.minutes,
+                akw=akw,
+                deadline=COMMAND_DEADLINE,
+            )
+        elif isinstance(event, StopKeepWarm):
+            await cooker.stop(deadline=COMMAND_DEADLINE)
+
+    def notify(self, event: Event):
+        """记录日志并推送通知"""
+        name = event.device
+        if isinstance(event, ModeChanged):
+            if event.new is None and event.old is not None:
+                main_logger.info("%s未上电，准备重新调度", name)
+        elif isinstance(event, AlreadyScheduled):
+            main_logger.info("%s不处于等待模式，视为已调度", name)
+        elif isinstance(event, StartCooking):
+            main_logger.info(
+                "当前处于 %s ~ %s 就餐时间段内，%s已上电，立即执行烹饪操作（%s）",
+                format(event.begin, "%H:%M"),
+                format(event.end, "%H:%M"),
+                name,
+                event.profile.type,
+            )
+            self.push(name, f"小饭煲已自动开始烹饪（{event.profile.type}）")
+        elif isinstance(event, ScheduleCooking):
+            main_logger.info(
+                "%s已上线，预定 %s（%s分钟后）烹饪完成（%s）并自动保温",
+                name,
+                format(event.usual_time, "%H:%M"),
+                event.minutes,
+                event.profile.type,
+            )
+            self.push(
+                name,
+                f"自动预定 {event.usual_time.strftime('%H:%M')}（{event.minutes}分钟后）烹饪完成（{event.profile.type}）并自动保温",
+            )
+        elif isinstance(event, KeepWarmReminder):
+            main_logger.info(
+                "%s处于保温模式且长时间未断电（%s - %s）",
+                name,
+                format(event.since, "%H:%M"),
+                format(event.at, "%H:%M"),
+                extra={"rate_limit": f"keep-warm:{name}"},
+            )
+            self.push(name, "小饭煲处于保温模式且长时间未断电，请注意！")
+        elif isinstance(event, StopKeepWarm):
+            main_logger.info("自动停止%s的保温模式", name)
+            self.push(name, "长时间处于保温模式且未断电，已自动停止小饭煲")
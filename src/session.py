@@ -0,0 +1,96 @@
+import time
+from typing import Dict, Optional
+
+from checkpoint import Checkpoint
+
+
+class MiioSession:
+    """Device id and clock offset learned from a miIO hello handshake.
+
+    The stamp is kept as an offset from the wall clock so it survives restarts: a
+    request built from a restored session carries roughly the stamp the device
+    expects and no hello is needed before the first command. ``known_device_id``
+    outlives :meth:`invalidate`, so that the device can be recognised by discovery
+    after it moved to another address.
+    """
+
+    def __init__(
+        self,
+        device_id: Optional[int] = None,
+        stamp_offset: float = 0.0,
+        store: "Optional[SessionStore]" = None,
+        known_device_id: Optional[int] = None,
+    ) -> None:
+        self.device_id = device_id
+        self.stamp_offset = stamp_offset
+        self.store = store
+        self.known_device_id = device_id if device_id is not None else known_device_id
+
+    @property
+    def established(self) -> bool:
+        return self.device_id is not None
+
+    def stamp(self) -> int:
+        """Stamp for the next request, one second ahead of the device clock."""
+        return int(time.time() + self.stamp_offset + 1) & 0xFFFFFFFF
+
+    def establish(self, device_id: int, stamp: int):
+        """Record a handshake and persist it."""
+        self.device_id = device_id
+        self.known_device_id = device_id
+        self.touch(stamp)
+        if self.store is not None:
+            self.store.save()
+
+    def touch(self, stamp: int):
+        """Follow the device clock from a reply, kept in memory only."""
+        self.stamp_offset = stamp - time.time()
+
+    def invalidate(self):
+        """Forget the device id, the next request starts with a handshake."""
+        if self.device_id is None:
+            return
+        self.device_id = None
+        if self.store is not None:
+            self.store.save()
+
+    def to_dict(self) -> dict:
+        return {
+            "device_id": self.device_id,
+            "stamp_offset": int(self.stamp_offset),
+            "known_device_id": self.known_device_id,
+        }
+
+
+class SessionStore:
+    """miIO sessions of all devices, persisted in a single file keyed by ip."""
+
+    def __init__(self, path: str) -> None:
+        self.checkpoint = Checkpoint(path)
+        self.sessions: Dict[str, MiioSession] = {}
+        for ip, data in (self.checkpoint.load() or {}).items():
+            try:
+                device_id = data["device_id"]
+                self.sessions[ip] = MiioSession(
+                    None if device_id is None else int(device_id),
+                    float(data["stamp_offset"]),
+                    self,
+                    data.get("known_device_id"),
+                )
+            except (KeyError, TypeError, ValueError):
+                continue
+
+    def session(self, ip: str) -> MiioSession:
+        session = self.sessions.get(ip)
+        if session is None:
+            session = self.sessions[ip] = MiioSession(store=self)
+        return session
+
+    def save(self):
+        self.checkpoint.save(
+            {
+                ip: session.to_dict()
+                for ip, session in self.sessions.items()
+                if session.known_device_id is not None
+            }
+        )
@@ -0,0 +1,274 @@
+"""Local chunmi.cooker.eh1 simulator speaking the miIO protocol over UDP.
+
+Run standalone:
+
+    python src/simulator.py --host 127.0.0.2 --token ffffffffffffffffffffffffffffffff
+
+The simulated clock can run faster than wall time (``--speed``) so whole cooking
+programs finish in seconds, and latency / packet loss can be configured to
+reproduce a flaky Wi-Fi link.
+"""
+import argparse
+import asyncio
+import random
+import time
+from typing import Optional
+
+from clock import SYSTEM_CLOCK, Clock
+from cooker import STAGE_MARKER, STATUS_PROPERTIES, MultiCookerProfile, OperationMode
+from logger import cooker_logger
+from miio_protocol import build, build_hello_reply, parse
+
+_LOGGER = cooker_logger
+
+# Seconds between two recorded temperature samples
+SAMPLE_INTERVAL = 10
+
+
+class SimulatedCooker:
+    """State machine of the eh1 as seen through get_prop."""
+
+    def __init__(self, speed: float = 1.0, clock: Clock = SYSTEM_CLOCK) -> None:
+        self.speed = speed
+        self.clock = clock
+        self.plugged = True
+        self.status = OperationMode.Waiting.value
+        self.phase = 0
+        self.menu = "0000000000000000000000000000000000000001"
+        self.akw = 0
+        self.temp = 25
+        self.t_cook = 0
+        self.t_pre = 0
+        self.cook_begin = 0.0
+        self.pre_end = 0.0
+        self.history = bytearray()
+        self._last_sample = 0.0
+        self._began = clock.monotonic()
+
+    def now(self) -> float:
+        """Simulated seconds since the simulator started."""
+        return (self.clock.monotonic() - self._began) * self.speed
+
+    def advance(self):
+        now = self.now()
+        if self.status == OperationMode.PreCook.value and now >= self.pre_end:
+            self._begin_cooking(self.pre_end)
+        if self.status == OperationMode.Running.value:
+            while self._last_sample + SAMPLE_INTERVAL <= now:
+                self._last_sample += SAMPLE_INTERVAL
+                self._record(self._last_sample)
+            if now >= self.cook_begin + self.t_cook * 60:
+                self.phase = 0
+                self.status = (
+                    OperationMode.AutoKeepWarm.value
+                    if self.akw
+                    else OperationMode.Waiting.value
+                )
+                self.temp = 73 if self.akw else 60
+
+    def _begin_cooking(self, at: float):
+        self.status = OperationMode.Running.value
+        self.phase = 1
+        self.cook_begin = at
+        self._last_sample = at
+        self.history = bytearray()
+
+    def _record(self, at: float):
+        progress = (at - self.cook_begin) / max(1, self.t_cook * 60)
+        phase = min(10, 1 + int(progress * 10))
+        if phase != self.phase:
+            self.history.append(STAGE_MARKER)
+            self.phase = phase
+        if progress < 0.3:
+            self.temp = min(100, 25 + int(progress / 0.3 * 75))
+        elif progress < 0.8:
+            self.temp = 100
+        else:
+            self.temp = 100 - int((progress - 0.8) * 100)
+        self.history.append(self.temp)
+
+    def get_prop(self, name: str):
+        if name == "status":
+            return self.status
+        if name == "phase":
+            return self.phase
+        if name == "menu":
+            return self.menu
+        if name == "t_cook":
+            return self.t_cook
+        if name == "t_left":
+            if self.status != OperationMode.Running.value:
+                return 0
+            return max(0, int(self.cook_begin + self.t_cook * 60 - self.now()))
+        if name == "t_pre":
+            if self.status != OperationMode.PreCook.value:
+                return 0
+            return max(0, int((self.pre_end - self.now()) / 60))
+        if name == "temp":
+            return self.temp
+        if name == "akw":
+            return self.akw
+        if name == "t_start":
+            return int(self.cook_begin)
+        if name in STATUS_PROPERTIES:
+            return 0
+        return None
+
+    def set_start(self, profile_hex: str):
+        # MultiCookerProfile clears the schedule flag on load, read it from the raw
+        # bytes first
+        raw = bytes.fromhex(profile_hex)
+        scheduled = bool(raw[14] & 0x80)
+        profile = MultiCookerProfile(profile_hex)
+        data = profile.profile_bytes
+        index = data[2]
+        self.menu = f"{index:02x}{index:02x}" + "00" * 17 + f"{index + 1:02x}"
+        self.t_cook = profile.get_duration()
+        self.akw = 1 if profile.is_akw_enabled() else 0
+        if scheduled:
+            schedule = (raw[14] & 0x7F) * 60 + (raw[15] & 0x7F)
+            self.status = OperationMode.PreCook.value
+            self.pre_end = self.now() + max(0, schedule - self.t_cook) * 60
+        else:
+            self._begin_cooking(self.now())
+
+    def cancel_cooking(self):
+        self.status = OperationMode.Waiting.value
+        self.phase = 0
+
+    def handle(self, method: str, params: list):
+        self.advance()
+        if method == "get_prop":
+            return [self.get_prop(name) for name in params]
+        if method == "set_start":
+            self.set_start(params[0])
+            return ["ok"]
+        if method == "cancel_cooking":
+            self.cancel_cooking()
+            return ["ok"]
+        if method == "get_temp_history":
+            return [self.history.hex() if self.history else "0"]
+        if method == "miIO.info":
+            return {"model": "chunmi.cooker.eh1", "fw_ver": "1.0.0", "token": ""}
+        raise KeyError(method)
+
+
+class SimulatorProtocol(asyncio.DatagramProtocol):
+    """miIO endpoint in front of a :class:`SimulatedCooker`."""
+
+    def __init__(
+        self,
+        cooker: SimulatedCooker,
+        token: str,
+        device_id: int = 0x12345678,
+        latency: float = 0.0,
+        loss: float = 0.0,
+        max_properties: Optional[int] = None,
+    ) -> None:
+        self.cooker = cooker
+        self.token = bytes.fromhex(token)
+        self.device_id = device_id
+        self.latency = latency
+        self.loss = loss
+        self.max_properties = max_properties
+        self.requests = 0
+        self.hellos = 0
+        self.transport: Optional[asyncio.DatagramTransport] = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def _reply(self, data: bytes, addr):
+        if self.loss and random.random() < self.loss:
+            return
+        if self.latency:
+            asyncio.get_running_loop().call_later(
+                self.latency, self.transport.sendto, data, addr
+            )
+        else:
+            self.transport.sendto(data, addr)
+
+    def _stamp(self) -> int:
+        return int(time.time()) & 0xFFFFFFFF
+
+    def datagram_received(self, data: bytes, addr):
+        if not self.cooker.plugged:
+            return
+        if self.loss and random.random() < self.loss:
+            return
+
+        self.requests += 1
+        try:
+            header, request = parse(self.token, data)
+        except Exception as ex:
+            _LOGGER.debug("simulator: unable to parse request from %s: %s", addr, ex)
+            return
+
+        if request is None:
+            self.hellos += 1
+            self._reply(build_hello_reply(self.device_id, self._stamp()), addr)
+            return
+        if header.device_id != self.device_id:
+            # Like the real device: packets meant for another session are dropped
+            return
+
+        method = request.get("method")
+        params = request.get("params") or []
+        try:
+            if (
+                method == "get_prop"
+                and self.max_properties is not None
+                and len(params) > self.max_properties
+            ):
+                raise ValueError("too many properties")
+            result = self.cooker.handle(method, params)
+            payload = {"id": request["id"], "result": result}
+        except Exception as ex:
+            payload = {
+                "id": request["id"],
+                "error": {"code": -5001, "message": f"{type(ex).__name__}: {ex}"},
+            }
+
+        self._reply(build(self.token, self.device_id, self._stamp(), payload), addr)
+
+
+async def serve(
+    host: str = "127.0.0.1",
+    port: int = 54321,
+    token: str = "ff" * 16,
+    cooker: Optional[SimulatedCooker] = None,
+    **kwargs,
+):
+    """Start a simulator endpoint, returns ``(transport, protocol)``."""
+    cooker = cooker or SimulatedCooker()
+    return await asyncio.get_running_loop().create_datagram_endpoint(
+        lambda: SimulatorProtocol(cooker, token, **kwargs), local_addr=(host, port)
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser("cooker-simulator")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=54321)
+    parser.add_argument("--token", default="ff" * 16)
+    parser.add_argument("--speed", type=float, default=1.0)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--loss", type=float, default=0)
+    parser.add_argument("--max-properties", type=int, default=None)
+    args = parser.parse_args()
+
+    await serve(
+        args.host,
+        args.port,
+        args.token,
+        SimulatedCooker(args.speed),
+        latency=args.latency_ms / 1000,
+        loss=args.loss,
+        max_properties=args.max_properties,
+    )
+    _LOGGER.info("小饭煲模拟器已启动：%s:%s", args.host, args.port)
+    await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,297 @@
+import calendar
+import time
+from datetime import datetime
+from typing import List, Optional
+
+from miio.device import Device
+from miio.exceptions import DeviceError, DeviceException
+
+from cooker import (
+    _MAX_PROPERTIES,
+    GROW_PROPERTIES_AFTER,
+    MODEL_MULTI,
+    PROFILE_NAMES,
+    STATUS_PROPERTIES,
+    STATUS_TTL,
+    CookerError,
+    CookerException,
+    CookerStatus,
+    CookerTimeout,
+    OperationMode,
+    TemperatureHistory,
+    TemperatureHistoryReader,
+    build_profile_hex,
+)
+from logger import cooker_logger
+from metrics import PROBE_FAILURES, RPC_ERRORS, RPC_SECONDS
+from session import MiioSession
+
+_LOGGER = cooker_logger
+
+
+class MultiCooker(Device):
+    """Main class representing the multi cooker.
+
+    python-miio errors are re-raised as :class:`cooker.CookerError` when the device
+    answered with an error and :class:`cooker.CookerTimeout` otherwise.
+    """
+
+    _supported_models = [MODEL_MULTI]
+
+    def __init__(
+        self,
+        *args,
+        status_ttl: float = STATUS_TTL,
+        session: Optional[MiioSession] = None,
+        probe_deadline: float = 2.0,
+        **kwargs,
+    ) -> None:
+        super().__init__(*args, **kwargs)
+        self.session = session
+        if session is not None and session.established:
+            # Skip the hello python-miio would send before the first command
+            protocol = self._protocol
+            protocol._device_id = session.device_id.to_bytes(4, "big")
+            protocol._device_ts = datetime.utcfromtimestamp(session.stamp() - 1)
+            protocol._discovered = True
+        self._max_properties = _MAX_PROPERTIES.get(self.ip, len(STATUS_PROPERTIES))
+        self._grow_after = GROW_PROPERTIES_AFTER
+        self._growing = False
+        self._batched_reads = 0
+        self._status_ttl = status_ttl
+        self.probe_deadline = probe_deadline
+        self._snapshot = None
+        self._snapshot_time = 0.0
+        self._history_reader = TemperatureHistoryReader()
+        self._rpc_metrics = {}
+        self._probe_failures = PROBE_FAILURES.labels(self.ip)
+
+    def send(
+        self,
+        command: str,
+        parameters=None,
+        retry_count: Optional[int] = None,
+        *,
+        deadline: Optional[float] = None,
+        **kwargs,
+    ):
+        """Send a command, ``deadline`` bounds all attempts together."""
+        metrics = self._rpc_metrics.get(command)
+        if metrics is None:
+            metrics = self._rpc_metrics[command] = (
+                RPC_SECONDS.labels(self.ip, command),
+                RPC_ERRORS.labels(self.ip, command, "timeout"),
+                RPC_ERRORS.labels(self.ip, command, "device"),
+            )
+        latency, timeouts, errors = metrics
+        begin = time.perf_counter()
+        protocol = self._protocol
+        timeout = protocol._timeout
+        if deadline is not None:
+            attempts = 1 + (self.retry_count if retry_count is None else retry_count)
+            protocol._timeout = min(timeout, deadline / attempts)
+        try:
+            result = super().send(command, parameters, retry_count, **kwargs)
+        except DeviceError as ex:
+            errors.inc()
+            raise CookerError(ex.args[0] if ex.args else None) from ex
+        except DeviceException as ex:
+            timeouts.inc()
+            raise CookerTimeout(str(ex)) from ex
+        finally:
+            protocol._timeout = timeout
+            latency.observe(time.perf_counter() - begin)
+        if self.session is not None:
+            self._update_session()
+        return result
+
+    def _update_session(self):
+        protocol = self._protocol
+        if protocol._device_id is None or protocol._device_ts is None:
+            return
+        device_id = int.from_bytes(protocol._device_id, "big")
+        stamp = calendar.timegm(protocol._device_ts.timetuple())
+        if device_id != self.session.device_id:
+            self.session.establish(device_id, stamp)
+        else:
+            self.session.touch(stamp)
+
+    def status(
+        self, deadline: Optional[float] = None, retries: Optional[int] = None
+    ) -> CookerStatus:
+        """Retrieve properties.
+
+        :param deadline: Seconds all get_prop round trips together may take.
+        :param retries: Retry budget of every round trip, defaults to ``retry_count``.
+        """
+        try:
+            values = self._get_properties(STATUS_PROPERTIES, deadline, retries)
+        except Exception as ex:
+            self._set_snapshot(None, ex)
+            raise
+
+        status = CookerStatus.from_values(values)
+        self._set_snapshot(status.status, None)
+        return status
+
+    def _get_properties(
+        self,
+        properties: List[str],
+        deadline: Optional[float] = None,
+        retries: Optional[int] = None,
+    ) -> list:
+        """Fetch properties in as few get_prop round trips as the firmware allows.
+
+        The eh1 firmware rejects or truncates requests carrying too many properties,
+        so a failing batch is split in half and the smaller size is remembered for
+        this device. After ``GROW_PROPERTIES_AFTER`` successful reads the size is
+        doubled again, in case the failure was transient.
+        """
+        expires = None if deadline is None else time.monotonic() + deadline
+        values = []
+        index = 0
+        while index < len(properties):
+            batch = properties[index : index + self._max_properties]
+            remaining = None if expires is None else expires - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                raise CookerTimeout("No response from the device %s" % self.ip)
+            try:
+                result = self.send("get_prop", batch, retries, deadline=remaining)
+            except CookerError:
+                if len(batch) == 1:
+                    raise
+                result = None
+
+            if result is None or len(result) != len(batch):
+                if len(batch) == 1:
+                    raise CookerException(
+                        "Unexpected response for property %s: %s" % (batch[0], result)
+                    )
+                self._set_max_properties(max(1, len(batch) // 2))
+                continue
+
+            values.extend(result)
+            index += len(batch)
+
+        self._batched_read()
+        return values
+
+    def _probe(self):
+        """Return the cached (status, error) snapshot, probing the device if stale."""
+        if (
+            self._snapshot is None
+            or time.monotonic() - self._snapshot_time > self._status_ttl
+        ):
+            try:
+                [status] = self.send(
+                    "get_prop", ["status"], deadline=self.probe_deadline
+                )
+                self._set_snapshot(status, None)
+            except Exception as ex:
+                self._probe_failures.inc()
+                self._set_snapshot(None, ex)
+        return self._snapshot
+
+    def _set_snapshot(self, status, error):
+        self._snapshot = (status, error)
+        self._snapshot_time = time.monotonic()
+
+    @property
+    def timed_out(self) -> bool:
+        """Whether the last probe ended in a timeout rather than an answer."""
+        return self._snapshot is not None and isinstance(
+            self._snapshot[1], CookerTimeout
+        )
+
+    def invalidate(self):
+        """Drop the cached status snapshot, the next reader probes the device again."""
+        self._snapshot = None
+
+    def _set_max_properties(self, max_properties: int):
+        _LOGGER.debug(
+            "Changing get_prop batch size of %s from %s to %s",
+            self.ip,
+            self._max_properties,
+            max_properties,
+        )
+        if self._growing and max_properties < self._max_properties:
+            # The larger batch still fails, the limit is real
+            self._grow_after *= 2
+        self._growing = max_properties > self._max_properties
+        self._max_properties = max_properties
+        self._batched_reads = 0
+        _MAX_PROPERTIES[self.ip] = max_properties
+
+    def _batched_read(self):
+        """Try a larger batch again after enough successful reads.
+
+        A halved batch size may come from a transient failure rather than the
+        firmware limit.
+        """
+        self._growing = False
+        if self._max_properties >= len(STATUS_PROPERTIES):
+            return
+        self._batched_reads += 1
+        if self._batched_reads >= self._grow_after:
+            self._set_max_properties(
+                min(len(STATUS_PROPERTIES), self._max_properties * 2)
+            )
+
+    def start(
+        self,
+        profile: str,
+        duration: int = None,
+        schedule: int = None,
+        akw: bool = None,
+        deadline: Optional[float] = None,
+        retries: Optional[int] = None,
+    ):
+        """Start cooking a profile."""
+        self.send(
+            "set_start",
+            [build_profile_hex(profile, duration, schedule, akw)],
+            retries,
+            deadline=deadline,
+        )
+        self.invalidate()
+        cooker_logger.info(
+            "启动烹饪：profile=%s duration=%s schedule=%s akw=%s",
+            PROFILE_NAMES.get(profile, "custom"),
+            duration,
+            schedule,
+            akw,
+        )
+
+    def stop(self, deadline: Optional[float] = None, retries: Optional[int] = None):
+        """Stop cooking."""
+        self.send("cancel_cooking", [], retries, deadline=deadline)
+        self.invalidate()
+        cooker_logger.info("停止烹饪")
+
+    def menu(self, profile: str, duration: int, schedule: int, akw: bool):
+        """Select one of the default(?) cooking profiles."""
+        self.send("set_menu", [build_profile_hex(profile, duration, schedule, akw)])
+        self.invalidate()
+
+    def get_temperature_history(
+        self, deadline: Optional[float] = None, retries: Optional[int] = None
+    ) -> TemperatureHistory:
+        """Retrieves a temperature history.
+
+        The temperature is only available while cooking. Approx. six data points per
+        minute.
+        """
+        [data] = self.send("get_temp_history", None, retries, deadline=deadline)
+        return self._history_reader.update(data)
+
+    def is_online(self):
+        """Is Online?"""
+        status, error = self._probe()
+        return error is None and status > 0
+
+    def get_mode(self):
+        """mode"""
+        status, error = self._probe()
+        if error is not None:
+            raise error
+        return OperationMode(status)
@@ -0,0 +1,362 @@
+"""Append-only on-disk telemetry of polled status snapshots and temperature samples.
+
+Every device owns a directory holding fixed-size binary records split into segment
+files named after the timestamp of their first record::
+
+    <path>/<device>/status-1700000000.bin
+    <path>/<device>/temp-1700000000.bin
+    <path>/<device>/sessions.bin
+    <path>/<device>/menus.bin
+
+Records are appended in time order, so a time-range query only memory-maps the
+segments overlapping the range and bisects inside them. The oldest segments are
+deleted once a device exceeds its disk budget.
+"""
+import bisect
+import mmap
+import os
+import struct
+import time
+from collections import namedtuple
+from typing import Dict, Iterator, List, Optional
+
+from cooker import CookerStatus, OperationMode, TemperatureHistory
+from logger import main_logger
+
+# ts, session, status, phase, temp, t_left(s), t_pre(min), t_cook(min), akw
+STATUS_RECORD = struct.Struct("<IIBBhHHHB")
+# ts, session, sample index, value
+TEMPERATURE_RECORD = struct.Struct("<IIHB")
+# session, first ts, last ts
+SESSION_RECORD = struct.Struct("<III")
+# session, menu id (20 bytes, hex in CookerStatus.menu_id)
+MENU_RECORD = struct.Struct("<I20s")
+
+StatusRecord = namedtuple(
+    "StatusRecord",
+    ["ts", "session", "status", "phase", "temp", "t_left", "t_pre", "t_cook", "akw"],
+)
+TemperatureRecord = namedtuple("TemperatureRecord", ["ts", "session", "index", "value"])
+# menu is None for sessions recorded before menus.bin existed
+SessionRecord = namedtuple(
+    "SessionRecord", ["session", "begin", "end", "menu"], defaults=[None]
+)
+
+COOKING_MODES = (OperationMode.Running, OperationMode.PreCook)
+
+
+def _int(value, default: int = 0) -> int:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+
+class _Records:
+    """Sequence view over the fixed-size records of a memory-mapped segment."""
+
+    def __init__(self, buffer, record: struct.Struct, factory) -> None:
+        self.buffer = buffer
+        self.record = record
+        self.factory = factory
+
+    def __len__(self) -> int:
+        return len(self.buffer) // self.record.size
+
+    def __getitem__(self, index: int):
+        return self.factory._make(
+            self.record.unpack_from(self.buffer, index * self.record.size)
+        )
+
+    def ts(self, index: int) -> int:
+        # The timestamp is the first field of every record
+        return struct.unpack_from("<I", self.buffer, index * self.record.size)[0]
+
+
+class _TsKeys:
+    def __init__(self, records: _Records) -> None:
+        self.records = records
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def __getitem__(self, index: int) -> int:
+        return self.records.ts(index)
+
+
+class _Segment:
+    """The segment file being appended to, held open with its size kept in memory."""
+
+    def __init__(self, directory: str, name: str) -> None:
+        self.name = name
+        self.path = os.path.join(directory, name)
+        self.size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        self._fp = None
+
+    def write(self, data: bytes):
+        if self._fp is None:
+            # Unbuffered, so that readers mapping the segment see every record
+            self._fp = open(self.path, "ab", buffering=0)
+        self._fp.write(data)
+        self.size += len(data)
+
+    def close(self):
+        if self._fp is not None:
+            self._fp.close()
+            self._fp = None
+
+
+class DeviceTelemetry:
+    """Telemetry of a single device."""
+
+    def __init__(self, path: str, max_bytes: int, segment_bytes: int) -> None:
+        self.path = path
+        self.max_bytes = max_bytes
+        self.segment_bytes = segment_bytes
+        os.makedirs(path, exist_ok=True)
+
+        # The segment each kind of record is appended to, found on disk once
+        self._current: Dict[str, _Segment] = {}
+        self._session = 0
+        self._session_begin = 0
+        self._history_count = 0
+        self._recover_session()
+
+    def _segments(self, kind: str) -> List[str]:
+        return sorted(
+            name
+            for name in os.listdir(self.path)
+            if name.startswith(kind + "-") and name.endswith(".bin")
+        )
+
+    @staticmethod
+    def _segment_ts(name: str) -> int:
+        return int(name[name.index("-") + 1 : -4])
+
+    def _append(self, kind: str, ts: int, data: bytes):
+        segment = self._current.get(kind)
+        if segment is None:
+            segments = self._segments(kind)
+            if segments:
+                segment = _Segment(self.path, segments[-1])
+                self._current[kind] = segment
+        if segment is None or segment.size >= self.segment_bytes:
+            name = f"{kind}-{ts:010d}.bin"
+            if segment is None or name > segment.name:
+                if segment is not None:
+                    segment.close()
+                self._current[kind] = segment = _Segment(self.path, name)
+                self._enforce_budget()
+        segment.write(data)
+
+    def _enforce_budget(self):
+        segments = [
+            name
+            for name in os.listdir(self.path)
+            if name.startswith(("status-", "temp-"))
+        ]
+        segments.sort(key=self._segment_ts)
+        sizes = {
+            name: os.path.getsize(os.path.join(self.path, name)) for name in segments
+        }
+        total = sum(sizes.values())
+        while segments and total > self.max_bytes:
+            name = segments.pop(0)
+            total -= sizes[name]
+            for kind, segment in list(self._current.items()):
+                if segment.name == name:
+                    segment.close()
+                    del self._current[kind]
+            os.remove(os.path.join(self.path, name))
+            main_logger.debug("telemetry: removed segment %s", name)
+
+    def _last_record(self, kind: str, record: struct.Struct) -> Optional[tuple]:
+        for name in reversed(self._segments(kind)):
+            with open(os.path.join(self.path, name), "rb") as fp:
+                size = os.fstat(fp.fileno()).st_size
+                size -= size % record.size
+                if size:
+                    fp.seek(size - record.size)
+                    return record.unpack(fp.read(record.size))
+        return None
+
+    def _recover_session(self):
+        """Resume the session left open by the last status record, e.g. on restart."""
+        status = self._last_record("status", STATUS_RECORD)
+        if status is None or not status[1]:
+            return
+        # Sessions are numbered by the timestamp of their first record
+        self._session = self._session_begin = status[1]
+        temperature = self._last_record("temp", TEMPERATURE_RECORD)
+        if temperature is not None and temperature[1] == self._session:
+            self._history_count = temperature[2] + 1
+
+    def close(self):
+        for segment in self._current.values():
+            segment.close()
+        self._current.clear()
+
+    def record_status(self, status: CookerStatus, ts: Optional[int] = None):
+        ts = int(ts if ts is not None else time.time())
+        mode = status.mode
+        if mode in COOKING_MODES:
+            if not self._session:
+                self._session = ts
+                self._session_begin = ts
+                self._history_count = 0
+                self._record_menu(status.menu_id)
+        elif self._session:
+            self._close_session(ts)
+
+        self._append(
+            "status",
+            ts,
+            STATUS_RECORD.pack(
+                ts,
+                self._session,
+                _int(status.status) & 0xFF,
+                _int(status.phase) & 0xFF,
+                max(-32768, min(32767, _int(status.temp))),
+                min(0xFFFF, max(0, _int(status.t_left))),
+                min(0xFFFF, max(0, _int(status.t_pre))),
+                min(0xFFFF, max(0, _int(status.t_cook))),
+                1 if status.keep_warm else 0,
+            ),
+        )
+
+    def record_history(self, history: TemperatureHistory, ts: Optional[int] = None):
+        """Append the samples added to the history since the previous call."""
+        if not self._session:
+            return
+        ts = int(ts if ts is not None else time.time())
+        samples = history.data
+        if len(samples) < self._history_count:
+            self._history_count = 0
+
+        tail = samples[self._history_count :]
+        if not len(tail):
+            return
+        buffer = bytearray(TEMPERATURE_RECORD.size * len(tail))
+        for offset, value in enumerate(tail):
+            TEMPERATURE_RECORD.pack_into(
+                buffer,
+                offset * TEMPERATURE_RECORD.size,
+                ts,
+                self._session,
+                min(0xFFFF, self._history_count + offset),
+                value,
+            )
+        self._history_count = len(samples)
+        self._append("temp", ts, bytes(buffer))
+
+    def _record_menu(self, menu_id):
+        try:
+            menu = bytes.fromhex(menu_id)
+        except (TypeError, ValueError):
+            return
+        if len(menu) != MENU_RECORD.size - 4:
+            return
+        with open(os.path.join(self.path, "menus.bin"), "ab") as fp:
+            fp.write(MENU_RECORD.pack(self._session, menu))
+
+    def _close_session(self, ts: int):
+        with open(os.path.join(self.path, "sessions.bin"), "ab") as fp:
+            fp.write(SESSION_RECORD.pack(self._session, self._session_begin, ts))
+        self._session = 0
+
+    def _query(self, kind, record, factory, begin: int, end: int) -> Iterator:
+        segments = self._segments(kind)
+        starts = [self._segment_ts(name) for name in segments]
+        first = max(0, bisect.bisect_right(starts, begin) - 1)
+        for name in segments[first:]:
+            if self._segment_ts(name) > end:
+                break
+            try:
+                fp = open(os.path.join(self.path, name), "rb")
+            except FileNotFoundError:
+                # Removed by the disk budget since it was listed
+                continue
+            with fp:
+                # Only the whole records written so far are mapped, the segment may
+                # still be appended to while it is read from another thread
+                size = os.fstat(fp.fileno()).st_size
+                size -= size % record.size
+                if not size:
+                    continue
+                with mmap.mmap(fp.fileno(), size, access=mmap.ACCESS_READ) as buffer:
+                    records = _Records(buffer, record, factory)
+                    keys = _TsKeys(records)
+                    index = bisect.bisect_left(keys, begin)
+                    while index < len(records) and records.ts(index) <= end:
+                        yield records[index]
+                        index += 1
+
+    def status_range(self, begin: int, end: int) -> Iterator[StatusRecord]:
+        return self._query("status", STATUS_RECORD, StatusRecord, begin, end)
+
+    def temperature_range(self, begin: int, end: int) -> Iterator[TemperatureRecord]:
+        return self._query("temp", TEMPERATURE_RECORD, TemperatureRecord, begin, end)
+
+    def _read(self, name: str, record: struct.Struct) -> Iterator[tuple]:
+        path = os.path.join(self.path, name)
+        if not os.path.exists(path):
+            return iter(())
+        with open(path, "rb") as fp:
+            data = fp.read()
+        return record.iter_unpack(data[: len(data) - len(data) % record.size])
+
+    def sessions(self) -> List[SessionRecord]:
+        menus = {
+            session: menu.hex()
+            for session, menu in self._read("menus.bin", MENU_RECORD)
+        }
+        return [
+            SessionRecord(session, begin, end, menus.get(session))
+            for session, begin, end in self._read("sessions.bin", SESSION_RECORD)
+        ]
+
+    def _session_range(self, session: int):
+        if session == self._session:
+            return self._session_begin, int(time.time())
+        for record in self.sessions():
+            if record.session == session:
+                return record.begin, record.end
+        return None
+
+    def session_status(self, session: int) -> Iterator[StatusRecord]:
+        span = self._session_range(session)
+        if span is None:
+            return iter(())
+        return (r for r in self.status_range(*span) if r.session == session)
+
+    def session_temperatures(self, session: int) -> Iterator[TemperatureRecord]:
+        span = self._session_range(session)
+        if span is None:
+            return iter(())
+        return (r for r in self.temperature_range(*span) if r.session == session)
+
+
+class TelemetryStore:
+    """Telemetry of all devices below one directory."""
+
+    def __init__(
+        self,
+        path: str,
+        max_bytes: int = 64 * 1024 * 1024,
+        segment_bytes: int = 1024 * 1024,
+    ) -> None:
+        self.path = path
+        self.max_bytes = max_bytes
+        self.segment_bytes = segment_bytes
+        self._devices: Dict[str, DeviceTelemetry] = {}
+
+    def device(self, name: str) -> DeviceTelemetry:
+        telemetry = self._devices.get(name)
+        if telemetry is None:
+            telemetry = DeviceTelemetry(
+                os.path.join(self.path, name.replace(os.sep, "_")),
+                self.max_bytes,
+                self.segment_bytes,
+            )
+            self._devices[name] = telemetry
+        return telemetry
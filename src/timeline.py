@@ -0,0 +1,99 @@
+import bisect
+from datetime import date, datetime, timedelta
+from typing import List, NamedTuple, Optional, Tuple
+
+from config import Calendar, MealProfile
+
+
+class MealWindow(NamedTuple):
+    """某一天中的一个就餐时间段"""
+
+    begin: datetime
+    end: datetime
+    usual: datetime
+    profile: MealProfile
+
+
+class MealTimeline:
+    """将就餐配置编译为按开始时间排序的时间段，每天只编译一次，查找时使用二分法
+
+    最晚时间早于最早时间的配置视为跨越午夜，前一天跨越午夜的时间段也会出现在当天的时间线中。
+    """
+
+    def __init__(
+        self, meal_profile_list: List[MealProfile], calendar: Calendar = None
+    ) -> None:
+        self.meal_profile_list = meal_profile_list
+        self.calendar = calendar or Calendar()
+
+        self._day: Optional[date] = None
+        self._windows: List[MealWindow] = []
+        self._begins: List[datetime] = []
+        self._max_ends: List[datetime] = []
+
+    def _is_active(self, profile: MealProfile, day: date) -> bool:
+        if profile.weekdays and day.isoweekday() not in profile.weekdays:
+            return False
+        if (
+            profile.workday is not None
+            and self.calendar.is_workday(day) != profile.workday
+        ):
+            return False
+        return True
+
+    def _day_windows(self, day: date) -> List[MealWindow]:
+        windows = []
+        for profile in self.meal_profile_list:
+            if not self._is_active(profile, day):
+                continue
+            begin = profile.time.earliest_time.on(day)
+            end = profile.time.latest_time.on(day)
+            usual = profile.time.usual_time.on(day)
+            if end <= begin:
+                end += timedelta(days=1)
+            if usual < begin:
+                usual += timedelta(days=1)
+            windows.append(MealWindow(begin, end, usual, profile))
+        return windows
+
+    def _compile(self, day: date):
+        windows = [
+            window
+            for window in self._day_windows(day - timedelta(days=1))
+            if window.end > datetime.combine(day, datetime.min.time())
+        ]
+        windows.extend(self._day_windows(day))
+        windows.sort(key=lambda window: window.begin)
+
+        self._day = day
+        self._windows = windows
+        self._begins = [window.begin for window in windows]
+        self._max_ends = []
+        max_end = None
+        for window in windows:
+            max_end = window.end if max_end is None else max(max_end, window.end)
+            self._max_ends.append(max_end)
+
+    def windows(self, day: date) -> List[MealWindow]:
+        if day != self._day:
+            self._compile(day)
+        return self._windows
+
+    def lookup(
+        self, now: datetime
+    ) -> Tuple[Optional[MealWindow], Optional[MealWindow]]:
+        """返回 (当前所处的时间段, 今天下一个尚未开始的时间段)"""
+        windows = self.windows(now.date())
+
+        index = bisect.bisect_right(self._begins, now)
+        current = None
+        candidate = index - 1
+        # 时间段可能重叠，向前查找直到之前的时间段都已结束
+        while candidate >= 0 and self._max_ends[candidate] > now:
+            if windows[candidate].end > now:
+                current = windows[candidate]
+                break
+            candidate -= 1
+
+        upcoming = windows[index] if index < len(windows) else None
+        return current, upcoming
@@ -0,0 +1,101 @@
+import asyncio
+import os
+
+from analytics import EtaModel
+from config import read_config
+from cooker import STAGE_MARKER, CookerStatus, OperationMode, TemperatureHistory
+from scheduler import CookerScheduler
+from telemetry import DeviceTelemetry
+
+FINE = "0000000000000000000000000000000000000001"
+QUICK = "0101000000000000000000000000000000000002"
+
+CONFIG = """!Config
+poll_interval: 30
+cooker_config: !CookerConfig
+  name: eta
+  ip: 127.0.0.1
+  token: ffffffffffffffffffffffffffffffff
+  akw: true
+  unpluggedCheck: false
+  unpluggedMaxDuration: 60
+  unpluggedAutoStopAkw: false
+  unpluggedMaxReminderCount: 1
+  meal_profile_list: []
+push_config: !PushConfig
+  token: ""
+"""
+
+
+def cook(preheat: int) -> TemperatureHistory:
+    samples = bytearray(range(20, 20 + preheat))
+    samples.append(STAGE_MARKER)
+    samples.extend([100] * 30)
+    return TemperatureHistory(samples.hex())
+
+
+def record(telemetry: DeviceTelemetry, cooks, ts: int = 1_700_000_000):
+    for menu, history in cooks:
+        running = {"status": OperationMode.Running.value, "menu": menu}
+        telemetry.record_status(CookerStatus(running), ts)
+        telemetry.record_history(history, ts)
+        ts += 3600
+        telemetry.record_status(CookerStatus({"status": 1}), ts)
+        ts += 60
+
+
+def test_learn_files_cooks_under_their_menu(tmp_path):
+    telemetry = DeviceTelemetry(str(tmp_path), 1 << 20, 1 << 16)
+    record(telemetry, [(FINE, cook(40)), (QUICK, cook(10)), (FINE, cook(50))])
+
+    assert [session.menu for session in telemetry.sessions()] == [FINE, QUICK, FINE]
+    model = EtaModel()
+    assert model.learn(telemetry) == 3
+    assert len(model.cooks[FINE]) == 2
+    assert len(model.cooks[QUICK]) == 1
+
+
+def test_learn_files_sessions_without_menu_under_profile(tmp_path):
+    telemetry = DeviceTelemetry(str(tmp_path), 1 << 20, 1 << 16)
+    record(telemetry, [(FINE, cook(40))])
+    # 记录菜单之前写入的遥测
+    os.remove(os.path.join(tmp_path, "menus.bin"))
+
+    assert [session.menu for session in telemetry.sessions()] == [None]
+    model = EtaModel()
+    assert model.learn(telemetry) == 1
+    assert list(model.cooks) == [None]
+
+
+def test_learn_skips_the_session_still_being_recorded(tmp_path):
+    telemetry = DeviceTelemetry(str(tmp_path), 1 << 20, 1 << 16)
+    record(telemetry, [(FINE, cook(40))])
+    running = {"status": OperationMode.Running.value, "menu": QUICK}
+    telemetry.record_status(CookerStatus(running), 1_800_000_000)
+    telemetry.record_history(cook(10), 1_800_000_000)
+
+    model = EtaModel()
+    assert model.learn(telemetry) == 1
+    assert list(model.cooks) == [FINE]
+
+
+def test_scheduler_learns_off_the_event_loop(tmp_path):
+    path = os.path.join(tmp_path, "config.yaml")
+    with open(path, "w", encoding="utf-8") as fp:
+        fp.write(CONFIG)
+    cooker_config = read_config(path, use_cache=False).get_cooker_configs()[0]
+    telemetry = DeviceTelemetry(os.path.join(tmp_path, "eta"), 1 << 20, 1 << 16)
+    record(telemetry, [(FINE, cook(40)), (FINE, cook(50))])
+    scheduler = CookerScheduler(None, cooker_config, telemetry, push=lambda *_: None)
+    running = CookerStatus({"status": OperationMode.Running.value, "menu": QUICK})
+
+    async def analyze():
+        scheduler.analyze(running, None)
+        # 学习期间结束的烹饪
+        scheduler.tracker.eta.add(QUICK, (0, 12), 40)
+        await scheduler._eta_learning
+        await asyncio.sleep(0)
+
+    asyncio.run(analyze())
+    assert len(scheduler.tracker.eta.cooks[FINE]) == 2
+    assert len(scheduler.tracker.eta.cooks[QUICK]) == 1
@@ -0,0 +1,193 @@
+import asyncio
+import json
+import os
+from datetime import datetime
+
+import pytest
+
+import api
+from api import ApiServer
+from clock import VirtualClock
+from config import read_config
+from cooker import CookerStatus, OperationMode
+from replay import Report, SimulatedReplayCooker
+from scheduler import CookerScheduler
+
+CONFIG = """!Config
+poll_interval: 30
+cooker_config: !CookerConfig
+  name: warm
+  ip: 127.0.0.1
+  token: ffffffffffffffffffffffffffffffff
+  akw: true
+  unpluggedCheck: false
+  unpluggedMaxDuration: 60
+  unpluggedAutoStopAkw: false
+  unpluggedMaxReminderCount: 1
+  meal_profile_list: []
+push_config: !PushConfig
+  token: ""
+"""
+
+
+@pytest.fixture
+def setup(tmp_path):
+    path = os.path.join(tmp_path, "config.yaml")
+    with open(path, "w", encoding="utf-8") as fp:
+        fp.write(CONFIG)
+    cooker_config = read_config(path, use_cache=False).get_cooker_configs()[0]
+    clock = VirtualClock(datetime(2024, 3, 4, 9, 0))
+    report = Report()
+    cooker = SimulatedReplayCooker(
+        cooker_config.name, clock, report, [(clock.now(), True)]
+    )
+    scheduler = CookerScheduler(
+        cooker, cooker_config, clock=clock, push=lambda *_: None
+    )
+    return scheduler, report
+
+
+def serve(scenario, scheduler):
+    async def main():
+        server = ApiServer(port=0)
+        server.attach(scheduler)
+        await server.start()
+        try:
+            return await scenario(server, server._server.sockets[0].getsockname()[1])
+        finally:
+            await server.close()
+
+    return asyncio.run(main())
+
+
+async def request(port: int, method: str, path: str, payload=None, headers=""):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    body = b"" if payload is None else json.dumps(payload).encode()
+    writer.write(
+        f"{method} {path} HTTP/1.1\r\nHost: localhost\r\n{headers}"
+        f"Content-Length: {len(body)}\r\n\r\n".encode()
+        + body
+    )
+    response = await reader.read()
+    writer.close()
+    head, body = response.split(b"\r\n\r\n", 1)
+    return int(head.split()[1]), json.loads(body)
+
+
+async def open_stream(port: int, path: str, headers: str = ""):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(f"GET {path} HTTP/1.1\r\n{headers}\r\n".encode())
+    head = await reader.readuntil(b"\r\n\r\n")
+    assert head.startswith(b"HTTP/1.1 200")
+    return reader, writer
+
+
+async def read_event(reader: asyncio.StreamReader) -> dict:
+    event = {}
+    for line in (await reader.readuntil(b"\n\n")).decode().strip().splitlines():
+        key, value = line.split(": ", 1)
+        event[key] = json.loads(value) if key == "data" else value
+    return event
+
+
+def test_reads_the_polled_snapshot(setup):
+    scheduler, _ = setup
+
+    async def scenario(server, port):
+        assert (await request(port, "GET", "/api/cookers/warm/status"))[0] == 503
+        await scheduler.task()
+        return [
+            await request(port, "GET", "/api/cookers"),
+            await request(port, "GET", "/api/cookers/warm/mode"),
+            await request(port, "GET", "/api/cookers/warm/status"),
+            await request(port, "GET", "/api/cookers/cold"),
+            await request(port, "DELETE", "/api/cookers/warm"),
+        ]
+
+    cookers, mode, status, missing, method = serve(scenario, scheduler)
+    assert cookers[0] == 200
+    assert [cooker["name"] for cooker in cookers[1]["cookers"]] == ["warm"]
+    assert mode == (200, {"online": True, "mode": "Waiting"})
+    assert status[0] == 200 and status[1]["mode"] == "Waiting"
+    assert missing[0] == 404
+    assert method[0] == 405
+
+
+def test_schedule_validates_and_goes_through_the_scheduler(setup):
+    scheduler, report = setup
+
+    async def scenario(server, port):
+        path = "/api/cookers/warm/schedule"
+        return [
+            await request(port, "POST", path, {"profile": "Rice", "minutes": 90}),
+            await request(port, "POST", path, {"profile": "FineRice", "minutes": 0}),
+            await request(port, "POST", path, {"profile": "FineRice", "at": "6pm"}),
+            await request(port, "POST", path, {"profile": "FineRice", "at": "18:00"}),
+            # 已过去的时间视为明天
+            await request(port, "POST", path, {"profile": "FineRice", "at": "8:30"}),
+        ]
+
+    responses = serve(scenario, scheduler)
+    assert [status for status, _ in responses] == [400, 400, 400, 200, 200]
+    assert [response["minutes"] for _, response in responses[3:]] == [540, 1410]
+    assert [command.args for command in report.commands] == [
+        ("FineRice", 540, True),
+        ("FineRice", 1410, True),
+    ]
+
+
+def test_event_stream_sends_changes_and_resumes(setup):
+    scheduler, _ = setup
+
+    async def scenario(server, port):
+        await scheduler.task()
+        reader, writer = await open_stream(port, "/api/cookers/warm/events")
+        snapshot = await read_event(reader)
+        status, _ = await request(
+            port, "POST", "/api/cookers/warm/start", {"profile": "FineRice"}
+        )
+        assert status == 200
+        scheduler.clock.advance(60)
+        await scheduler.task()
+        change = await read_event(reader)
+        writer.close()
+
+        # 断线期间的变更在重连后补发
+        scheduler.clock.advance(600)
+        await scheduler.task()
+        reader, writer = await open_stream(
+            port,
+            "/api/cookers/warm/events",
+            "Last-Event-ID: %s\r\n" % change["id"],
+        )
+        missed = await read_event(reader)
+        writer.close()
+        return snapshot, change, missed
+
+    snapshot, change, missed = serve(scenario, scheduler)
+    assert snapshot["event"] == "snapshot"
+    assert snapshot["data"]["mode"] == "Waiting"
+    assert change["event"] == "change"
+    assert int(change["id"]) == snapshot["data"]["seq"] + 1
+    assert change["data"]["changes"]["status"] == OperationMode.Running.value
+    assert missed["event"] == "change"
+    assert int(missed["id"]) == int(change["id"]) + 1
+
+
+def test_slow_client_is_disconnected(setup, monkeypatch):
+    scheduler, _ = setup
+    monkeypatch.setattr(api, "CLIENT_BACKLOG", 1)
+
+    async def scenario(server, port):
+        await scheduler.task()
+        reader, writer = await open_stream(port, "/api/events")
+        await read_event(reader)
+        # 客户端还没取走第一条变更时又来了一条
+        for temp in (20, 21):
+            status = CookerStatus({"status": OperationMode.Waiting.value, "temp": temp})
+            scheduler.feed.update(scheduler.clock.now(), status)
+        rest = await asyncio.wait_for(reader.read(), 2)
+        writer.close()
+        return rest, len(server.clients)
+
+    assert serve(scenario, scheduler) == (b"", 0)
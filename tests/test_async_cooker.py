@@ -0,0 +1,72 @@
+import asyncio
+
+import pytest
+
+from async_cooker import AsyncMultiCooker
+from cooker import _MAX_PROPERTIES, GROW_PROPERTIES_AFTER, STATUS_PROPERTIES
+from simulator import serve
+
+TOKEN = "ff" * 16
+
+HOST = "127.0.0.5"
+
+
+@pytest.fixture(autouse=True)
+def forget_batch_size():
+    _MAX_PROPERTIES.pop(HOST, None)
+    yield
+    _MAX_PROPERTIES.pop(HOST, None)
+
+
+async def connect(max_properties):
+    transport, simulator = await serve(HOST, 0, TOKEN, max_properties=max_properties)
+    port = transport.get_extra_info("sockname")[1]
+    cooker = AsyncMultiCooker(HOST, TOKEN, timeout=0.5, port=port)
+    return transport, simulator, cooker
+
+
+def test_batch_size_grows_back_after_a_transient_limit():
+    async def read():
+        transport, simulator, cooker = await connect(5)
+        try:
+            await cooker.status()
+            assert cooker._max_properties == 5
+            simulator.max_properties = None
+
+            sizes = []
+            for _ in range(GROW_PROPERTIES_AFTER * 3):
+                await cooker.status()
+                sizes.append(cooker._max_properties)
+            return sizes
+        finally:
+            cooker.close()
+            transport.close()
+
+    sizes = asyncio.run(read())
+    assert sizes == sorted(sizes)
+    assert sorted(set(sizes)) == [5, 10, 20, len(STATUS_PROPERTIES)]
+    # 连同首次读取，第 20 次成功读取后批量加倍
+    assert sizes.count(5) == GROW_PROPERTIES_AFTER - 2
+    assert _MAX_PROPERTIES[HOST] == len(STATUS_PROPERTIES)
+
+
+def test_batch_size_retries_a_real_limit_less_often():
+    async def read():
+        transport, simulator, cooker = await connect(5)
+        try:
+            await cooker.status()
+            requests = simulator.requests
+            for _ in range(GROW_PROPERTIES_AFTER * 3):
+                await cooker.status()
+            return cooker, simulator.requests - requests
+        finally:
+            cooker.close()
+            transport.close()
+
+    cooker, requests = asyncio.run(read())
+    reads = GROW_PROPERTIES_AFTER * 3
+    batches = -(-len(STATUS_PROPERTIES) // 5)
+    # 更大的批量仍然失败时，下一次试探的间隔加倍，60 次读取中只试探两次
+    assert requests == reads * batches + 2
+    assert cooker._max_properties == 5
+    assert cooker._grow_after == GROW_PROPERTIES_AFTER * 4
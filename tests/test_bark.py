@@ -0,0 +1,109 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote
+
+import pytest
+
+from bark import PushDispatcher
+
+TOKEN = "token"
+
+
+class BarkServer(ThreadingHTTPServer):
+    """Loopback bark server answering with the scripted status codes, then 200."""
+
+    def __init__(self, statuses=()):
+        super().__init__(("127.0.0.1", 0), BarkHandler)
+        self.statuses = list(statuses)
+        self.requests = []
+        self.received = threading.Event()
+        self.release = threading.Event()
+        self.release.set()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def messages(self):
+        return [unquote(path.rsplit("/", 1)[1]) for _, path in self.requests]
+
+
+class BarkHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        server = self.server
+        server.requests.append((time.monotonic(), self.path))
+        server.received.set()
+        server.release.wait()
+        status = server.statuses.pop(0) if server.statuses else 200
+        body = json.dumps({"code": status, "message": "success"}).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = BarkServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.release.set()
+    server.shutdown()
+    server.server_close()
+
+
+def test_retries_with_exponential_backoff(server):
+    server.statuses = [503, 502]
+    dispatcher = PushDispatcher(timeout=2, retries=3, backoff=0.05)
+
+    assert dispatcher.submit(server.url, TOKEN, "米家小饭煲", "已开始烹饪")
+    dispatcher.join()
+    times = [at for at, _ in server.requests]
+    assert server.messages() == ["已开始烹饪"] * 3
+    assert times[1] - times[0] >= 0.05
+    assert times[2] - times[1] >= 0.1
+
+
+def test_gives_up_after_retries(server):
+    server.statuses = [503] * 10
+    dispatcher = PushDispatcher(timeout=2, retries=2, backoff=0.01)
+
+    assert dispatcher.submit(server.url, TOKEN, "米家小饭煲", "已开始烹饪")
+    dispatcher.join()
+    assert len(server.requests) == 3
+
+
+def test_dedupes_within_window(server):
+    dispatcher = PushDispatcher(timeout=2, dedupe_window=60)
+
+    assert dispatcher.submit(server.url, TOKEN, "米家小饭煲", "已开始烹饪")
+    assert not dispatcher.submit(server.url, TOKEN, "米家小饭煲", "已开始烹饪")
+    assert dispatcher.submit(server.url, TOKEN, "米家小饭煲", "已停止")
+    dispatcher.join()
+    assert server.messages() == ["已开始烹饪", "已停止"]
+
+
+def test_full_queue_does_not_swallow_the_retry(server):
+    dispatcher = PushDispatcher(maxsize=1, timeout=2, dedupe_window=60)
+    server.release.clear()
+
+    assert dispatcher.submit(server.url, TOKEN, "米家小饭煲", "first")
+    # 后台线程正在推送第一条，队列中只能再放一条
+    assert server.received.wait(2)
+    assert dispatcher.submit(server.url, TOKEN, "米家小饭煲", "second")
+    assert not dispatcher.submit(server.url, TOKEN, "米家小饭煲", "third")
+
+    server.release.set()
+    dispatcher.join()
+    assert dispatcher.submit(server.url, TOKEN, "米家小饭煲", "third")
+    dispatcher.join()
+    assert server.messages() == ["first", "second", "third"]
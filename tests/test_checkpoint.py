@@ -0,0 +1,114 @@
+import asyncio
+import json
+import os
+from datetime import datetime
+
+import pytest
+
+from checkpoint import Checkpoint
+from clock import VirtualClock
+from config import read_config
+from cooker import OperationMode
+from replay import Report, SimulatedReplayCooker
+from scheduler import CookerScheduler
+
+CONFIG = """!Config
+poll_interval: 30
+cooker_config: !CookerConfig
+  name: warm
+  ip: 127.0.0.1
+  token: ffffffffffffffffffffffffffffffff
+  akw: true
+  unpluggedCheck: true
+  unpluggedMaxDuration: 60
+  unpluggedAutoStopAkw: true
+  unpluggedMaxReminderCount: 1
+  meal_profile_list:
+    - !MealProfile
+      type: FineRice
+      time: !Mealtime
+        usual_time: !time 11:30
+        earliest_time: !time 10:40
+        latest_time: !time 11:20
+push_config: !PushConfig
+  token: ""
+"""
+
+
+def test_round_trip_and_unchanged_state_is_not_written(tmp_path, monkeypatch):
+    path = os.path.join(tmp_path, "state", "warm.json")
+    checkpoint = Checkpoint(path)
+    assert checkpoint.load() is None
+
+    checkpoint.save({"scheduled": True})
+    assert Checkpoint(path).load() == {"scheduled": True}
+
+    replaced = []
+    replace = os.replace
+    monkeypatch.setattr(
+        os, "replace", lambda *args: replaced.append(args) or replace(*args)
+    )
+    checkpoint.save({"scheduled": True})
+    assert replaced == []
+    checkpoint.save({"scheduled": False})
+    assert len(replaced) == 1
+
+
+def test_failed_write_keeps_the_previous_checkpoint(tmp_path, monkeypatch):
+    path = os.path.join(tmp_path, "warm.json")
+    checkpoint = Checkpoint(path)
+    checkpoint.save({"scheduled": True})
+
+    def fail(*args, **kwargs):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(json, "dump", fail)
+    with pytest.raises(OSError):
+        checkpoint.save({"scheduled": False})
+    assert os.listdir(tmp_path) == ["warm.json"]
+    assert Checkpoint(path).load() == {"scheduled": True}
+
+
+def test_unreadable_checkpoint_is_ignored(tmp_path):
+    path = os.path.join(tmp_path, "warm.json")
+    with open(path, "w", encoding="utf8") as fp:
+        fp.write('{"scheduled": tr')
+
+    assert Checkpoint(path).load() is None
+
+
+def test_restart_does_not_command_again(tmp_path):
+    path = os.path.join(tmp_path, "config.yaml")
+    with open(path, "w", encoding="utf-8") as fp:
+        fp.write(CONFIG)
+    cooker_config = read_config(path, use_cache=False).get_cooker_configs()[0]
+    clock = VirtualClock(datetime(2024, 3, 4, 9, 0))
+    report = Report()
+    cooker = SimulatedReplayCooker(
+        cooker_config.name, clock, report, [(clock.now(), True)]
+    )
+    checkpoint_path = os.path.join(tmp_path, "state", "warm.json")
+
+    def restart(checkpoint=True) -> CookerScheduler:
+        return CookerScheduler(
+            cooker,
+            cooker_config,
+            checkpoint=Checkpoint(checkpoint_path) if checkpoint else None,
+            clock=clock,
+            push=lambda *_: None,
+        )
+
+    asyncio.run(restart().task())
+    assert [command.method for command in report.commands] == ["start"]
+    # 预约被手动取消，重启后不应再次预约
+    cooker.cooker.status = OperationMode.Waiting.value
+
+    clock.advance(60)
+    scheduler = restart()
+    assert scheduler.state.scheduled
+    asyncio.run(scheduler.task())
+    assert [command.method for command in report.commands] == ["start"]
+
+    # 没有检查点时会重新预约
+    asyncio.run(restart(checkpoint=False).task())
+    assert [command.method for command in report.commands] == ["start", "start"]
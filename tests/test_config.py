@@ -0,0 +1,92 @@
+import os
+import stat
+
+import pytest
+
+import config
+from config import read_config
+
+CONFIG = """!Config
+poll_interval: {poll_interval}
+cooker_config: !CookerConfig
+  name: kitchen
+  ip: !env ${{COOKER_IP}}
+  token: ffffffffffffffffffffffffffffffff
+  akw: true
+  unpluggedCheck: false
+  unpluggedMaxDuration: 60
+  unpluggedAutoStopAkw: false
+  unpluggedMaxReminderCount: 1
+  meal_profile_list: []
+push_config: !PushConfig
+  token: ${{BARK_TOKEN}}
+"""
+
+
+@pytest.fixture
+def config_path(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    monkeypatch.setenv("COOKER_IP", "192.168.1.20")
+    path = str(tmp_path / "config.yaml")
+    write(path, poll_interval=30)
+    return path
+
+
+@pytest.fixture
+def parses(monkeypatch):
+    calls = []
+    parse_config = config.parse_config
+
+    def parse(content):
+        calls.append(content)
+        return parse_config(content)
+
+    monkeypatch.setattr(config, "parse_config", parse)
+    return calls
+
+
+def write(path: str, poll_interval: int):
+    with open(path, "w", encoding="utf-8") as fp:
+        fp.write(CONFIG.format(poll_interval=poll_interval))
+
+
+def test_only_tagged_values_expand_env(config_path, monkeypatch):
+    monkeypatch.setenv("BARK_TOKEN", "secret")
+    loaded = read_config(config_path, use_cache=False)
+
+    assert loaded.cooker_config.ip == "192.168.1.20"
+    assert loaded.push_config.token == "${BARK_TOKEN}"
+
+
+def test_unchanged_config_skips_parsing(config_path, parses):
+    first = read_config(config_path)
+    second = read_config(config_path)
+
+    assert len(parses) == 1
+    assert second.cooker_config.ip == first.cooker_config.ip == "192.168.1.20"
+    # 缓存中包含 token，仅当前用户可读
+    mode = os.stat(config._cache_path(config_path)).st_mode
+    assert stat.S_IMODE(mode) == 0o600
+
+
+def test_changed_content_or_env_invalidates_cache(config_path, parses, monkeypatch):
+    read_config(config_path)
+    write(config_path, poll_interval=60)
+    assert read_config(config_path).poll_interval == 60
+
+    monkeypatch.setenv("COOKER_IP", "192.168.1.21")
+    assert read_config(config_path).cooker_config.ip == "192.168.1.21"
+    monkeypatch.delenv("COOKER_IP")
+    assert read_config(config_path).cooker_config.ip == "COOKER_IP"
+    assert len(parses) == 4
+
+
+def test_corrupt_cache_is_ignored(config_path, parses):
+    read_config(config_path)
+    with open(config._cache_path(config_path), "wb") as fp:
+        fp.write(b"\x80\x05garbage")
+
+    assert read_config(config_path).cooker_config.ip == "192.168.1.20"
+    assert len(parses) == 2
+    read_config(config_path)
+    assert len(parses) == 2
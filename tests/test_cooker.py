@@ -0,0 +1,75 @@
+import pytest
+
+from cooker import (
+    PROFILE_NAMES,
+    PROFILES,
+    STAGE_MARKER,
+    CookerException,
+    MultiCookerProfile,
+    TemperatureHistory,
+    TemperatureHistoryReader,
+    build_profile_hex,
+)
+
+# 烹饪 32 分钟时的温度曲线，0xaa 分隔各阶段
+HISTORY = (
+    "161515161c242a3031302f2eaa2f2f2e2f2e302f2e2d302f2f2e2f2f2f2f343a3f3f3d3e3c3d3c"
+    "3f3d3d3d3f3d3d3d3d3e3d3e3c3f3f3d3e3d3e3e3d3f3d3c3e3d3d3e3d3f3e3d3f3e3d3c3f3e3d"
+    "3c3f3e3d3c3f3f3d3d3e3d3d3f3f3d3d3f3f3e3d3d3d3e3e3d3daa3f3f3f3f3f414446474a4e53"
+    "575e5c5c5b59585755555353545454555554555555565656575757575858585859595b5b5c5c5c"
+    "5c5d5daa5d5e5f5f606061"
+)
+
+
+def test_profile_payload_is_cached_per_arguments():
+    payload = build_profile_hex(PROFILES["FineRice"], schedule=150, akw=True)
+
+    assert build_profile_hex(PROFILES["FineRice"], schedule=150, akw=True) is payload
+    assert build_profile_hex(PROFILES["FineRice"], schedule=151, akw=True) != payload
+    # 预约 2 小时 30 分钟，开启自动保温
+    assert bytes.fromhex(payload)[14:16] == bytes([0x80 | 2, 0x80 | 30])
+    assert MultiCookerProfile(payload).is_valid()
+
+
+@pytest.mark.parametrize("name", sorted(PROFILES))
+def test_builtin_profiles_round_trip(name):
+    assert PROFILE_NAMES[PROFILES[name]] == name
+    assert build_profile_hex(PROFILES[name]) == PROFILES[name].lower()
+
+
+def test_invalid_profile_is_rejected():
+    payload = bytearray.fromhex(PROFILES["FineRice"])
+    payload[-1] ^= 0xFF
+    with pytest.raises(CookerException):
+        build_profile_hex(payload.hex())
+    with pytest.raises(CookerException):
+        build_profile_hex("00")
+
+
+def test_history_reader_decodes_only_the_appended_samples():
+    reader = TemperatureHistoryReader(capacity=16)
+    histories = []
+    for end in range(2, len(HISTORY) + 1, 14):
+        histories.append((end, reader.update(HISTORY[:end])))
+    histories.append((len(HISTORY), reader.update(HISTORY)))
+
+    for end, history in histories:
+        # 之前返回的曲线在缓冲区扩容与继续追加后保持不变
+        expected = TemperatureHistory(HISTORY[:end])
+        assert history.temperatures == expected.temperatures
+        assert history.markers == expected.markers
+    last = histories[-1][1]
+    assert [stage.tobytes() for stage in last.stages()] == bytes.fromhex(
+        HISTORY
+    ).split(bytes([STAGE_MARKER]))
+
+
+def test_history_reader_starts_over_for_a_new_cook():
+    reader = TemperatureHistoryReader()
+    reader.update(HISTORY)
+    history = reader.update("1a1b1c")
+
+    assert history.temperatures == [0x1A, 0x1B, 0x1C]
+    assert history.markers == []
+    assert len(reader.update("1a1b1")) == 0
+    assert reader.update("1a1b1c1d").temperatures == [0x1A, 0x1B, 0x1C, 0x1D]
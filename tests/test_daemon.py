@@ -0,0 +1,134 @@
+import asyncio
+import os
+
+from config import read_config
+from cooker import OperationMode
+from daemon import Daemon
+
+CONFIG = """!Config
+poll_interval: 30
+cooker_configs:
+{cookers}
+push_config: !PushConfig
+  token: ""
+"""
+
+COOKER = """  - !CookerConfig
+    name: {name}
+    ip: {ip}
+    token: ffffffffffffffffffffffffffffffff
+    akw: true
+    unpluggedCheck: false
+    unpluggedMaxDuration: 60
+    unpluggedAutoStopAkw: false
+    unpluggedMaxReminderCount: 1
+    meal_profile_list: []"""
+
+
+class FakeCooker:
+    """Stand-in for AsyncMultiCooker, answering once ``answer`` is set."""
+
+    timed_out = False
+
+    def __init__(self, ip: str):
+        self.ip = ip
+        self.answer = asyncio.Event()
+        self.answer.set()
+        self.probes = 0
+        self.closed = False
+
+    def invalidate(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    async def is_online(self):
+        assert not self.closed
+        self.probes += 1
+        await self.answer.wait()
+        return True
+
+    async def get_mode(self):
+        assert not self.closed
+        return OperationMode.Waiting
+
+
+class FakeDaemon(Daemon):
+    def _create_cooker(self, cooker_config):
+        return FakeCooker(cooker_config.ip)
+
+
+def write(path: str, **cookers: str):
+    content = CONFIG.format(
+        cookers="\n".join(
+            COOKER.format(name=name, ip=ip) for name, ip in cookers.items()
+        )
+    )
+    with open(path, "w", encoding="utf-8") as fp:
+        fp.write(content)
+
+
+def daemon(tmp_path, **cookers: str) -> FakeDaemon:
+    path = os.path.join(tmp_path, "config.yaml")
+    write(path, **cookers)
+    return FakeDaemon(path, read_config(path, use_cache=False))
+
+
+def test_reload_swaps_the_cooker_after_the_tick_in_flight(tmp_path):
+    runner = daemon(tmp_path, kitchen="10.0.0.1")
+    scheduler = runner.schedulers["kitchen"]
+    old = scheduler.cooker
+    old.answer.clear()
+
+    async def reload_during_tick():
+        tick = asyncio.create_task(scheduler.task())
+        while not old.probes:
+            await asyncio.sleep(0)
+        write(runner.config_path, kitchen="10.0.0.2")
+        runner.reload()
+        await asyncio.sleep(0)
+        # 轮询尚未结束，旧连接仍在使用
+        assert scheduler.cooker is old
+        assert not old.closed
+
+        old.answer.set()
+        await tick
+        await asyncio.gather(*runner._reconnects)
+
+    asyncio.run(reload_during_tick())
+    assert old.closed
+    assert scheduler.cooker.ip == "10.0.0.2"
+    assert scheduler.cooker_config.ip == "10.0.0.2"
+    assert scheduler.state.online
+
+
+def test_reload_adds_and_removes_cookers(tmp_path):
+    runner = daemon(tmp_path, kitchen="10.0.0.1", office="10.0.0.2")
+    kitchen = runner.schedulers["kitchen"]
+    office = runner.schedulers["office"]
+
+    async def reload():
+        write(runner.config_path, kitchen="10.0.0.1", lab="10.0.0.3")
+        runner.reload()
+        await asyncio.sleep(0)
+        for task in runner.tasks.values():
+            task.cancel()
+
+    asyncio.run(reload())
+    assert list(runner.schedulers) == ["kitchen", "lab"]
+    assert runner.schedulers["kitchen"] is kitchen
+    assert not kitchen.cooker.closed
+    assert office.cooker.closed
+    assert list(runner.tasks) == ["lab"]
+
+
+def test_invalid_config_keeps_running(tmp_path):
+    runner = daemon(tmp_path, kitchen="10.0.0.1")
+    config = runner.config
+    with open(runner.config_path, "w", encoding="utf-8") as fp:
+        fp.write("!Config\ncooker_configs: []\n")
+
+    runner.reload()
+    assert runner.config is config
+    assert list(runner.schedulers) == ["kitchen"]
@@ -0,0 +1,94 @@
+import asyncio
+import os
+import socket
+
+from async_cooker import AsyncMultiCooker
+from config import DiscoveryConfig, read_config
+from daemon import Daemon
+from discovery import Discovery
+from session import SessionStore
+from simulator import serve
+
+TOKEN = "ff" * 16
+
+CONFIG = """!Config
+poll_interval: 30
+state_path: {state_path}
+discovery_config: !DiscoveryConfig
+  subnet: 127.0.0.0/29
+  port: {port}
+  timeout: 0.5
+cooker_config: !CookerConfig
+  name: kitchen
+  ip: 127.0.0.4
+  token: {token}
+  akw: true
+  unpluggedCheck: false
+  unpluggedMaxDuration: 60
+  unpluggedAutoStopAkw: false
+  unpluggedMaxReminderCount: 1
+  meal_profile_list: []
+push_config: !PushConfig
+  token: ""
+"""
+
+
+class LoopbackDaemon(Daemon):
+    """Talks to the simulators on the discovery port instead of the miIO port."""
+
+    def _create_cooker(self, cooker_config):
+        ip = self.discovery.address(cooker_config)
+        return AsyncMultiCooker(
+            ip,
+            cooker_config.token,
+            timeout=0.2,
+            port=self.config.discovery_config.port,
+            session=self.sessions.session(ip),
+            probe_deadline=0.2,
+        )
+
+
+def free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def test_rescans_with_exponential_spacing():
+    discovery = Discovery(DiscoveryConfig("127.0.0.0/29", failures=3))
+    scans = [failures for failures in range(400) if discovery.should_resolve(failures)]
+    assert scans == [3, 6, 12, 24, 48, 96, 192, 288, 384]
+
+
+def test_rediscovers_the_known_device_on_loopback(tmp_path):
+    port = free_port()
+    path = os.path.join(tmp_path, "config.yaml")
+    with open(path, "w", encoding="utf-8") as fp:
+        fp.write(CONFIG.format(state_path=tmp_path, port=port, token=TOKEN))
+    daemon = LoopbackDaemon(path, read_config(path, use_cache=False))
+    scheduler = daemon.schedulers["kitchen"]
+
+    async def move():
+        transport, _ = await serve("127.0.0.4", port, TOKEN, device_id=2)
+        assert await scheduler.cooker.is_online()
+        transport.close()
+        # 设备换了地址，同一网段中还有一台 token 相同的设备
+        moved, _ = await serve("127.0.0.3", port, TOKEN, device_id=2)
+        other, _ = await serve("127.0.0.2", port, TOKEN, device_id=1)
+        try:
+            scheduler.cooker.invalidate()
+            assert not await scheduler.cooker.is_online()
+            await daemon.rediscover(scheduler)
+            assert await scheduler.cooker.is_online()
+        finally:
+            moved.close()
+            other.close()
+            scheduler.cooker.close()
+
+    asyncio.run(move())
+    assert scheduler.cooker.ip == "127.0.0.3"
+    assert daemon.discovery.cache["kitchen"]["device_id"] == 2
+    # 超时后会话失效，设备 id 仍然保留以便重启后识别
+    sessions = SessionStore(os.path.join(tmp_path, "sessions", "miio.json"))
+    assert sessions.session("127.0.0.4").known_device_id == 2
+    assert not sessions.session("127.0.0.4").established
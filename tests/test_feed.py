@@ -0,0 +1,17 @@
+from datetime import datetime
+
+from cooker import CookerStatus
+from feed import StatusFeed
+
+
+def test_since():
+    feed = StatusFeed("feed", backlog=2)
+    for temp in (20, 21, 22):
+        feed.update(datetime(2024, 3, 4), CookerStatus({"status": 1, "temp": temp}))
+
+    assert feed.since(3) == []
+    assert [change.seq for change in feed.since(1)] == [2, 3]
+    # 已移出缓冲区
+    assert feed.since(0) is None
+    # 来自重启前的变更流
+    assert feed.since(7) is None
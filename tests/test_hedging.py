@@ -0,0 +1,102 @@
+import asyncio
+import time
+
+import pytest
+
+from async_cooker import AsyncMultiCooker
+from cooker import CookerTimeout, OperationMode
+from metrics import RPC_HEDGES, RPC_RETRIES
+from simulator import serve
+
+TOKEN = "ff" * 16
+
+HOST = "127.0.0.8"
+
+# hello 数据包只有 32 字节的头部
+HELLO_SIZE = 32
+
+
+def drop_requests(simulator, count: int):
+    """Drop the next ``count`` requests, hellos still get an answer."""
+    receive = simulator.datagram_received
+    dropped = []
+
+    def datagram_received(data, addr):
+        if len(data) > HELLO_SIZE and len(dropped) < count:
+            dropped.append(data)
+            return
+        receive(data, addr)
+
+    simulator.datagram_received = datagram_received
+    return dropped
+
+
+def run(scenario, **kwargs):
+    async def main():
+        transport, simulator = await serve(HOST, 0, TOKEN)
+        port = transport.get_extra_info("sockname")[1]
+        cooker = AsyncMultiCooker(HOST, TOKEN, port=port, **kwargs)
+        try:
+            await cooker.send("miIO.info")
+            return await scenario(cooker, simulator)
+        finally:
+            cooker.close()
+            transport.close()
+
+    return asyncio.run(main())
+
+
+def test_hedged_read_answers_before_the_retry_timeout():
+    hedges = RPC_HEDGES.labels(HOST, "get_prop")
+    retries = RPC_RETRIES.labels(HOST, "get_prop")
+    counts = hedges.value, retries.value
+
+    async def scenario(cooker, simulator):
+        drop_requests(simulator, 1)
+        begin = time.monotonic()
+        result = await cooker.send("get_prop", ["status"], hedge_delay=0.05)
+        return result, time.monotonic() - begin, simulator.hellos
+
+    result, elapsed, hellos = run(scenario, timeout=2)
+    assert result == [OperationMode.Waiting.value]
+    assert elapsed < 1
+    assert (hedges.value, retries.value) == (counts[0] + 1, counts[1])
+    # 对冲成功，会话未失效，不需要重新握手
+    assert hellos == 1
+
+
+def test_commands_with_side_effects_are_not_hedged():
+    hedges = RPC_HEDGES.labels(HOST, "cancel_cooking")
+    retries = RPC_RETRIES.labels(HOST, "cancel_cooking")
+    counts = hedges.value, retries.value
+
+    async def scenario(cooker, simulator):
+        drop_requests(simulator, 1)
+        return await cooker.send("cancel_cooking", hedge_delay=0.01)
+
+    assert run(scenario, timeout=0.2) == ["ok"]
+    assert (hedges.value, retries.value) == (counts[0], counts[1] + 1)
+
+
+def test_deadline_bounds_the_retries():
+    async def scenario(cooker, simulator):
+        drop_requests(simulator, 100)
+        begin = time.monotonic()
+        with pytest.raises(CookerTimeout):
+            await cooker.send("get_prop", ["status"], deadline=0.3, retries=10)
+        return time.monotonic() - begin
+
+    assert 0.3 <= run(scenario, timeout=5) < 1
+
+
+def test_probe_is_bounded_by_its_deadline():
+    async def scenario(cooker, simulator):
+        drop_requests(simulator, 100)
+        begin = time.monotonic()
+        online = await cooker.is_online()
+        return online, cooker.timed_out, time.monotonic() - begin
+
+    online, timed_out, elapsed = run(scenario, timeout=5, probe_deadline=0.3)
+    assert not online
+    assert timed_out
+    assert elapsed < 1
@@ -0,0 +1,76 @@
+import json
+import logging
+
+import pytest
+
+import logger
+
+
+@pytest.fixture
+def output(capsys):
+    root = logging.getLogger()
+    handlers = root.handlers[:]
+    level = root.level
+    root.setLevel(logging.INFO)
+
+    def read() -> str:
+        # 停止后台线程，确保队列中的日志都已输出
+        logger._stop_listener()
+        return capsys.readouterr().err
+
+    yield read
+    logger._stop_listener()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    for handler in handlers:
+        root.addHandler(handler)
+    root.setLevel(level)
+
+
+def test_message_is_formatted_when_queued(output):
+    logger.setup_logging()
+    modes = ["Waiting"]
+    logger.main_logger.info("状态：%s", modes)
+    # 入队后修改参数不影响日志内容
+    modes.append("Running")
+
+    assert "状态：['Waiting']" in output()
+
+
+def test_exception_survives_the_queue(output):
+    logger.setup_logging(use_json=True)
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        logger.main_logger.exception("调度失败：%s", "kitchen")
+
+    data = json.loads(output().strip())
+    assert data["message"] == "调度失败：kitchen"
+    assert "ValueError: boom" in data["exc_info"]
+
+
+def test_rate_limited_logs_report_the_suppressed_count(output, monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(logger.time, "monotonic", lambda: now[0])
+    logger.setup_logging(rate_limit=300)
+    for at in (0, 1, 2, 400):
+        now[0] = at
+        logger.main_logger.info(
+            "kitchen 探测超时 %s", at, extra={"rate_limit": "timeout:kitchen"}
+        )
+        logger.main_logger.info("kitchen 在线")
+    # 错误日志不限流
+    for _ in range(2):
+        logger.main_logger.error("kitchen 调度失败", extra={"rate_limit": True})
+
+    lines = output().splitlines()
+    assert [line.split("] ", 1)[1] for line in lines] == [
+        "kitchen 探测超时 0",
+        "kitchen 在线",
+        "kitchen 在线",
+        "kitchen 在线",
+        "kitchen 探测超时 400（此前 2 条相同日志已省略）",
+        "kitchen 在线",
+        "kitchen 调度失败",
+        "kitchen 调度失败",
+    ]
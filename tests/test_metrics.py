@@ -0,0 +1,89 @@
+import asyncio
+import urllib.error
+import urllib.request
+
+import pytest
+
+import metrics
+from async_cooker import AsyncMultiCooker
+from metrics import RPC_SECONDS, Registry
+from simulator import serve
+
+TOKEN = "ff" * 16
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = Registry()
+    family = registry.histogram("rpc_seconds", "latency", ("device",), (0.1, 1.0))
+    histogram = family.labels("kitchen")
+    assert family.labels("kitchen") is histogram
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value)
+
+    lines = registry.render().splitlines()
+    assert lines == [
+        "# HELP rpc_seconds latency",
+        "# TYPE rpc_seconds histogram",
+        'rpc_seconds_bucket{device="kitchen",le="0.1"} 2',
+        'rpc_seconds_bucket{device="kitchen",le="1.0"} 3',
+        'rpc_seconds_bucket{device="kitchen",le="+Inf"} 4',
+        'rpc_seconds_sum{device="kitchen"} 3.65',
+        'rpc_seconds_count{device="kitchen"} 4',
+    ]
+
+
+def test_counter_labels_are_escaped():
+    registry = Registry()
+    family = registry.counter("push_total", "pushes", ("outcome",))
+    assert registry.counter("push_total", "pushes", ("outcome",)) is family
+    family.labels('a"b\\c\n').inc()
+    family.labels("ok").inc(2)
+
+    assert registry.render().splitlines()[2:] == [
+        'push_total{outcome="a\\"b\\\\c\\n"} 1',
+        'push_total{outcome="ok"} 2',
+    ]
+
+
+@pytest.fixture
+def endpoint():
+    registry = Registry()
+    registry.counter("push_total", "pushes").labels().inc()
+    server = metrics.serve("127.0.0.1", 0, registry)
+    yield "http://127.0.0.1:%d" % server.server_address[1]
+    server.shutdown()
+    server.server_close()
+
+
+def test_serves_metrics_over_http(endpoint):
+    with urllib.request.urlopen(endpoint + "/metrics?debug=1", timeout=2) as response:
+        assert response.headers["Content-Type"].startswith("text/plain")
+        assert response.read().decode().endswith("\npush_total 1\n")
+
+    with pytest.raises(urllib.error.HTTPError) as error:
+        urllib.request.urlopen(endpoint + "/", timeout=2)
+    assert error.value.code == 404
+
+
+def test_rpc_latency_is_recorded_per_device_and_method():
+    host = "127.0.0.6"
+
+    async def read():
+        transport, _ = await serve(host, 0, TOKEN)
+        port = transport.get_extra_info("sockname")[1]
+        cooker = AsyncMultiCooker(host, TOKEN, timeout=0.5, port=port)
+        try:
+            await cooker.status()
+            await cooker.status()
+        finally:
+            cooker.close()
+            transport.close()
+
+    histogram = RPC_SECONDS.labels(host, "get_prop")
+    count = histogram.count
+    asyncio.run(read())
+    assert histogram.count == count + 2
+    assert histogram.sum > 0
+    assert 'cooker_rpc_seconds_count{device="%s",method="get_prop"}' % host in (
+        metrics.REGISTRY.render()
+    )
@@ -0,0 +1,119 @@
+import asyncio
+import os
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from config import MealProfile, Mealtime, Time, read_config
+from cooker import OperationMode
+from polling import DEFAULT_POLL_INTERVALS, OFFLINE, PollScheduler
+from replay import Replay, daily_power
+from timeline import MealTimeline
+
+LUNCH = MealProfile(
+    type="FineRice",
+    time=Mealtime(
+        usual_time=Time(11, 30), earliest_time=Time(10, 40), latest_time=Time(11, 20)
+    ),
+)
+
+CONFIG = """!Config
+poll_interval: 30
+cooker_config: !CookerConfig
+  name: poll
+  ip: 127.0.0.1
+  token: ffffffffffffffffffffffffffffffff
+  akw: true
+  unpluggedCheck: true
+  unpluggedMaxDuration: 60
+  unpluggedAutoStopAkw: true
+  unpluggedMaxReminderCount: 1
+  meal_profile_list:
+    - !MealProfile
+      type: FineRice
+      time: !Mealtime
+        usual_time: !time 11:30
+        earliest_time: !time 10:40
+        latest_time: !time 11:20
+push_config: !PushConfig
+  token: ""
+"""
+
+DAY = date(2024, 3, 4)
+
+# 每 30 秒轮询一次时一天的轮询次数
+BASELINE = 24 * 60 * 2
+
+
+def at(hour: int, minute: int, second: int = 0) -> datetime:
+    return datetime(DAY.year, DAY.month, DAY.day, hour, minute, second)
+
+
+def poller() -> PollScheduler:
+    return PollScheduler(MealTimeline([LUNCH]), poll_interval=30)
+
+
+def test_offline_backs_off_to_waiting_max_inside_window():
+    scheduler = poller()
+    for _ in range(10):
+        scheduler.update(at(11, 0), False)
+    # 就餐时间段内上电后应尽快调度，不按离线间隔的上限退避
+    assert scheduler.next_delay(at(11, 0), None) == 30
+    assert scheduler.next_delay(at(14, 0), None) == DEFAULT_POLL_INTERVALS[OFFLINE].max
+
+
+def test_offline_polls_fast_after_unplug_and_before_window():
+    scheduler = poller()
+    scheduler.update(at(9, 0), True, OperationMode.Waiting)
+    scheduler.update(at(9, 0, 30), False)
+    assert scheduler.next_delay(at(9, 1), None) == DEFAULT_POLL_INTERVALS[OFFLINE].min
+
+    for _ in range(10):
+        scheduler.update(at(10, 35), False)
+    # 即将进入就餐时间段，不超过等待模式的最长间隔，也不越过开始时间
+    assert scheduler.next_delay(at(10, 35), None) == 30
+    assert scheduler.next_delay(at(10, 39, 50), None) == 10
+
+
+def test_unscheduled_waiting_polls_fast_in_lead_in():
+    scheduler = poller()
+    for _ in range(3):
+        scheduler.update(at(10, 35), True, OperationMode.Waiting)
+    assert scheduler.next_delay(at(10, 35), OperationMode.Waiting) == 5
+    assert scheduler.next_delay(at(9, 0), OperationMode.Waiting) == 30
+
+
+def test_scheduled_waiting_backs_off():
+    scheduler = poller()
+    delays = []
+    for _ in range(6):
+        scheduler.update(at(10, 35), True, OperationMode.Waiting)
+        delays.append(scheduler.next_delay(at(10, 35), OperationMode.Waiting, True))
+    assert delays == [30, 60, 120, 240, 300, 300]
+
+    # 状态变化后重新从最长间隔开始
+    scheduler.update(at(10, 36), True, OperationMode.PreCook)
+    scheduler.update(at(10, 37), True, OperationMode.Waiting)
+    assert scheduler.next_delay(at(10, 37), OperationMode.Waiting, True) == 30
+
+
+@pytest.mark.parametrize(
+    "power",
+    [[], daily_power(DAY, 1, Time(7, 0)), daily_power(DAY, 1, Time(7, 0), Time(22, 0))],
+    ids=["unplugged", "plugged", "unplugged-at-night"],
+)
+def test_replayed_day_polls_less_than_baseline(tmp_path, power):
+    path = os.path.join(tmp_path, "config.yaml")
+    with open(path, "w", encoding="utf-8") as fp:
+        fp.write(CONFIG)
+    config = read_config(path, use_cache=False)
+    replay = Replay(datetime.combine(DAY, datetime.min.time()), config)
+    replay.simulate(config.get_cooker_configs()[0], power)
+    report = asyncio.run(replay.run(datetime.combine(DAY, datetime.max.time())))
+
+    assert report.ticks < BASELINE / 4
+    if power:
+        assert [command.args for command in report.commands][:1] == [
+            ("FineRice", 269, True)
+        ]
+        assert report.commands[0].at - power[0][0] < timedelta(seconds=30)
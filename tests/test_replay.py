@@ -0,0 +1,120 @@
+import asyncio
+import os
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from config import read_config
+from cooker import CookerTimeout
+from replay import Replay, SimulatedReplayCooker
+
+SAMPLE_CONFIG = os.path.join(os.path.dirname(__file__), "..", "config.yaml")
+
+DAY = date(2024, 3, 4)
+
+NAME = "米家小饭煲"
+
+
+@pytest.fixture
+def config(monkeypatch):
+    monkeypatch.setenv("COOKER_IP", "127.0.0.1")
+    monkeypatch.setenv("COOKER_TOKEN", "ff" * 16)
+    monkeypatch.setenv("BARK_TOKEN", "")
+    return read_config(SAMPLE_CONFIG, use_cache=False)
+
+
+def at(hour: int, minute: int, second: int = 0) -> datetime:
+    return datetime.combine(DAY, datetime.min.time()).replace(
+        hour=hour, minute=minute, second=second
+    )
+
+
+class FailingCooker(SimulatedReplayCooker):
+    """Times out on the first start."""
+
+    failed = False
+
+    async def start(self, *args, **kwargs):
+        if not self.failed:
+            self.failed = True
+            raise CookerTimeout("set_start timed out")
+        await super().start(*args, **kwargs)
+
+
+def replay(config, power, begin=None, end=None, cooker_class=None):
+    begin = begin or at(0, 0)
+    runner = Replay(begin, config)
+    cooker_config = config.get_cooker_configs()[0]
+    if cooker_class is None:
+        runner.simulate(cooker_config, power)
+    else:
+        cooker = cooker_class(cooker_config.name, runner.clock, runner.report, power)
+        runner.add(cooker, cooker_config)
+    return asyncio.run(runner.run(end or begin + timedelta(days=1)))
+
+
+def test_normal_day(config):
+    power = [
+        (at(7, 30), True),
+        (at(13, 0), False),
+        (at(17, 0), True),
+        (at(22, 0), False),
+    ]
+    report = replay(config, power)
+
+    assert [(c.at, c.method, c.args) for c in report.commands] == [
+        (at(7, 30), "start", ("FineRice", 240, True)),
+        (at(12, 31, 30), "stop", ()),
+        (at(17, 2), "start", ("FineRice", 58, True)),
+        (at(19, 3, 30), "stop", ()),
+    ]
+    assert [(p.at, p.message) for p in report.pushes] == [
+        (at(7, 30), "自动预定 11:30（240分钟后）烹饪完成（FineRice）并自动保温"),
+        (at(12, 31, 30), "小饭煲处于保温模式且长时间未断电，请注意！"),
+        (at(12, 31, 30), "长时间处于保温模式且未断电，已自动停止小饭煲"),
+        (at(17, 2), "自动预定 18:00（58分钟后）烹饪完成（FineRice）并自动保温"),
+        (at(19, 3, 30), "小饭煲处于保温模式且长时间未断电，请注意！"),
+        (at(19, 3, 30), "长时间处于保温模式且未断电，已自动停止小饭煲"),
+    ]
+    assert all(push.title == NAME for push in report.pushes)
+    assert not report.failures
+
+
+@pytest.mark.parametrize(
+    "plug, expected",
+    [
+        # 最早时间属于时间段内，立即烹饪
+        ((5, 59, 59), ("Gongee", 130, True)),
+        ((6, 0), ("Gongee", None, True)),
+        # 最晚时间不属于时间段，预约下一时间段
+        ((7, 9, 59), ("Gongee", None, True)),
+        ((7, 10), ("FineRice", 260, True)),
+        ((10, 39, 59), ("FineRice", 50, True)),
+        ((10, 40), ("FineRice", None, True)),
+        # 相邻的时间段，最晚时间属于下一个时间段
+        ((11, 19, 59), ("FineRice", None, True)),
+        ((11, 20), ("QuickRice", None, True)),
+        ((12, 44, 59), ("QuickRice", None, True)),
+        ((12, 45), ("FineRice", 315, True)),
+        ((20, 30), None),
+    ],
+)
+def test_plug_in_at_window_boundary(config, plug, expected):
+    begin = at(*plug)
+    report = replay(config, [(begin, True)], begin, begin + timedelta(seconds=1))
+
+    assert [command.args for command in report.commands] == (
+        [expected] if expected else []
+    )
+    assert all(command.at == begin for command in report.commands)
+
+
+def test_failed_start_is_retried(config):
+    power = [(at(7, 30), True), (at(13, 0), False)]
+    report = replay(config, power, cooker_class=FailingCooker)
+
+    assert [(f.at, f.device) for f in report.failures] == [(at(7, 30), NAME)]
+    starts = [command for command in report.commands if command.method == "start"]
+    assert [(c.at, c.args) for c in starts] == [(at(7, 30, 5), ("FineRice", 239, True))]
+    schedules = [p for p in report.pushes if p.message.startswith("自动预定")]
+    assert [p.at for p in schedules] == [at(7, 30, 5)]
@@ -0,0 +1,227 @@
+import asyncio
+import os
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from checkpoint import Checkpoint
+from clock import VirtualClock
+from config import Time, read_config
+from cooker import CookerTimeout, OperationMode
+from replay import Replay, Report, SimulatedReplayCooker, daily_power
+from machine import KeepWarmReminder, StopKeepWarm
+from scheduler import CookerScheduler, CookerState
+
+CONFIG = """!Config
+poll_interval: 30
+cooker_config: !CookerConfig
+  name: flaky
+  ip: 127.0.0.1
+  token: ffffffffffffffffffffffffffffffff
+  akw: true
+  unpluggedCheck: true
+  unpluggedMaxDuration: 60
+  unpluggedAutoStopAkw: true
+  unpluggedMaxReminderCount: 1
+  meal_profile_list:
+    - !MealProfile
+      type: FineRice
+      time: !Mealtime
+        usual_time: !time 11:30
+        earliest_time: !time 10:40
+        latest_time: !time 11:20
+push_config: !PushConfig
+  token: ""
+"""
+
+DAY = date(2024, 3, 4)
+
+
+class FlakyCooker(SimulatedReplayCooker):
+    """Times out on the first call of each listed command."""
+
+    def __init__(self, *args, fail=()):
+        super().__init__(*args)
+        self.fail = set(fail)
+
+    async def start(self, *args, **kwargs):
+        if "start" in self.fail:
+            self.fail.discard("start")
+            raise CookerTimeout("set_start timed out")
+        await super().start(*args, **kwargs)
+
+    async def stop(self, *args, **kwargs):
+        if "stop" in self.fail:
+            self.fail.discard("stop")
+            raise CookerTimeout("cancel_cooking timed out")
+        await super().stop(*args, **kwargs)
+
+
+def replay(tmp_path, plug: Time, fail=()):
+    path = os.path.join(tmp_path, "config.yaml")
+    with open(path, "w", encoding="utf-8") as fp:
+        fp.write(CONFIG)
+    config = read_config(path, use_cache=False)
+    cooker_config = config.get_cooker_configs()[0]
+
+    runner = Replay(datetime.combine(DAY, datetime.min.time()), config)
+    cooker = FlakyCooker(
+        cooker_config.name,
+        runner.clock,
+        runner.report,
+        daily_power(DAY, 1, plug, Time(22, 0)),
+        fail=fail,
+    )
+    scheduler = runner.add(cooker, cooker_config)
+    report = asyncio.run(runner.run(datetime.combine(DAY, datetime.max.time())))
+    return report, scheduler, cooker
+
+
+def test_failed_start_is_retried(tmp_path):
+    report, scheduler, cooker = replay(tmp_path, Time(9, 0), fail=["start"])
+
+    assert len(report.failures) == 1
+    failed_at = report.failures[0].at
+    starts = [command for command in report.commands if command.method == "start"]
+    assert len(starts) == 1
+    # 下一轮轮询即重新预约，并且预约的仍是 11:30 完成
+    assert starts[0].at - failed_at < timedelta(minutes=2)
+    assert starts[0].args == ("FineRice", 149, True)
+    assert not scheduler.state.online
+    assert any("自动预定 11:30" in push.message for push in report.pushes)
+
+
+def test_failed_stop_is_retried(tmp_path):
+    report, scheduler, cooker = replay(tmp_path, Time(11, 0), fail=["stop"])
+
+    assert len(report.failures) == 1
+    stops = [command for command in report.commands if command.method == "stop"]
+    assert len(stops) == 1
+    assert stops[0].at > report.failures[0].at
+    messages = [push.message for push in report.pushes]
+    assert messages.count("长时间处于保温模式且未断电，已自动停止小饭煲") == 1
+    assert messages.count("小饭煲处于保温模式且长时间未断电，请注意！") == 1
+
+
+def test_checkpoint_keeps_failed_command_pending(tmp_path):
+    path = os.path.join(tmp_path, "config.yaml")
+    with open(path, "w", encoding="utf-8") as fp:
+        fp.write(CONFIG)
+    cooker_config = read_config(path, use_cache=False).get_cooker_configs()[0]
+    clock = VirtualClock(datetime(2024, 3, 4, 9, 0))
+    report = Report()
+    cooker = FlakyCooker(
+        cooker_config.name,
+        clock,
+        report,
+        [(clock.now(), True)],
+        fail=["start"],
+    )
+    checkpoint = Checkpoint(os.path.join(tmp_path, "state.json"))
+    scheduler = CookerScheduler(
+        cooker, cooker_config, checkpoint=checkpoint, clock=clock, push=lambda *_: None
+    )
+
+    with pytest.raises(CookerTimeout):
+        asyncio.run(scheduler.task())
+    assert checkpoint.load()["scheduled"] is False
+
+    clock.advance(5)
+    asyncio.run(scheduler.task())
+    assert checkpoint.load()["scheduled"] is True
+    assert cooker.cooker.status == OperationMode.PreCook.value
+
+
+class HangingCooker(SimulatedReplayCooker):
+    """Never answers set_start."""
+
+    deadline = None
+
+    async def start(self, *args, deadline=None, **kwargs):
+        self.deadline = deadline
+        await asyncio.Event().wait()
+
+
+def test_cancelled_command_stays_pending(tmp_path):
+    path = os.path.join(tmp_path, "config.yaml")
+    with open(path, "w", encoding="utf-8") as fp:
+        fp.write(CONFIG)
+    cooker_config = read_config(path, use_cache=False).get_cooker_configs()[0]
+    clock = VirtualClock(datetime(2024, 3, 4, 9, 0))
+    report = Report()
+    cooker = HangingCooker(cooker_config.name, clock, report, [(clock.now(), True)])
+    checkpoint = Checkpoint(os.path.join(tmp_path, "state.json"))
+    scheduler = CookerScheduler(
+        cooker, cooker_config, checkpoint=checkpoint, clock=clock, push=lambda *_: None
+    )
+
+    # 指令超出 Daemon.poll 的单轮时限
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(asyncio.wait_for(scheduler.task(), 0.05))
+    assert cooker.deadline is not None
+    assert scheduler.state.scheduled is False
+    assert checkpoint.load()["scheduled"] is False
+    assert not report.pushes
+
+
+class CountingCooker(SimulatedReplayCooker):
+    """Counts the full status reads."""
+
+    reads = 0
+
+    async def status(self, deadline=None, retries=None):
+        self.reads += 1
+        return await super().status(deadline, retries)
+
+
+def test_full_status_only_read_when_online(tmp_path):
+    path = os.path.join(tmp_path, "config.yaml")
+    with open(path, "w", encoding="utf-8") as fp:
+        fp.write(CONFIG)
+    cooker_config = read_config(path, use_cache=False).get_cooker_configs()[0]
+    clock = VirtualClock(datetime(2024, 3, 4, 9, 0))
+    plug = clock.now() + timedelta(seconds=10)
+    cooker = CountingCooker(cooker_config.name, clock, Report(), [(plug, True)])
+    scheduler = CookerScheduler(
+        cooker, cooker_config, clock=clock, push=lambda *_: None
+    )
+    changes = []
+    scheduler.feed.subscribe(changes.append)
+
+    asyncio.run(scheduler.task())
+    assert cooker.reads == 0
+    assert not scheduler.feed.online
+
+    clock.advance(10)
+    asyncio.run(scheduler.task())
+    assert cooker.reads == 1
+    assert scheduler.feed.snapshot.mode == OperationMode.Waiting
+    assert len(changes) == 1
+
+
+def test_keep_warm_reminder_once_per_keep_warm(tmp_path):
+    config = CONFIG.replace("AutoStopAkw: true", "AutoStopAkw: false")
+    config = config.replace("ReminderCount: 1", "ReminderCount: 3")
+    path = os.path.join(tmp_path, "config.yaml")
+    with open(path, "w", encoding="utf-8") as fp:
+        fp.write(config)
+    cooker_config = read_config(path, use_cache=False).get_cooker_configs()[0]
+    scheduler = CookerScheduler(None, cooker_config, push=lambda *_: None)
+    machine = scheduler.machine
+    begin = datetime(2024, 3, 4, 12, 0)
+
+    events = machine.observe(begin, OperationMode.Running)
+    # 保温三小时，每 30 秒轮询一次
+    for tick in range(1, 361):
+        events += machine.observe(
+            begin + timedelta(seconds=30 * tick), OperationMode.AutoKeepWarm
+        )
+    reminders = [event for event in events if isinstance(event, KeepWarmReminder)]
+    assert [(r.count, r.at) for r in reminders] == [(1, begin + timedelta(minutes=61))]
+    assert not any(isinstance(event, StopKeepWarm) for event in events)
+
+    # 重启后从检查点恢复，不会再次提醒
+    state = CookerState()
+    state.load_dict(scheduler.state.to_dict())
+    machine.state = state
+    assert machine.observe(begin + timedelta(hours=4), OperationMode.AutoKeepWarm) == []
@@ -0,0 +1,81 @@
+import asyncio
+import json
+import os
+
+from async_cooker import AsyncMultiCooker
+from session import SessionStore
+from simulator import serve
+
+TOKEN = "ff" * 16
+
+HOST = "127.0.0.7"
+
+
+def read_status(path: str, device_id: int = 2):
+    """Read the status once with a store loaded from ``path``, like a restart."""
+
+    async def read():
+        transport, simulator = await serve(HOST, 0, TOKEN, device_id=device_id)
+        port = transport.get_extra_info("sockname")[1]
+        sessions = SessionStore(path)
+        cooker = AsyncMultiCooker(
+            HOST, TOKEN, timeout=0.2, port=port, session=sessions.session(HOST)
+        )
+        try:
+            await cooker.status()
+            return simulator
+        finally:
+            cooker.close()
+            transport.close()
+
+    return asyncio.run(read())
+
+
+def test_restored_session_skips_the_hello(tmp_path):
+    path = os.path.join(tmp_path, "sessions", "miio.json")
+    assert read_status(path).hellos == 1
+    with open(path, encoding="utf8") as fp:
+        assert json.load(fp)[HOST]["device_id"] == 2
+
+    simulator = read_status(path)
+    assert simulator.hellos == 0
+    assert simulator.requests > 0
+
+
+def test_stale_session_handshakes_again(tmp_path):
+    path = os.path.join(tmp_path, "miio.json")
+    read_status(path, device_id=2)
+
+    # 同一地址换了一台设备，旧会话的请求被丢弃
+    simulator = read_status(path, device_id=3)
+    assert simulator.hellos == 1
+    session = SessionStore(path).session(HOST)
+    assert session.device_id == session.known_device_id == 3
+
+
+def test_unreadable_entries_are_skipped(tmp_path):
+    path = os.path.join(tmp_path, "miio.json")
+    with open(path, "w", encoding="utf8") as fp:
+        json.dump(
+            {
+                "10.0.0.2": {"device_id": "x", "stamp_offset": 0},
+                "10.0.0.3": {"device_id": 7},
+                "10.0.0.4": {
+                    "device_id": None,
+                    "stamp_offset": 5,
+                    "known_device_id": 9,
+                },
+            },
+            fp,
+        )
+
+    store = SessionStore(path)
+    assert sorted(store.sessions) == ["10.0.0.4"]
+    session = store.session("10.0.0.4")
+    assert not session.established
+    assert session.known_device_id == 9
+    assert not store.session("10.0.0.2").established
+    # 从未握手成功的会话不写入文件
+    store.save()
+    with open(path, encoding="utf8") as fp:
+        assert sorted(json.load(fp)) == ["10.0.0.4"]
@@ -0,0 +1,118 @@
+import os
+
+from cooker import STAGE_MARKER, CookerStatus, OperationMode, TemperatureHistory
+from telemetry import STATUS_RECORD, DeviceTelemetry, SessionRecord, StatusRecord
+
+TS = 1_700_000_000
+
+MENU = "0000000000000000000000000000000000000001"
+
+
+def running(temp: int = 60) -> CookerStatus:
+    return CookerStatus(
+        {
+            "status": OperationMode.Running.value,
+            "phase": 2,
+            "menu": MENU,
+            "temp": temp,
+            "t_left": 1200,
+            "t_pre": 0,
+            "t_cook": 60,
+            "akw": 1,
+        }
+    )
+
+
+def waiting() -> CookerStatus:
+    return CookerStatus({"status": OperationMode.Waiting.value})
+
+
+def history(*samples: int) -> TemperatureHistory:
+    return TemperatureHistory(bytes(samples).hex())
+
+
+def test_round_trip(tmp_path):
+    telemetry = DeviceTelemetry(str(tmp_path), 1 << 20, 1 << 16)
+    telemetry.record_status(waiting(), TS)
+    telemetry.record_status(running(), TS + 30)
+    telemetry.record_history(history(20, 25), TS + 30)
+    telemetry.record_history(history(20, 25, STAGE_MARKER, 40), TS + 60)
+    telemetry.record_status(waiting(), TS + 90)
+
+    session = TS + 30
+    assert list(telemetry.status_range(TS, TS + 90)) == [
+        StatusRecord(TS, 0, OperationMode.Waiting.value, 0, 0, 0, 0, 0, 0),
+        StatusRecord(
+            session, session, OperationMode.Running.value, 2, 60, 1200, 0, 60, 1
+        ),
+        StatusRecord(TS + 90, 0, OperationMode.Waiting.value, 0, 0, 0, 0, 0, 0),
+    ]
+    assert telemetry.sessions() == [SessionRecord(session, session, TS + 90, MENU)]
+    temperatures = list(telemetry.session_temperatures(session))
+    assert [(r.ts, r.index, r.value) for r in temperatures] == [
+        (TS + 30, 0, 20),
+        (TS + 30, 1, 25),
+        (TS + 60, 2, STAGE_MARKER),
+        (TS + 60, 3, 40),
+    ]
+
+
+def test_range_query_spans_segments(tmp_path):
+    # 每个分段 10 条状态记录
+    telemetry = DeviceTelemetry(str(tmp_path), 1 << 20, STATUS_RECORD.size * 10)
+    for index in range(35):
+        telemetry.record_status(waiting(), TS + index * 30)
+
+    assert len(os.listdir(tmp_path)) == 4
+    records = list(telemetry.status_range(TS + 9 * 30, TS + 21 * 30))
+    assert [r.ts for r in records] == [TS + index * 30 for index in range(9, 22)]
+    assert list(telemetry.status_range(TS - 60, TS - 1)) == []
+    assert len(list(telemetry.status_range(TS, TS + 35 * 30))) == 35
+
+
+def test_budget_evicts_oldest_segments(tmp_path):
+    segment_bytes = STATUS_RECORD.size * 10
+    telemetry = DeviceTelemetry(str(tmp_path), segment_bytes * 3, segment_bytes)
+    for index in range(100):
+        telemetry.record_status(waiting(), TS + index * 30)
+
+    # 只在新建分段时检查预算，最多超出正在写入的一个分段
+    names = os.listdir(tmp_path)
+    assert len(names) == 4
+    sizes = [os.path.getsize(os.path.join(tmp_path, name)) for name in names]
+    assert sum(sizes) <= segment_bytes * 4
+    records = list(telemetry.status_range(TS, TS + 100 * 30))
+    assert records[-1].ts == TS + 99 * 30
+    assert [r.ts for r in records] == sorted(r.ts for r in records)
+    assert records[0].ts == TS + 60 * 30
+
+
+def test_appends_without_listing_the_directory(tmp_path, monkeypatch):
+    telemetry = DeviceTelemetry(str(tmp_path), 1 << 20, 1 << 16)
+    telemetry.record_status(waiting(), TS)
+    listed = []
+    listdir = os.listdir
+    monkeypatch.setattr(
+        os, "listdir", lambda path: listed.append(path) or listdir(path)
+    )
+
+    for index in range(1, 100):
+        telemetry.record_status(waiting(), TS + index * 30)
+    assert listed == []
+    assert len(list(telemetry.status_range(TS, TS + 100 * 30))) == 100
+
+
+def test_open_session_survives_restart(tmp_path):
+    telemetry = DeviceTelemetry(str(tmp_path), 1 << 20, 1 << 16)
+    telemetry.record_status(running(), TS)
+    telemetry.record_history(history(20, 25), TS)
+    telemetry.close()
+
+    telemetry = DeviceTelemetry(str(tmp_path), 1 << 20, 1 << 16)
+    telemetry.record_status(running(), TS + 30)
+    telemetry.record_history(history(20, 25, 30), TS + 30)
+    telemetry.record_status(waiting(), TS + 60)
+
+    assert telemetry.sessions() == [SessionRecord(TS, TS, TS + 60, MENU)]
+    assert [r.session for r in telemetry.session_status(TS)] == [TS, TS]
+    assert [r.value for r in telemetry.session_temperatures(TS)] == [20, 25, 30]